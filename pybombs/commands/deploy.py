@@ -23,10 +23,10 @@
 from __future__ import print_function
 import re
 import os
-import tarfile
 from pybombs.commands import CommandBase
 from pybombs.requirer import Requirer
 from pybombs.pb_exception import PBException
+from pybombs.utils import compression
 from pybombs.utils import subproc
 
 class Deployer(object):
@@ -48,21 +48,18 @@ class TarfileDeployer(Deployer):
     """
     Deploy to tarfile (.tar)
     """
-    mode = ''
+    codec = None
 
     def __init__(self, skip_names=None):
         Deployer.__init__(self, skip_names)
 
     def deploy(self, target, prefix_dir):
         """
-        Create tar file
+        Create tar file. If it's compressed, the fastest tool on the host
+        does the compression (see utils.compression).
         """
-        tf = tarfile.open(
-            name=target,
-            mode='w:{mode}'.format(mode=self.mode),
-        )
-        tf.add(prefix_dir, filter=self.filter)
-        tf.close()
+        with compression.open_tar_writer(target, self.codec) as tf:
+            tf.add(prefix_dir, filter=self.filter)
 
     def filter(self, tiobject):
         """ Filter callback """
@@ -75,7 +72,7 @@ class GZipDeployer(TarfileDeployer):
     Deploy to .tar.gz
     """
     ttype = 'gzip'
-    mode = 'gz'
+    codec = 'gzip'
     def __init__(self, skip_names=None):
         TarfileDeployer.__init__(self, skip_names)
 
@@ -84,36 +81,20 @@ class BZip2Deployer(TarfileDeployer):
     Deploy to .tar.bz2
     """
     ttype = 'bzip2'
-    mode = 'bz2'
+    codec = 'bzip2'
     def __init__(self, skip_names=None):
         TarfileDeployer.__init__(self, skip_names)
 
-class XZDeployer(Deployer, Requirer):
+class XZDeployer(TarfileDeployer, Requirer):
     """
     Deploy to .tar.xz
     """
     ttype = 'xz'
+    codec = 'xz'
     host_sys_deps = ['xz']
     def __init__(self, skip_names=None):
         Requirer.__init__(self)
-        Deployer.__init__(self, skip_names)
-        self.tarfiledeployer = TarfileDeployer(skip_names)
-
-    def deploy(self, target, prefix_dir):
-        """
-        Call TarfileDeployer to make a .tar file, then use xz
-        to zip that
-        """
-        tarfilename = target
-        if os.path.splitext(target)[1] == '.xz':
-            tarfilename = os.path.splitext(target)[0]
-        elif os.path.splitext(target)[1] == '.txz':
-            tarfilename = os.path.splitext(target)[0] + '.tar'
-        result_filename = tarfilename + '.xz'
-        self.tarfiledeployer.deploy(tarfilename, prefix_dir)
-        subproc.monitor_process(['xz', tarfilename], throw_ex=True)
-        if result_filename != target:
-            os.rename(result_filename, target)
+        TarfileDeployer.__init__(self, skip_names)
 
 class SSHDeployer(Deployer):
     """ Deploy via scp """
@@ -130,7 +111,8 @@ class SSHDeployer(Deployer):
         ]
         os.chdir(prefix_dir)
         cmd = ['scp', '-r', '-q'] + prefix_content + [target]
-        subproc.monitor_process(cmd, throw_ex=True)
+        # scp might ask for a password or passphrase
+        subproc.monitor_process(cmd, throw_ex=True, interactive=True)
 
 def choose_deployer(ttype, target):
     """
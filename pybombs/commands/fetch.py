@@ -20,8 +20,10 @@
 #
 """ PyBOMBS command: fetch """
 
+import time
 from pybombs.commands import CommandBase
 from pybombs.pb_exception import PBException
+from pybombs.utils import workers
 
 class Fetch(CommandBase):
     """ Fetch a package """
@@ -52,6 +54,12 @@ class Fetch(CommandBase):
             help="Also fetch dependencies of packages",
             action='store_true',
         )
+        parser.add_argument(
+            '-j', '--jobs',
+            help="Fetch up to this many packages in parallel",
+            type=int,
+            default=1,
+        )
 
     def __init__(self, cmd, args):
         CommandBase.__init__(
@@ -69,7 +77,6 @@ class Fetch(CommandBase):
 
     def run(self):
         """ Go, go, go! """
-        from pybombs.fetcher import Fetcher
         from pybombs import recipe
         if self.args.all:
             self.log.debug("Loading all recipes!")
@@ -83,17 +90,74 @@ class Fetch(CommandBase):
         except KeyError as e:
             self.log.error("Package has no recipe: {0}".format(e))
             return 1
+        fetch_list = []
         for r in recipe_list:
             if (not hasattr(r,'source')) or (not len(r.source)):
                 self.log.warn("Package {0} has no sources listed.".format(r.id))
                 continue
-            self.log.info("Downloading source for package {0}".format(r.id))
-            try:
-                if self.cmd == 'refetch':
-                    Fetcher().update(r)
-                else:
-                    Fetcher().fetch(r)
-            except PBException as ex:
-                self.log.error("Unable to fetch package {0}. Skipping.".format(r.id))
-                self.log.error(ex)
+            fetch_list.append(r)
+        jobs = max(1, min(self.args.jobs, len(fetch_list)))
+        start = time.time()
+        if jobs > 1:
+            self.log.debug("Fetching up to {0} packages in parallel.".format(jobs))
+            results = self._fetch_parallel(fetch_list, jobs)
+        else:
+            results = [(r, self._fetch_one(r)) for r in fetch_list]
+        if len(fetch_list) > 1:
+            self._print_summary(results, time.time() - start)
+
+    def _fetch_one(self, r):
+        """
+        Fetch (or refetch) a single package. Returns a tuple (status,
+        duration), where status is 'fetched', 'present' or 'failed'.
+        """
+        from pybombs.fetcher import Fetcher
+        start = time.time()
+        fetcher = Fetcher()
+        if self.cmd != 'refetch' and fetcher.check_fetched(r):
+            self.log.info("Already fetched: {0}".format(r.id))
+            return 'present', 0
+        self.log.info("Downloading source for package {0}".format(r.id))
+        try:
+            if self.cmd == 'refetch':
+                if not fetcher.update(r):
+                    return 'failed', time.time() - start
+            else:
+                fetcher.fetch(r)
+        except PBException as ex:
+            self.log.error("Unable to fetch package {0}. Skipping.".format(r.id))
+            self.log.error(ex)
+            return 'failed', time.time() - start
+        duration = time.time() - start
+        self.log.info("Fetched {0} in {1:.1f}s".format(r.id, duration))
+        return 'fetched', duration
+
+    def _fetch_parallel(self, fetch_list, jobs):
+        """
+        Fetch all packages in fetch_list using `jobs' worker threads.
+        Returns a list of (recipe, (status, duration)) tuples.
+        """
+        def _on_error(r, ex):
+            " Report unexpected errors "
+            self.log.error("Unexpected error while fetching {0}: {1}".format(r.id, str(ex)))
+            return ('failed', 0)
+        try:
+            results = workers.run_parallel(self._fetch_one, fetch_list, jobs, on_error=_on_error)
+        except KeyboardInterrupt:
+            self.log.info("Caught Ctrl+C. Cancelled all running fetches.")
+            raise
+        return [(r, results[r]) for r in fetch_list]
 
+    def _print_summary(self, results, duration):
+        " Log what happened to all packages "
+        by_status = {}
+        for r, (status, _) in results:
+            by_status.setdefault(status, []).append(r.id)
+        self.log.info("Fetch summary: {0} fetched, {1} already present, {2} failed, took {3:.1f}s".format(
+            len(by_status.get('fetched', [])),
+            len(by_status.get('present', [])),
+            len(by_status.get('failed', [])),
+            duration,
+        ))
+        if by_status.get('failed'):
+            self.log.error("Failed to fetch: {0}".format(", ".join(by_status['failed'])))
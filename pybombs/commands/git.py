@@ -22,6 +22,7 @@
 
 from __future__ import print_function
 import os
+import time
 from pybombs.pb_exception import PBException
 from pybombs import recipe
 from pybombs import fetcher
@@ -40,6 +41,14 @@ def setup_subsubparser_makeref(parser):
         help="List of packages to add to git reference",
         nargs='*',
     )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help="Number of remotes to fetch at the same time",
+    )
+    parser.add_argument(
+        '-f', '--force', action='store_true',
+        help="Fetch all remotes, even the ones that were fetched recently",
+    )
 
 #############################################################################
 # Command class
@@ -131,6 +140,14 @@ class Git(SubCommandBase):
         gcm = GitCacheManager(gitcachedir)
         self.log.debug("Using git cache in: {0}".format(gcm.path))
         git_sources = _get_git_remotes(packages)
-        gcm.add_remotes(git_sources, True)
+        start = time.time()
+        results = gcm.add_remotes(git_sources, True, jobs=args.jobs, force=args.force)
+        for name in sorted(results, key=lambda name: -results[name][1]):
+            success, duration = results[name]
+            self.log.info("{0:<30} {1:6.1f}s{2}".format(
+                name, duration, '' if success else '  (failed)'))
+        self.log.info("Fetched {0} remotes in {1:.1f}s, {2} were up to date.".format(
+            len(results), time.time() - start, len(gcm.remotes) - len(results)))
         self.cfg.update_cfg_file({'config': {'git-cache': gitcachedir}})
+        return all(success for success, _ in results.values())
 
@@ -62,6 +62,18 @@ class Install(CommandBase):
                 help="Verify installs were successful",
                 action='store_true',
         )
+        group.add_argument(
+                '-J', '--jobs',
+                help="Build up to this many source packages in parallel",
+                type=int,
+                default=1,
+        )
+        group.add_argument(
+                '--fetch-jobs',
+                help="When updating, update up to this many sources in parallel before building anything (1 disables this)",
+                type=int,
+                default=8,
+        )
         if cmd == 'install':
             group.add_argument(
                     '--static',
@@ -121,6 +133,8 @@ class Install(CommandBase):
                 no_deps=self.args.no_deps,
                 verify=self.args.verify,
                 static=getattr(self.args, 'static', False),
+                jobs=max(1, self.args.jobs),
+                fetch_jobs=max(1, self.args.fetch_jobs),
         )
 
 ### Damn, you found it :)
@@ -369,7 +369,7 @@ class Prefix(SubCommandBase):
         self.log.info("Installing SDK `{sdk}'".format(sdk=sdkname))
         # Install command
         cmd = r.var_replace_all(r.get_command('install'))
-        if subproc.monitor_process(cmd, shell=True, env=os.environ) == 0:
+        if subproc.monitor_process(cmd, shell=True, env=os.environ, interactive=True) == 0:
             self.log.debug("Installation successful")
         else:
             self.log.error("Error installing SDK. Aborting.")
@@ -96,7 +96,8 @@ class Rebuild(CommandBase):
                 self.log.error("Package {0} is not installed into current prefix. Aborting.".format(pkg))
                 return -1
         ### Make install tree
-        rb_tree = dep_manager.DepManager().make_dep_tree(
+        dep_mgr = dep_manager.DepManager()
+        rb_tree = dep_mgr.make_dep_tree(
             self.args.packages,
             lambda x: bool(
                 (x in self.args.packages) or \
@@ -106,12 +107,9 @@ class Rebuild(CommandBase):
         if self.log.getEffectiveLevel() <= 10 or self.args.print_tree:
             print("Rebuild tree:")
             rb_tree.pretty_print()
+            print(dep_mgr.get_stats_str(rb_tree))
         ### Recursively rebuild, starting at the leaf nodes
-        node_cache = []
-        while not rb_tree.empty():
-            pkg = rb_tree.pop_leaf_node()
-            if pkg in node_cache:
-                continue
+        for pkg in rb_tree.serialize():
             rec = recipe.get_recipe(pkg)
             self.log.info("Rebuilding package: {0}".format(pkg))
             if not self.pm.rebuild(
@@ -351,6 +351,7 @@ class ConfigManager(object):
     cfg_file_name = "config.yml"
     pybombs_dir = ".pybombs"
     recipe_cache_dir = 'recipes'
+    cache_dir_name = 'cache'
 
     # Default values + Help text:
     defaults = {
@@ -366,6 +367,20 @@ class ConfigManager(object):
         'keep_builddir': ('', 'When rebuilding, default to keeping the build directory'),
         'elevate_pre_args': (['sudo', '-H'], 'For commands that need elevated privileges, prepend this'),
         'git-cache': (None, 'Path to git reference repository (git cache)'),
+        'git-cache-max-age': ('3600', 'Remotes in the git cache are not fetched again for this many seconds'),
+        'git-clone-depth': ('', 'Number of commits to clone from git repositories (empty for the full history)'),
+        'git-clone-filter': ('', "Filter for partial git clones, e.g. 'blob:none' (empty for full clones)"),
+        'git-single-branch': ('', 'When cloning git repositories, only clone the branch that is checked out'),
+        'git-reuse-clones': (
+            'dissociate',
+            "Borrow objects from clones of the same repository in other prefixes or source pools: "
+            "'dissociate' (copy them), 'reference' (share them; the new clone breaks if the other "
+            "one is deleted or garbage-collected), or empty to disable"
+        ),
+        'git-source-pools': ('', 'Directories with git clones that new clones can borrow objects from (separated by colons)'),
+        'dist-cache-size': ('2048', 'Maximum size of the shared cache for downloaded archives in MB (0 disables it)'),
+        'mirror-selection': ('', 'For recipes with several sources, probe them all and fetch from the fastest one first'),
+        'mirror-probe-timeout': ('3', 'Seconds to wait for a source to respond when selecting mirrors'),
     }
     LAYER_DEFAULT = 0
     LAYER_GLOBALS = 1
@@ -524,6 +539,23 @@ class ConfigManager(object):
             prefix_dir = os.path.expanduser("~")
         return npath(os.path.join(prefix_dir, self.pybombs_dir))
 
+    def get_cache_dir(self, subdir=None):
+        """
+        Return the directory for persistent caches (e.g. ~/.pybombs/cache/),
+        or a subdirectory thereof if subdir is given. The directory is created
+        if necessary. Returns None if it can't be created.
+        """
+        cache_dir = os.path.join(self.local_cfg_dir, self.cache_dir_name)
+        if subdir is not None:
+            cache_dir = os.path.join(cache_dir, subdir)
+        try:
+            if sysutils.mkdirp_writable(cache_dir):
+                return cache_dir
+        except (IOError, OSError, PBException):
+            pass
+        self.log.debug("Cache directory not available: {0}".format(cache_dir))
+        return None
+
     def get(self, key, default=None):
         """ Return the value for a given key. """
         for set_of_vals in reversed(self.cfg_cascade):
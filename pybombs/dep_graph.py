@@ -0,0 +1,127 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+""" Dependency graph """
+
+from __future__ import print_function
+from collections import OrderedDict, deque
+from pybombs.pb_exception import PBException
+
+class DepGraph(object):
+    """
+    Directed acyclic graph of packages. An edge pkg -> dep means that pkg
+    depends on dep.
+
+    Every package is stored exactly once, no matter how many other packages
+    depend on it. Forward and reverse edges are both indexed, so all lookups
+    are constant time and serialize() runs in O(V+E).
+    """
+    def __init__(self):
+        # Node -> ordered set of its dependencies (the values are unused)
+        self._deps = OrderedDict()
+        # Node -> ordered set of the nodes that depend on it
+        self._rdeps = OrderedDict()
+
+    def __contains__(self, value):
+        " Returns True if value is a node in the graph "
+        return value in self._deps
+
+    def __len__(self):
+        " Return number of nodes "
+        return len(self._deps)
+
+    def __iter__(self):
+        return iter(self._deps)
+
+    def empty(self):
+        " Returns True if the graph has no nodes "
+        return len(self._deps) == 0
+
+    def add_node(self, value):
+        " Add a node without any edges. Adding an existing node is a no-op. "
+        if value not in self._deps:
+            self._deps[value] = OrderedDict()
+            self._rdeps[value] = OrderedDict()
+
+    def add_edge(self, value, dep):
+        " Declare that value depends on dep. Adds the nodes if required. "
+        self.add_node(value)
+        self.add_node(dep)
+        self._deps[value][dep] = True
+        self._rdeps[dep][value] = True
+
+    def get_values(self):
+        " Return all nodes as a list, in the order they were added "
+        return list(self._deps.keys())
+
+    def get_dependencies(self, value):
+        " Return the direct dependencies of value as a list "
+        return list(self._deps[value].keys())
+
+    def get_dependees(self, value):
+        " Return the nodes that directly depend on value as a list "
+        return list(self._rdeps[value].keys())
+
+    def get_roots(self):
+        " Return all nodes that no other node depends on "
+        return [value for value in self._deps if not self._rdeps[value]]
+
+    def serialize(self):
+        """
+        Returns the nodes in topological order, starting at the leaf nodes
+        (i.e. every node comes after all of its dependencies).
+
+        Raises a PBException if the dependencies are circular.
+        """
+        n_deps_left = {value: len(deps) for value, deps in self._deps.items()}
+        ready = deque(value for value, n_deps in n_deps_left.items() if n_deps == 0)
+        serialized = []
+        while ready:
+            value = ready.popleft()
+            serialized.append(value)
+            for dependee in self._rdeps[value]:
+                n_deps_left[dependee] -= 1
+                if n_deps_left[dependee] == 0:
+                    ready.append(dependee)
+        if len(serialized) != len(self._deps):
+            raise PBException("Circular dependencies between packages: {0}".format(
+                ", ".join(value for value, n_deps in n_deps_left.items() if n_deps > 0)
+            ))
+        return serialized
+
+    def pretty_print(self):
+        """
+        Pretty-prints the graph to stdout as a tree, starting at the root
+        nodes. Nodes that are shared by several dependees are only expanded
+        the first time they show up.
+        """
+        printed = set()
+        def _print_children(children, lead):
+            " Print a list of nodes and recurse into their dependencies "
+            for idx, child in enumerate(children):
+                is_last = idx == len(children) - 1
+                print(lead + '|')
+                if child in printed and self._deps[child]:
+                    print("{0}{1}- {2} (see above)".format(lead, '\\' if is_last else '+', str(child)))
+                    continue
+                printed.add(child)
+                print("{0}{1}- {2}".format(lead, '\\' if is_last else '+', str(child)))
+                _print_children(self.get_dependencies(child), lead + (' ' if is_last else '|') + '  ')
+        _print_children(self.get_roots(), '')
@@ -20,8 +20,7 @@
 #
 """ PyBOMBS dependency manager """
 
-import copy
-from pybombs.tree_node import TreeNode
+from pybombs.dep_graph import DepGraph
 from pybombs import package_manager
 from pybombs import config_manager
 from pybombs import pb_logging
@@ -35,47 +34,73 @@ class DepManager(object):
     def __init__(self):
         self.cfg = config_manager.config_manager
         self.log = pb_logging.logger.getChild("DepManager")
+        # Resolution counters of the last make_dep_tree() call
+        self.nodes_visited = 0
+        self.cache_hits = 0
 
     def make_dep_tree(self, pkg_list, filter_callback):
         """
+        Return a DepGraph with all packages from pkg_list and their
+        dependencies.
+
         - pkg_list: List of package names.
         - filter_callback: Function that takes a package name
           and returns True if the package should go into the tree.
+
+        Every package is resolved only once: filter_callback is called once
+        per package, and a dependency that is shared by several packages is
+        expanded the first time it is reached and reused afterwards.
         """
-        # - all of pkg_list goes into a set P
-        # - init an empty dict D
-        # - for every element p of P:
-        #   - create a full dep tree T
-        #   - D[p] -> T
-        #   - for every element q of P\p:
-        #     - if q is in T, then P <- P\q and del(D[q]) if exists
-        # - merge all elements of D into T' and return that
-        pkg_set = set([pkg for pkg in pkg_list if filter_callback(pkg)])
-        new_pkg_set = copy.copy(pkg_set)
-        dep_trees = {}
-        for pkg in pkg_set:
-            dep_trees[pkg] = self.make_tree_recursive(pkg, filter_callback)
-            assert dep_trees[pkg] is not None
-            for other_pkg in new_pkg_set.difference([pkg]):
-                if other_pkg in dep_trees[pkg]:
-                    new_pkg_set.remove(other_pkg)
-        install_tree = TreeNode()
-        for pkg in new_pkg_set:
-            install_tree.add_child(dep_trees[pkg])
-        return install_tree
+        self.nodes_visited = 0
+        self.cache_hits = 0
+        filter_results = {}
+        def _cached_filter(pkg):
+            " Run filter_callback only once per package "
+            if pkg in filter_results:
+                self.cache_hits += 1
+                return filter_results[pkg]
+            filter_results[pkg] = bool(filter_callback(pkg))
+            return filter_results[pkg]
+        dep_graph = DepGraph()
+        for pkg in pkg_list:
+            if _cached_filter(pkg) and pkg not in dep_graph:
+                self.make_tree_recursive(pkg, _cached_filter, dep_graph)
+        self.log.debug(self.get_stats_str(dep_graph))
+        return dep_graph
 
-    def make_tree_recursive(self, pkg, filter_callback):
+    def make_tree_recursive(self, pkg, filter_callback, dep_graph, resolving=None):
         """
-        Make a dependency tree for one package.
+        Add one package and its dependencies to dep_graph. Dependencies
+        that are already in dep_graph are not expanded again.
 
         Assumption is that pkg actually needs to go into the tree, it will
         not get checked by filter_callback again.
+
+        resolving is the list of packages whose dependencies are currently
+        being resolved, it's used to detect circular dependencies.
         """
         assert pkg is not None
-        tree = TreeNode(pkg)
+        resolving = resolving or []
+        self.nodes_visited += 1
+        dep_graph.add_node(pkg)
         all_deps = recipe.get_recipe(pkg).depends or []
-        deps_to_install = set([dep for dep in all_deps if filter_callback(dep)])
+        deps_to_install = [dep for dep in all_deps if filter_callback(dep)]
         for dep in deps_to_install:
-            tree.add_child(self.make_tree_recursive(dep, filter_callback))
-        return tree
+            if dep == pkg or dep in resolving:
+                self.log.error("Circular dependency: {0}".format(
+                    " -> ".join(resolving + [pkg, dep])
+                ))
+                raise PBException("Circular dependency on package {0}".format(dep))
+            if dep not in dep_graph:
+                self.make_tree_recursive(dep, filter_callback, dep_graph, resolving + [pkg])
+            dep_graph.add_edge(pkg, dep)
+        return dep_graph
 
+    def get_stats_str(self, dep_graph):
+        """
+        Return a summary of the resolution counters of the last
+        make_dep_tree() call.
+        """
+        return "Resolved {n} packages ({visited} nodes visited, {hits} cache hits)".format(
+            n=len(dep_graph), visited=self.nodes_visited, hits=self.cache_hits
+        )
@@ -0,0 +1,217 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+""" Download cache manager """
+
+import os
+import time
+import hashlib
+import tempfile
+from pybombs import pb_logging
+from pybombs import utils
+from pybombs.config_manager import config_manager
+from pybombs.utils import sysutils
+
+# Temporary download files older than this (in s) are removed by evict()
+STALE_DOWNLOAD_AGE = 24 * 3600
+
+class DistCacheManager(object):
+    """
+    Cache for downloaded source archives, shared by all prefixes.
+
+    Archives are stored by content, as <md5>/<filename>, so every archive is
+    only stored once, no matter how many URLs it was downloaded from. For
+    every URL, urls/<hash of URL> stores the MD5 sum of what it served last.
+
+    Archives are always verified before they are handed out. When the cache
+    grows beyond its size limit, the least recently used archives are
+    removed. All writes are atomic, so several PyBOMBS processes can share
+    one cache.
+    """
+    url_dir_name = 'urls'
+
+    def __init__(self, cache_dir=None, max_size=None):
+        """
+        - cache_dir: Defaults to ~/.pybombs/cache/dist
+        - max_size: In bytes, defaults to the dist-cache-size setting (in MB)
+        """
+        self.log = pb_logging.logger.getChild("DistCacheManager")
+        if max_size is None:
+            try:
+                max_size = int(config_manager.get('dist-cache-size')) * 1024 * 1024
+            except (TypeError, ValueError):
+                self.log.warn("Invalid dist-cache-size setting: {0}. Disabling the cache.".format(
+                    config_manager.get('dist-cache-size')))
+                max_size = 0
+        self.max_size = max_size
+        if cache_dir is None and max_size > 0:
+            cache_dir = config_manager.get_cache_dir('dist')
+        self.cache_dir = cache_dir
+
+    def enabled(self):
+        " Return True if the cache can be used "
+        return self.cache_dir is not None and self.max_size > 0
+
+    def get(self, url, md5=None):
+        """
+        Return the path to the cached archive for url, or None. If md5 is
+        given, any archive with that MD5 sum will do.
+
+        The returned file must not be modified.
+        """
+        if not self.enabled():
+            return None
+        md5 = md5 or self._get_url_md5(url)
+        if md5 is None:
+            return None
+        obj_dir = os.path.join(self.cache_dir, md5)
+        filenames = self._list_dir(obj_dir)
+        if not filenames:
+            return None
+        url_filename = os.path.basename(url)
+        filename = os.path.join(
+            obj_dir,
+            url_filename if url_filename in filenames else filenames[0]
+        )
+        try:
+            actual_md5 = utils.md5sum(filename)
+            if actual_md5 != md5:
+                self.log.warn("Removing corrupt archive from cache: {0}".format(filename))
+                os.remove(filename)
+                return None
+            # Mark as recently used
+            os.utime(filename, None)
+        except (IOError, OSError) as ex:
+            self.log.debug("Can't use cached archive {0}: {1}".format(filename, ex))
+            return None
+        self.log.debug("Cache hit for {0}: {1}".format(url, filename))
+        return filename
+
+    def new_file(self):
+        """
+        Return a tuple (file object, filename) for a new, temporary file in
+        the cache directory, which can later be add()ed with move=True.
+        """
+        fd, filename = tempfile.mkstemp(dir=self.cache_dir, prefix='.download.')
+        return os.fdopen(fd, 'wb'), filename
+
+    def add(self, url, filename, md5=None, name=None, move=False):
+        """
+        Store a copy of the archive filename, which was downloaded from url.
+        md5 is its MD5 sum, if already known. name is the filename to store
+        it as (defaults to the basename of filename). If move is True, the
+        file is moved into the cache instead (it must be on the same file
+        system, see new_file()).
+
+        Returns the path to the cached copy, or None if it couldn't be stored.
+        """
+        if not self.enabled():
+            return None
+        try:
+            md5 = md5 or utils.md5sum(filename)
+            obj_dir = os.path.join(self.cache_dir, md5)
+            cached_filename = os.path.join(obj_dir, name or os.path.basename(filename))
+            if not os.path.isfile(cached_filename):
+                self._mkdir(obj_dir)
+                if move:
+                    os.rename(filename, cached_filename)
+                else:
+                    sysutils.copy_file_atomic(filename, cached_filename)
+            elif move:
+                os.remove(filename)
+            self._mkdir(os.path.join(self.cache_dir, self.url_dir_name))
+            sysutils.write_file_atomic(self._get_url_filename(url), md5.encode('ascii'))
+            self.evict(keep=cached_filename)
+        except (IOError, OSError) as ex:
+            self.log.debug("Could not add {0} to the cache: {1}".format(filename, ex))
+            return None
+        return cached_filename
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used archives until the cache is no larger
+        than max_size. The archive keep is never removed.
+        """
+        try:
+            for filename in os.listdir(self.cache_dir):
+                filename = os.path.join(self.cache_dir, filename)
+                # Leftovers from interrupted downloads
+                if os.path.basename(filename).startswith('.download.') \
+                        and os.stat(filename).st_mtime < time.time() - STALE_DOWNLOAD_AGE:
+                    os.remove(filename)
+        except OSError:
+            pass
+        entries = []
+        for md5 in self._list_dir(self.cache_dir):
+            if md5 == self.url_dir_name:
+                continue
+            obj_dir = os.path.join(self.cache_dir, md5)
+            for filename in self._list_dir(obj_dir):
+                filename = os.path.join(obj_dir, filename)
+                try:
+                    file_stat = os.stat(filename)
+                except OSError:
+                    continue
+                entries.append((file_stat.st_mtime, file_stat.st_size, filename))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if filename == keep:
+                continue
+            self.log.debug("Evicting from cache: {0}".format(filename))
+            try:
+                os.remove(filename)
+                total_size -= size
+                os.rmdir(os.path.dirname(filename))
+            except OSError:
+                pass
+
+    def _get_url_filename(self, url):
+        " Return the file that stores the MD5 sum for url "
+        return os.path.join(
+            self.cache_dir, self.url_dir_name,
+            hashlib.sha1(url.encode('utf-8')).hexdigest()
+        )
+
+    def _get_url_md5(self, url):
+        " Return the MD5 sum of the archive url served last, or None "
+        try:
+            with open(self._get_url_filename(url)) as url_file:
+                return url_file.read().strip() or None
+        except (IOError, OSError):
+            return None
+
+    @staticmethod
+    def _list_dir(dirname):
+        " List dirname, skipping temporary files. Returns [] on error. "
+        try:
+            return sorted(x for x in os.listdir(dirname) if not x.startswith('.'))
+        except OSError:
+            return []
+
+    @staticmethod
+    def _mkdir(dirname):
+        " Create dirname, unless another process beat us to it "
+        try:
+            os.mkdir(dirname)
+        except OSError:
+            if not os.path.isdir(dirname):
+                raise
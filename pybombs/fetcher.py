@@ -25,11 +25,19 @@ Fetcher. Whoa.
 
 import os
 import re
+import time
 import shutil
+import threading
 
 from pybombs import pb_logging
 from pybombs.pb_exception import PBException
 from pybombs.config_manager import config_manager
+from pybombs.utils import workers
+
+# Sources that update_all() took care of in this process:
+# (src_dir, package) -> True if they were updated, False if they were current
+_UPDATED_SOURCES = {}
+_UPDATED_SOURCES_LOCK = threading.Lock()
 
 class Fetcher(object):
     """
@@ -65,14 +73,10 @@ class Fetcher(object):
         - args: Additional args to pass to the actual fetcher
         """
         (fetcher, url) = self.get_fetcher(src)
-        cwd = os.getcwd()
         if not os.path.isdir(dest):
             os.mkdir(dest)
-        os.chdir(dest)
         fetcher.assert_requirements()
-        result = fetcher.fetch_url(url, dest, dirname, args)
-        os.chdir(cwd)
-        return result
+        return fetcher.fetch_url(url, dest, dirname, args)
 
     def update_src(self, src, dest, dirname, args=None):
         """
@@ -82,12 +86,20 @@ class Fetcher(object):
         - args: Additional args to pass to the actual fetcher
         """
         (fetcher, url) = self.get_fetcher(src)
-        cwd = os.getcwd()
-        os.chdir(dest)
         fetcher.assert_requirements()
-        result = fetcher.update_src(url, dest, dirname, args)
-        os.chdir(cwd)
-        return result
+        return fetcher.update_src(url, dest, dirname, args)
+
+    def probe(self, src, timeout):
+        """
+        Check if src responds within timeout seconds (see FetcherBase.probe()).
+        Sources we have no fetcher for count as failed.
+        """
+        try:
+            (fetcher, url) = self.get_fetcher(src)
+        except PBException as ex:
+            self.log.debug("Can't probe {0}: {1}".format(src, ex))
+            return False
+        return fetcher.probe(url, timeout)
 
     def fetch(self, recipe):
         """
@@ -101,19 +113,20 @@ class Fetcher(object):
         if self.check_fetched(recipe):
             self.log.info("Already fetched: {0}".format(recipe.id))
             return True
-        # Jump to the src directory
-        cwd = os.getcwd()
-        self.log.debug("Switching to src directory: {0}".format(self.src_dir))
         if not os.path.isdir(self.src_dir):
             os.mkdir(self.src_dir)
-        os.chdir(self.src_dir)
         if os.path.exists(os.path.join(self.src_dir, recipe.id)):
             raise PBException(
                 "Directory {d} already exists!".format(d=os.path.join(self.src_dir, recipe.id))
             )
         # Do the fetch
-        for src in recipe.source:
-            src = recipe.var_replace_all(src)
+        mirrors = None
+        srcs = [recipe.var_replace_all(src) for src in recipe.source]
+        if len(srcs) > 1 and bool(self.cfg.get('mirror-selection')):
+            from pybombs.mirror_manager import MirrorManager
+            mirrors = MirrorManager()
+            srcs = mirrors.rank(srcs, self.probe)
+        for src in srcs:
             self.log.trace("Trying to fetch {0}".format(src))
             try:
                 if self.fetch_url(src, self.src_dir, recipe.id, recipe.get_dict()):
@@ -122,7 +135,6 @@ class Fetcher(object):
                     if self.inventory.get_state(recipe.id) < self.inventory.STATE_FETCHED:
                         self.inventory.set_state(recipe.id, self.inventory.STATE_FETCHED)
                     self.inventory.save()
-                    os.chdir(cwd)
                     return True
             except PBException as ex:
                 self.log.debug("That didn't work.")
@@ -130,6 +142,9 @@ class Fetcher(object):
             except Exception as ex:
                 self.log.error("Unexpected error while fetching {0}.".format(src))
                 self.log.error(ex)
+            if mirrors is not None:
+                # Failed fetches count against the host, too
+                mirrors.record([(src, None)])
         # Ideally, we've left the function at this point.
         raise PBException("Unable to fetch recipe {0}".format(recipe.id))
 
@@ -158,13 +173,36 @@ class Fetcher(object):
         This means the build dir might actually survive.
         """
         self.log.debug("Updating source for recipe: {0}".format(recipe.id))
+        with _UPDATED_SOURCES_LOCK:
+            already_updated = (self.src_dir, recipe.id) in _UPDATED_SOURCES
+        if already_updated:
+            self.log.debug("Source for {0} was already updated.".format(recipe.id))
+        elif not self.update_tree(recipe):
+            return False
+        if self.inventory.get_state(recipe.id) >= self.inventory.STATE_CONFIGURED:
+            self.log.trace("Setting package state to 'configured'.")
+            self.inventory.set_state(recipe.id, self.inventory.STATE_CONFIGURED)
+        else:
+            self.log.trace("Setting package state to 'fetched'.")
+            self.inventory.set_state(recipe.id, self.inventory.STATE_FETCHED)
+        # From here on, the state says that the package needs to be rebuilt:
+        if self.inventory.get_key(recipe.id, 'rebuild_pending'):
+            self.inventory.set_key(recipe.id, 'rebuild_pending', False)
+        self.inventory.save()
+        self.log.trace("Update completed.")
+        return True
+
+    def update_tree(self, recipe):
+        """
+        Update the source directory of recipe, like update(), but leave the
+        package state in the inventory alone.
+
+        Returns False if the recipe isn't fetched yet, and raises a
+        PBException if the update fails.
+        """
         if not self.check_fetched(recipe):
             self.log.error("Cannot update recipe {r}, it is not yet fetched.".format(r=recipe.id))
             return False
-        # Jump to the src directory
-        cwd = os.getcwd()
-        self.log.debug("Switching to src directory: {0}".format(self.src_dir))
-        os.chdir(self.src_dir)
         if not os.path.isdir(os.path.join(self.src_dir, recipe.id)):
             raise PBException("Source directory {d} does not exist!!".format(
                 d=os.path.join(self.src_dir, recipe.id)
@@ -178,15 +216,6 @@ class Fetcher(object):
         try:
             if self.update_src(src, self.src_dir, recipe.id, recipe.get_dict()):
                 self.log.trace("Update successful.")
-                if self.inventory.get_state(recipe.id) >= self.inventory.STATE_CONFIGURED:
-                    self.log.trace("Setting package state to 'configured'.")
-                    self.inventory.set_state(recipe.id, self.inventory.STATE_CONFIGURED)
-                else:
-                    self.log.trace("Setting package state to 'fetched'.")
-                    self.inventory.set_state(recipe.id, self.inventory.STATE_FETCHED)
-                self.inventory.save()
-                os.chdir(cwd)
-                self.log.trace("Update completed.")
                 return True
         except PBException as ex:
             self.log.debug("That didn't work.")
@@ -197,6 +226,80 @@ class Fetcher(object):
         # Ideally, we've left the function at this point.
         raise PBException("Unable to update recipe {0}".format(recipe.id))
 
+    def is_up_to_date(self, recipe):
+        """
+        Return True if the source of recipe is known to be identical to what
+        update() would produce (see FetcherBase.is_up_to_date()). Sources that
+        update_all() changed are never up to date until update() was called,
+        even in later runs, so the package gets rebuilt.
+        """
+        if self.inventory.has(recipe.id) and self.inventory.get_key(recipe.id, 'rebuild_pending'):
+            return False
+        with _UPDATED_SOURCES_LOCK:
+            if (self.src_dir, recipe.id) in _UPDATED_SOURCES:
+                return not _UPDATED_SOURCES[(self.src_dir, recipe.id)]
+        if not self.check_fetched(recipe):
+            return False
+        src = self.inventory.get_key(recipe.id, 'source')
+        if not src:
+            return False
+        try:
+            (fetcher, url) = self.get_fetcher(src)
+            return fetcher.is_up_to_date(url, self.src_dir, recipe.id, recipe.get_dict())
+        except PBException as ex:
+            self.log.debug("Can't tell if {0} is up to date: {1}".format(recipe.id, ex))
+            return False
+
+    def update_all(self, recipes, jobs):
+        """
+        Update the sources of all recipes, using up to `jobs' worker
+        threads, so the network round trips overlap. Sources that are
+        already up to date are left alone. Like update_tree(), this doesn't
+        change any package states, so packages that don't get rebuilt
+        afterwards (e.g. because another build failed) stay installed.
+        Updated packages are marked as 'rebuild_pending' in the inventory
+        instead, so later runs know they still need a rebuild.
+
+        Later calls to update() and is_up_to_date() for these recipes use
+        the results instead of going back to the network. Failed updates
+        are not remembered, so they're retried (and reported) there.
+
+        Returns a dict package -> 'updated', 'current' or 'failed'.
+        """
+        def _update_one(recipe):
+            " Update a single source, return its status "
+            if self.is_up_to_date(recipe):
+                updated = False
+            else:
+                try:
+                    if not self.update_tree(recipe):
+                        return 'failed'
+                except PBException as ex:
+                    return _on_error(recipe, ex)
+                updated = True
+                self.inventory.set_key(recipe.id, 'rebuild_pending', True)
+                self.inventory.save()
+            with _UPDATED_SOURCES_LOCK:
+                _UPDATED_SOURCES[(self.src_dir, recipe.id)] = updated
+            return 'updated' if updated else 'current'
+        def _on_error(recipe, ex):
+            " Report a failed update "
+            self.log.warning("Unable to update source for {0}, will retry later: {1}".format(recipe.id, str(ex)))
+            return 'failed'
+        start = time.time()
+        try:
+            results = workers.run_parallel(_update_one, recipes, jobs, on_error=_on_error)
+        except KeyboardInterrupt:
+            self.log.info("Caught Ctrl+C. Cancelled all running updates.")
+            raise
+        results = {recipe.id: status for recipe, status in results.items()}
+        statuses = list(results.values())
+        self.log.info("Updated sources in {0:.1f}s: {1} updated, {2} already up to date, {3} failed".format(
+            time.time() - start,
+            statuses.count('updated'), statuses.count('current'), statuses.count('failed'),
+        ))
+        return results
+
     def check_fetched(self, recipe):
         """
         Check if the recipe was downloaded to the current source directory
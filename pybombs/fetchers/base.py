@@ -61,6 +61,27 @@ class FetcherBase(Requirer):
         """
         raise NotImplementedError
 
+    def is_up_to_date(self, url, dest, dirname, args=None):
+        """
+        Return True if the source in `dest/dirname' is known to be the same
+        as what update_src() would produce, so the update can be skipped.
+        False means it might not be. Must be a lot faster than update_src().
+
+        Takes the same arguments as update_src(). The default implementation
+        always returns False.
+        """
+        return False
+
+    def probe(self, url, timeout):
+        """
+        Check if url can be fetched from, spending no more than about
+        timeout seconds. Must be safe to call from several threads.
+
+        Returns True if the server responded, False if it didn't, and None
+        if this fetcher can't tell (the default).
+        """
+        return None
+
 ### Factory functions #######################################################
 def get_all():
     """
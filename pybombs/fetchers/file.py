@@ -46,13 +46,13 @@ class File(FetcherBase):
         if not os.path.isfile(url):
             self.log.error("File not found: {0}".format(url))
             return False
-        filename = os.path.split(url)[-1]
+        filename = os.path.join(dest, os.path.split(url)[-1])
         self.log.debug("Looking for file: {0}".format(filename))
         if os.path.isfile(filename):
             self.log.info("File already exists in source dir: {0}".format(filename))
         else:
             self.log.debug("Symlinking file to source dir.")
-            os.symlink(url, os.path.join(os.getcwd(), filename))
+            os.symlink(os.path.abspath(url), filename)
         if "md5" in args:
             self.log.debug("Calculating MD5 sum for {0}...".format(filename))
             actual_md5 = utils.md5sum(filename)
@@ -62,7 +62,7 @@ class File(FetcherBase):
         if utils.is_archive(filename):
             self.log.debug("Unpacking {ar}".format(ar=filename))
             # Move to the correct source location.
-            utils.extract_to(filename, dirname)
+            utils.extract_to(filename, os.path.join(dest, dirname))
             # Remove the archive once it has been extracted
             os.remove(filename)
         return True
@@ -74,8 +74,14 @@ class File(FetcherBase):
         - dirname: Put the result into a dir with this name, it'll be a subdir of dest
         - args: Additional args to pass to the actual fetcher
         """
-        filename = os.path.split(url)[-1]
+        filename = os.path.join(dest, os.path.split(url)[-1])
         if os.path.isfile(filename):
             os.remove(filename)
         return self.fetch_url(url, dest, dirname, args)
 
+    def probe(self, url, timeout):
+        """
+        Local files are always fast, as long as they exist.
+        """
+        return os.path.isfile(url)
+
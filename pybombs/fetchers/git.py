@@ -24,6 +24,8 @@ git fetcher functions
 
 import os
 import re
+import tempfile
+import threading
 from pybombs.fetchers.base import FetcherBase
 from pybombs.utils import subproc
 from pybombs.pb_exception import PBException
@@ -63,6 +65,161 @@ def get_git_version():
         raise PBException("Unexpected output from 'git --version'!")
 
 
+# Number of submodules git fetches and updates at the same time
+SUBMODULE_JOBS = 8
+# Full commit hashes never move, everything else (tags, branches) might
+SHA1_RE = re.compile(r'^[0-9a-f]{40}$')
+# Time we give `git ls-remote' to list the refs of a repository
+LS_REMOTE_TIMEOUT = 30 # s
+
+def is_shallow(src_dir):
+    " Return True if the git repository in src_dir is a shallow clone "
+    return os.path.isfile(os.path.join(src_dir, '.git', 'shallow'))
+
+def has_commit(src_dir, rev):
+    " Return True if rev resolves to a commit in the repository in src_dir "
+    return rev_parse(src_dir, rev) is not None
+
+def get_batch_env(timeout):
+    """
+    Return an environment for git commands that talk to a server without
+    ever prompting for credentials, and that give up connecting via ssh
+    after timeout seconds.
+    """
+    env = dict(os.environ, GIT_TERMINAL_PROMPT='0')
+    if 'GIT_SSH' not in env:
+        env.setdefault(
+            'GIT_SSH_COMMAND',
+            'ssh -o BatchMode=yes -o ConnectTimeout={0}'.format(int(max(timeout, 1)))
+        )
+    return env
+
+# URL -> {ref: commit hash} or None, see get_remote_refs()
+_REMOTE_REFS = {}
+_REMOTE_REFS_LOCK = threading.Lock()
+
+def get_remote_refs(url, timeout=LS_REMOTE_TIMEOUT):
+    """
+    Return a dict ref -> commit hash for all branches and tags of the
+    repository at url. For annotated tags, the commit is listed as
+    'refs/tags/<tag>^{}'. Every URL is only queried once per process.
+
+    Returns None if the server didn't answer within timeout seconds, or
+    wanted credentials. Never prompts.
+    """
+    with _REMOTE_REFS_LOCK:
+        if url in _REMOTE_REFS:
+            return _REMOTE_REFS[url]
+    refs = None
+    # The list can be long, so it goes into a file instead of a pipe:
+    with tempfile.TemporaryFile() as out_file:
+        try:
+            ret_code = subproc.call_with_timeout(
+                ['git', 'ls-remote', '--heads', '--tags', url],
+                timeout, stdout=out_file, env=get_batch_env(timeout),
+            )
+        except OSError:
+            ret_code = None
+        if ret_code == 0:
+            out_file.seek(0)
+            refs = {}
+            for line in out_file.read().decode('utf-8').splitlines():
+                commit, _, ref = line.partition('\t')
+                refs[ref.strip()] = commit.strip()
+    with _REMOTE_REFS_LOCK:
+        _REMOTE_REFS[url] = refs
+    return refs
+
+def get_upstream_ref(src_dir):
+    """
+    Return the ref (e.g. 'refs/heads/master') on origin that the branch
+    checked out in src_dir tracks, or None.
+    """
+    try:
+        branch = subproc.check_output(
+            ['git', 'symbolic-ref', '--quiet', '--short', 'HEAD'], cwd=src_dir).strip()
+        if subproc.check_output(
+                ['git', 'config', 'branch.{0}.remote'.format(branch)], cwd=src_dir).strip() != 'origin':
+            return None
+        return subproc.check_output(
+            ['git', 'config', 'branch.{0}.merge'.format(branch)], cwd=src_dir).strip() or None
+    except subproc.CalledProcessError:
+        return None
+
+def rev_parse(src_dir, rev):
+    " Return the commit hash for rev in the repository in src_dir, or None "
+    try:
+        return subproc.check_output(
+            ['git', 'rev-parse', '--verify', '--quiet', rev + '^{commit}'],
+            cwd=src_dir,
+        ).strip()
+    except subproc.CalledProcessError:
+        return None
+
+def normalize_url(url):
+    " Return url in a form that's the same for all spellings of a repository "
+    url = url.strip().rstrip('/')
+    if url.endswith('.git'):
+        url = url[:-len('.git')]
+    return url
+
+def get_origin_url(src_dir):
+    """
+    Return the URL of the origin remote of the clone in src_dir, or None.
+    Reads the git config directly, which is a lot faster than asking git.
+    """
+    try:
+        with open(os.path.join(src_dir, '.git', 'config')) as config_file:
+            config = config_file.read()
+    except (IOError, OSError):
+        return None
+    mobj = re.search(
+        r'^\s*\[remote\s+"origin"\]([^\[]*)', config, re.MULTILINE)
+    if mobj is None:
+        return None
+    mobj = re.search(r'^\s*url\s*=\s*(.*?)\s*$', mobj.group(1), re.MULTILINE)
+    return mobj.group(1) if mobj else None
+
+def can_borrow_from(src_dir):
+    """
+    Return True if the clone in src_dir can lend its objects to a new clone:
+    It must be a regular clone, and not a shallow or partial one.
+    """
+    git_dir = os.path.join(src_dir, '.git')
+    if not os.path.isdir(os.path.join(git_dir, 'objects')) \
+            or os.path.exists(os.path.join(git_dir, 'shallow')):
+        return False
+    try:
+        with open(os.path.join(git_dir, 'config')) as config_file:
+            return 'partialclone' not in config_file.read()
+    except (IOError, OSError):
+        return False
+
+def find_local_clone(url, dirname, search_dirs, exclude=None):
+    """
+    Look for a clone of url in the subdirectories of search_dirs, preferring
+    the ones called dirname. exclude is a directory that is never returned.
+
+    Returns the path to the clone, or None.
+    """
+    url = normalize_url(url)
+    exclude = os.path.realpath(exclude) if exclude else None
+    for search_dir in search_dirs:
+        try:
+            subdirs = sorted(os.listdir(search_dir), key=lambda x: x != dirname)
+        except OSError:
+            continue
+        for subdir in subdirs:
+            src_dir = os.path.join(search_dir, subdir)
+            origin_url = get_origin_url(src_dir)
+            if origin_url is None or normalize_url(origin_url) != url \
+                    or os.path.realpath(src_dir) == exclude \
+                    or not can_borrow_from(src_dir):
+                continue
+            return src_dir
+    return None
+
+
 class Git(FetcherBase):
     """
     git fetcher
@@ -74,6 +231,64 @@ class Git(FetcherBase):
     def __init__(self):
         FetcherBase.__init__(self)
 
+    def get_clone_strategy(self, args):
+        """
+        Return a dict describing how to clone:
+        - depth: Number of commits to clone (None for the full history)
+        - filter: Partial clone filter, e.g. 'blob:none' (or None)
+        - single_branch: Only clone the branch we check out
+        - sparse: List of paths for a sparse checkout (empty for all)
+
+        The recipe keys gitdepth, gitfilter, gitsinglebranch and gitsparse
+        take precedence over the git-clone-depth, git-clone-filter and
+        git-single-branch config settings.
+        """
+        def _get(recipe_key, cfg_key):
+            " Recipe value, or config value if the recipe doesn't set one "
+            value = args.get(recipe_key)
+            if value is None or value == '':
+                value = self.cfg.get(cfg_key, '')
+            return value
+        depth = str(_get('gitdepth', 'git-clone-depth')).strip()
+        try:
+            depth = int(depth) if depth else None
+        except ValueError:
+            raise PBException("Invalid git clone depth: {0}".format(depth))
+        sparse = args.get('gitsparse') or []
+        if not isinstance(sparse, list):
+            sparse = str(sparse).split()
+        return {
+            'depth': depth if depth else None,
+            'filter': _get('gitfilter', 'git-clone-filter') or None,
+            'single_branch': bool(_get('gitsinglebranch', 'git-single-branch')),
+            'sparse': sparse,
+        }
+
+    def get_clone_search_dirs(self):
+        """
+        Return the directories that may hold clones new clones can borrow
+        objects from: The git-source-pools, and the source directories of
+        all prefixes that have an alias.
+        """
+        from pybombs.config_file import PBConfigFile
+        search_dirs = [
+            os.path.expanduser(pool)
+            for pool in (self.cfg.get('git-source-pools', '') or '').split(os.pathsep) if pool
+        ]
+        prefix = self.cfg.get_active_prefix()
+        for prefix_dir in sorted(getattr(prefix, 'prefix_aliases', {}).values()):
+            prefix_dir = os.path.expanduser(prefix_dir)
+            src_dir = os.path.join(prefix_dir, prefix.src_dir_name)
+            cfg_file = os.path.join(prefix_dir, prefix.prefix_conf_dir, self.cfg.cfg_file_name)
+            if os.path.isfile(cfg_file):
+                try:
+                    src_dir = os.path.expanduser(
+                        PBConfigFile(cfg_file, read_only=True).get('config').get('srcdir', src_dir))
+                except Exception as ex:
+                    self.log.debug("Can't read {0}: {1}".format(cfg_file, ex))
+            search_dirs.append(src_dir)
+        return search_dirs
+
     def fetch_url(self, url, dest, dirname, args=None):
         """
         git clone
@@ -82,10 +297,29 @@ class Git(FetcherBase):
         self.log.debug("We have git version %s", git_version)
         url, args = parse_git_url(url, args or {})
         self.log.debug("Using url - {0}".format(url))
+        strategy = self.get_clone_strategy(args)
         git_cmd = ['git', 'clone', url, dirname]
         if args.get('gitargs'):
             for arg in args.get('gitargs').split():
                 git_cmd.append(arg)
+        if any(arg.startswith(('--recursive', '--recurse-submodules')) for arg in git_cmd) \
+                and vcompare(">=", git_version, "2.9"):
+            git_cmd += ['--jobs', str(SUBMODULE_JOBS)]
+        if strategy['depth']:
+            git_cmd += ['--depth', str(strategy['depth'])]
+        if strategy['single_branch']:
+            git_cmd.append('--single-branch')
+        if strategy['filter']:
+            if vcompare(">=", git_version, "2.19"):
+                git_cmd.append('--filter=' + strategy['filter'])
+            else:
+                self.log.warn("git {0} can't do partial clones, ignoring filter.".format(git_version))
+        if strategy['sparse']:
+            if vcompare(">=", git_version, "2.25"):
+                git_cmd.append('--sparse')
+            else:
+                self.log.warn("git {0} can't do sparse checkouts, checking out everything.".format(git_version))
+                strategy['sparse'] = []
         if self.cfg.get("git-cache", False):
             from pybombs import gitcache_manager
             gcm = gitcache_manager.GitCacheManager(self.cfg.get("git-cache"))
@@ -96,6 +330,18 @@ class Git(FetcherBase):
                 if vcompare(">=", git_version, "2.11") else '--reference'
             )
             git_cmd.append(self.cfg.get("git-cache"))
+        reuse_clones = self.cfg.get('git-reuse-clones', '')
+        if reuse_clones == 'dissociate' and self.cfg.get("git-cache", False):
+            # --dissociate would copy everything from the git cache, too
+            reuse_clones = ''
+        if reuse_clones and vcompare(">=", git_version, "2.11"):
+            local_clone = find_local_clone(
+                url, dirname, self.get_clone_search_dirs(), exclude=os.path.join(dest, dirname))
+            if local_clone is not None:
+                self.log.info("Borrowing objects from {0}".format(local_clone))
+                git_cmd += ['--reference-if-able', local_clone]
+                if reuse_clones == 'dissociate':
+                    git_cmd.append('--dissociate')
         if args.get('gitbranch'):
             git_cmd.append('-b')
             git_cmd.append(args.get('gitbranch'))
@@ -105,44 +351,163 @@ class Git(FetcherBase):
             o_proc=o_proc,
             throw_ex=True,
             throw=True,
+            interactive=True,
+            cwd=dest,
         )
+        src_dir = os.path.join(dest, dirname)
+        if strategy['sparse']:
+            subproc.monitor_process(
+                args=['git', 'sparse-checkout', 'set'] + strategy['sparse'],
+                throw=True,
+                cwd=src_dir,
+            )
         # If we have a specific revision, checkout that
         if args.get('gitrev'):
-            cwd = os.getcwd()
-            src_dir = os.path.join(dest, dirname)
-            self.log.trace("Switching cwd to: {0}".format(src_dir))
-            os.chdir(src_dir)
+            if is_shallow(src_dir):
+                if not self.checkout_rev(src_dir, args.get('gitrev'), strategy['depth']):
+                    raise PBException("Could not check out {0}".format(args.get('gitrev')))
+                return True
             git_co_cmd = ["git", "checkout", "--force", args.get('gitrev')]
             subproc.monitor_process(
                 args=git_co_cmd,
                 o_proc=o_proc,
                 throw_ex=True,
+                cwd=src_dir,
             )
-            self.log.trace("Switching cwd to: {0}".format(cwd))
-            os.chdir(cwd)
+        return True
+
+    def checkout_rev(self, src_dir, rev, depth=None, refresh=False):
+        """
+        Check out rev in the shallow clone in src_dir. If rev isn't in the
+        clone (or refresh is True, and rev could have moved), fetch only
+        rev, down to the given depth. If the server won't give us rev on its
+        own (e.g. because it's an abbreviated hash), fetch the full history.
+
+        Returns True on success.
+        """
+        target = rev
+        if refresh or not has_commit(src_dir, rev):
+            self.log.debug("Fetching {0} into shallow clone".format(rev))
+            if subproc.monitor_process(
+                    ['git', 'fetch', '--depth', str(depth or 1), 'origin', rev],
+                    interactive=True, cwd=src_dir) == 0:
+                target = 'FETCH_HEAD'
+            else:
+                self.log.debug("Can't fetch {0} on its own, fetching full history".format(rev))
+                if subproc.monitor_process(
+                        ['git', 'fetch', '--unshallow', '--tags', 'origin'],
+                        interactive=True, cwd=src_dir) != 0:
+                    return False
+        return subproc.monitor_process(
+            ['git', 'checkout', '--force', target], cwd=src_dir) == 0
+
+    def probe(self, url, timeout):
+        """
+        Check if the repository at url responds, using git ls-remote.
+        Never prompts for credentials.
+        """
+        url = parse_git_url(url, {})[0]
+        try:
+            ret_code = subproc.call_with_timeout(
+                ['git', 'ls-remote', url, 'HEAD'], timeout, env=get_batch_env(timeout))
+        except OSError:
+            return None
+        return ret_code == 0
+
+    def is_up_to_date(self, url, dest, dirname, args=None):
+        """
+        Return True if dest/dirname already has what update_src() would
+        check out: HEAD must be the commit that gitrev or gitbranch point to
+        upstream (determined with a single `git ls-remote'), and all
+        submodules must be checked out as recorded. Without either, HEAD
+        must be where the upstream branch of the current branch points to.
+        If the server can't be asked, the source isn't up to date.
+        """
+        url, args = parse_git_url(url, dict(args or {}))
+        src_dir = os.path.join(dest, dirname)
+        head = rev_parse(src_dir, 'HEAD')
+        if head is None:
+            return False
+        if args.get('gitrev') and SHA1_RE.match(args.get('gitrev')):
+            # No need to ask the server
+            target = args.get('gitrev')
+        else:
+            if args.get('gitrev'):
+                candidates = [
+                    ref.format(args.get('gitrev'))
+                    for ref in ('refs/tags/{0}^{{}}', 'refs/tags/{0}', 'refs/heads/{0}')
+                ]
+            elif args.get('gitbranch'):
+                candidates = ['refs/heads/' + args.get('gitbranch')]
+            else:
+                candidates = [get_upstream_ref(src_dir)]
+                if candidates[0] is None:
+                    self.log.debug("{0}: No upstream branch to compare to".format(dirname))
+                    return False
+            refs = get_remote_refs(url)
+            if refs is None:
+                self.log.debug("Can't list remote refs of {0}".format(url))
+                return False
+            target = next((refs[ref] for ref in candidates if ref in refs), None)
+            if target is None and args.get('gitrev'):
+                # Not a tag or branch, so it's an abbreviated hash, which
+                # doesn't move
+                target = rev_parse(src_dir, args.get('gitrev'))
+        if target != head:
+            self.log.debug("{0}: HEAD is at {1}, upstream is at {2}".format(dirname, head, target))
+            return False
+        if os.path.exists(os.path.join(src_dir, '.gitmodules')):
+            try:
+                status = subproc.check_output(
+                    ['git', 'submodule', 'status', '--recursive'], cwd=src_dir)
+            except subproc.CalledProcessError:
+                return False
+            # Lines start with ' ' for submodules that are up to date
+            if any(line[:1] != ' ' for line in status.splitlines()):
+                return False
         return True
 
     def update_src(self, url, dest, dirname, args=None):
         """
         git pull / git checkout
+
+        Shallow clones are only deepened as far as needed to get the
+        requested rev or branch.
         """
         args = args or {}
         self.log.debug("Using url {0}".format(url))
-        cwd = os.getcwd()
         src_dir = os.path.join(dest, dirname)
-        self.log.trace("Switching cwd to: {0}".format(src_dir))
-        os.chdir(src_dir)
-        if args.get('gitrev'):
+        shallow = is_shallow(src_dir)
+        # Fetch and update submodules in parallel, if git can do that
+        jobs_args = ['--jobs', str(SUBMODULE_JOBS)] \
+            if vcompare(">=", get_git_version(), "2.9") else []
+        depth = str(self.get_clone_strategy(args)['depth'] or 1)
+        if args.get('gitrev') and shallow:
+            rev = args.get('gitrev')
+            if not self.checkout_rev(src_dir, rev, depth, refresh=not SHA1_RE.match(rev)):
+                self.log.error("Could not check out {0}".format(rev))
+                return False
+            git_cmds = []
+        elif args.get('gitrev'):
             # If we have a rev or tag specified, fetch, then checkout.
             git_cmds = [
-                ['git', 'fetch', '--tags', '--all', '--prune'],
+                ['git', 'fetch', '--tags', '--all', '--prune'] + jobs_args,
                 ['git', 'checkout', '--force', args.get('gitrev')],
             ]
+        elif args.get('gitbranch') and shallow:
+            # Only fetch the tip of the branch, whatever else is configured
+            # for the remote
+            branch = args.get('gitbranch')
+            git_cmds = [
+                ['git', 'fetch', '--depth', depth, 'origin',
+                 '+refs/heads/{0}:refs/remotes/origin/{0}'.format(branch)],
+                ['git', 'checkout', '--force', '-B', branch, 'refs/remotes/origin/' + branch],
+            ]
         elif args.get('gitbranch'):
             # Branch is similar, only we make sure we're up to date
             # with the remote branch
             git_cmds = [
-                ['git', 'fetch', '--tags', '--all', '--prune'],
+                ['git', 'fetch', '--tags', '--all', '--prune'] + jobs_args,
                 ['git', 'checkout', '--force', args.get('gitbranch')],
                 ['git', 'reset', '--hard', '@{u}'],
             ]
@@ -151,17 +516,16 @@ class Git(FetcherBase):
             git_cmds = [
                 ['git', 'pull', '--rebase'],
             ]
-        git_cmds.append(['git', 'submodule', 'update', '--recursive'])
+        git_cmds.append(['git', 'submodule', 'update', '--recursive'] + jobs_args)
         o_proc = None
         for cmd in git_cmds:
             try:
-                if subproc.monitor_process(args=cmd, o_proc=o_proc, throw_ex=True) != 0:
+                if subproc.monitor_process(
+                        args=cmd, o_proc=o_proc, throw_ex=True, interactive=True, cwd=src_dir) != 0:
                     self.log.error("Could not run command `{0}`".format(" ".join(cmd)))
                     return False
             except Exception:
                 self.log.error("Could not run command `{0}`".format(" ".join(cmd)))
                 raise PBException("git commands failed.")
-        self.log.trace("Switching cwd back to: {0}".format(cwd))
-        os.chdir(cwd)
         return True
 
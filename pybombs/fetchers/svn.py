@@ -55,6 +55,8 @@ class Svn(FetcherBase):
             args=svn_cmd,
             #o_proc=foo, # FIXME
             throw_ex=True,
+            interactive=True,
+            cwd=dest,
         )
         return True
 
@@ -67,10 +69,6 @@ class Svn(FetcherBase):
         """
         args = args or {}
         self.log.debug("Using url {0}".format(url))
-        cwd = os.getcwd()
-        src_dir = os.path.join(dest, dirname)
-        self.log.trace("Switching cwd to: {0}".format(src_dir))
-        os.chdir(src_dir)
         svn_cmd = ['svn', 'up', '--force']
         if args.get('svnrev'):
             svn_cmd.append('--revision')
@@ -79,8 +77,19 @@ class Svn(FetcherBase):
             args=svn_cmd,
             throw_ex=True,
             #o_proc=foo #FIXME
+            interactive=True,
+            cwd=os.path.join(dest, dirname),
         )
-        self.log.trace("Switching cwd back to: {0}".format(cwd))
-        os.chdir(cwd)
         return True
 
+
+    def probe(self, url, timeout):
+        """
+        Check if the repository at url responds, using svn info.
+        """
+        try:
+            ret_code = subproc.call_with_timeout(
+                ['svn', 'info', '--non-interactive', url], timeout)
+        except OSError:
+            return None
+        return ret_code == 0
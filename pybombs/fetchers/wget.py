@@ -26,77 +26,286 @@ from  __future__ import print_function
 import math
 import os
 import sys
+import time
+import shutil
+import re
+import hashlib
+import tarfile
+import threading
 from pybombs import utils
+from pybombs import pb_logging
+from pybombs.distcache_manager import DistCacheManager
 from pybombs.fetchers.base import FetcherBase
 from pybombs.pb_exception import PBException
+from pybombs.utils import compression
 
 
-def _download_with_requests(url, filesize=None, range_start=None, hash_md5=None, partial_retry_count=None):
+# Reads from the network start at the minimum size, and grow as long as they
+# complete quickly (and shrink if they're slow, to keep the progress moving).
+MIN_READ_SIZE = 64 * 1024 # bytes
+MAX_READ_SIZE = 4 * 1024 * 1024 # bytes
+PROGRESS_INTERVAL = 0.25 # s
+# Interrupted downloads are resumed up to MAX_RETRY_COUNT times, waiting
+# RETRY_BACKOFF s before the first retry, and twice as long before every
+# following one (but never more than MAX_RETRY_BACKOFF s).
+MAX_RETRY_COUNT = 10
+RETRY_BACKOFF = 0.5 # s
+MAX_RETRY_BACKOFF = 30 # s
+CONNECT_TIMEOUT = 30 # s
+READ_TIMEOUT = 60 # s
+
+# Tarballs with these extensions are unpacked while they're downloaded
+STREAMABLE_URL_RE = re.compile(r'\.(tar|tar\.gz|tgz|tar\.bz2|tbz2?|tar\.xz|txz|tar\.zst|tzst)$')
+
+# One requests.Session per thread, so connections to the same server can
+# be reused.
+_SESSIONS = threading.local()
+
+def _get_session():
+    " Return the requests.Session for the current thread "
+    session = getattr(_SESSIONS, 'session', None)
+    if session is None:
+        import requests
+        session = requests.Session()
+        session.headers['User-Agent'] = 'PyBOMBS'
+        _SESSIONS.session = session
+    return session
+
+def _new_hashes():
+    " Return a dict of all the hashes we calculate for downloads "
+    return {'md5': hashlib.md5(), 'sha256': hashlib.sha256()}
+
+def _hash_file(filename):
+    " Return the hex digests of filename, see _new_hashes() "
+    hashes = _new_hashes()
+    with open(filename, 'rb') as in_file:
+        for buff in iter(lambda: in_file.read(MIN_READ_SIZE), b""):
+            for file_hash in hashes.values():
+                file_hash.update(buff)
+    return {name: file_hash.hexdigest() for name, file_hash in hashes.items()}
+
+class _DownloadProgress(object):
     """
-    Do a wget: Download the file specified in url to the cwd.
-    Return the filename and the MD5 hash as hexdigest string.
+    Prints the download progress, but at most every PROGRESS_INTERVAL
+    seconds.
     """
-    import requests
-    import hashlib
-    MAX_RETRY_COUNT = 10
-    filename = os.path.split(url)[1]
-    req_headers = {'User-Agent': 'PyBOMBS'}
-    if range_start is not None:
-        req_headers['Range'] = "bytes={0}-".format(range_start)
-    req = requests.get(url, stream=True, headers=req_headers)
-    filesize = filesize or float(req.headers.get('content-length', 0))
-    filesize_dl = range_start or 0
-    hash_md5 = hash_md5 or hashlib.md5()
-    file_mode = "wb" if range_start is None else "ab"
-    with open(filename, file_mode) as f:
-        for buff in req.iter_content(chunk_size=1024):
-            if buff:
-                f.write(buff)
-                filesize_dl += len(buff)
-                hash_md5.update(buff)
-            # TODO wrap this into an output processor or at least
-            # standardize the progress bars we use
-            if filesize:
-                status = r"%05d kB / %05d kB (%03d%%)" % (
-                        int(math.ceil(filesize_dl/1000.)),
-                        int(math.ceil(filesize/1000.)),
-                        int(math.ceil(filesize_dl*100.)/filesize)
-                )
-                if filesize_dl > filesize:
-                    raise IOError("Downloaded file size is bigger than specified file size.")
-            else:
-                status = r"%05d kB" % (
-                        int(math.ceil(filesize_dl/1000.)),
-                )
-            status += chr(8)*(len(status)+1)
-            sys.stdout.write(status)
-    if filesize != 0 and filesize_dl != filesize:
-        partial_retry_count = partial_retry_count or 0
-        if partial_retry_count < MAX_RETRY_COUNT:
-            return _download_with_requests(url, filesize, filesize_dl, hash_md5, partial_retry_count+1)
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._last_update = 0
+
+    def update(self, filesize_dl, filesize, force=False):
+        " Print the current status, if it's time to "
+        if not self.enabled:
+            return
+        now = time.time()
+        if not force and now - self._last_update < PROGRESS_INTERVAL:
+            return
+        self._last_update = now
+        if filesize:
+            status = r"%05d kB / %05d kB (%03d%%)" % (
+                    int(math.ceil(filesize_dl/1000.)),
+                    int(math.ceil(filesize/1000.)),
+                    int(math.ceil(filesize_dl*100.)/filesize)
+            )
         else:
-            raise IOError("Downloaded file size does not match specified file size.")
-    sys.stdout.write("\n")
-    return filename, hash_md5.hexdigest()
-
-def _download_with_wget(url):
-    " Use the wget tool itself "
-    def get_md5(filename):
-        " Return MD5 sum of filename using the md5sum tool "
-        md5_exe = sysutils.which('md5sum')
-        if md5_exe is not None:
-            return subproc.check_output([md5_exe, filename])[0:32]
-        return None
+            status = r"%05d kB" % (
+                    int(math.ceil(filesize_dl/1000.)),
+            )
+        status += chr(8)*(len(status)+1)
+        sys.stdout.write(status)
+        sys.stdout.flush()
+
+    def done(self, filesize_dl, filesize):
+        " Print the final status "
+        if self.enabled:
+            self.update(filesize_dl, filesize, force=True)
+            sys.stdout.write("\n")
+
+def _read_adaptive(raw):
+    """
+    Yield the contents of the raw response stream raw, in chunks of
+    MIN_READ_SIZE to MAX_READ_SIZE bytes.
+    """
+    read_size = MIN_READ_SIZE
+    while True:
+        start = time.time()
+        buff = raw.read(read_size, decode_content=True)
+        if not buff:
+            return
+        yield buff
+        elapsed = time.time() - start
+        if elapsed < PROGRESS_INTERVAL / 4 and read_size < MAX_READ_SIZE:
+            read_size *= 2
+        elif elapsed > PROGRESS_INTERVAL and read_size > MIN_READ_SIZE:
+            read_size //= 2
+
+class _Download(object):
+    """
+    A download from url, which can be read like a file. Interrupted
+    transfers are resumed where they stopped, if the server supports that.
+    Otherwise, the transfer is restarted, and the part we already have is
+    skipped. Either way, readers don't notice.
+
+    All data is hashed (see _new_hashes()) as it passes through. If tee is
+    given, it's also written to that file object.
+    """
+    def __init__(self, url, show_progress=True, tee=None):
+        import requests
+        try:
+            from requests.packages.urllib3.exceptions import HTTPError as Urllib3Error
+        except ImportError:
+            from urllib3.exceptions import HTTPError as Urllib3Error
+        self.log = pb_logging.logger.getChild("Fetcher.wget")
+        self.url = url
+        self.tee = tee
+        self.hashes = _new_hashes()
+        self.filesize = None
+        self.filesize_dl = 0
+        self._retry_errors = (requests.ConnectionError, requests.Timeout, requests.HTTPError, Urllib3Error)
+        self._retry_count = 0
+        self._progress = _DownloadProgress(show_progress)
+        self._req = None
+        self._chunks = None
+        self._buffer = b''
+        self._buffer_pos = 0
+        self._done = False
+
+    def _connect(self):
+        " Request everything we don't have yet "
+        req_headers = {}
+        if self.filesize_dl:
+            req_headers['Range'] = "bytes={0}-".format(self.filesize_dl)
+        self._req = _get_session().get(
+            self.url, stream=True, headers=req_headers,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        if 400 <= self._req.status_code < 500:
+            # No point in retrying these
+            raise IOError("Server returned {0} for {1}".format(self._req.status_code, self.url))
+        self._req.raise_for_status()
+        skip = 0
+        if self.filesize_dl and self._req.status_code != 206:
+            self.log.debug("Server can't resume downloads, skipping {0} bytes.".format(self.filesize_dl))
+            skip = self.filesize_dl
+        if self.filesize is None and self._req.headers.get('content-length'):
+            self.filesize = self.filesize_dl - skip + int(self._req.headers['content-length'])
+        self._chunks = self._read_chunks(skip)
+
+    def _read_chunks(self, skip):
+        " Yield the response body, minus the first skip bytes "
+        for buff in _read_adaptive(self._req.raw):
+            if skip >= len(buff):
+                skip -= len(buff)
+                continue
+            yield buff[skip:]
+            skip = 0
+
+    def _close_request(self):
+        " Close the current connection, if any "
+        if self._req is not None:
+            self._req.close()
+        self._req = None
+        self._chunks = None
+
+    def _next_chunk(self):
+        " Return the next chunk of the download, or b'' when it's complete "
+        while True:
+            try:
+                if self._chunks is None:
+                    self._connect()
+                buff = next(self._chunks, b'')
+                if buff:
+                    self.filesize_dl += len(buff)
+                    if self.filesize is not None and self.filesize_dl > self.filesize:
+                        raise IOError("Downloaded file size is bigger than specified file size.")
+                    for file_hash in self.hashes.values():
+                        file_hash.update(buff)
+                    if self.tee is not None:
+                        self.tee.write(buff)
+                    self._progress.update(self.filesize_dl, self.filesize)
+                    return buff
+                self._close_request()
+                if self.filesize is None or self.filesize_dl == self.filesize:
+                    self._progress.done(self.filesize_dl, self.filesize)
+                    return b''
+                self.log.debug("Connection closed after {0} of {1} bytes.".format(
+                    self.filesize_dl, self.filesize))
+            except self._retry_errors as ex:
+                self._close_request()
+                self.log.debug("Download interrupted after {0} bytes: {1}".format(self.filesize_dl, ex))
+            self._retry_count += 1
+            if self._retry_count > MAX_RETRY_COUNT:
+                raise IOError("Downloaded file size does not match specified file size.")
+            backoff = min(RETRY_BACKOFF * 2**(self._retry_count-1), MAX_RETRY_BACKOFF)
+            self.log.debug("Retrying in {0:.1f}s...".format(backoff))
+            time.sleep(backoff)
+
+    def read(self, size=-1):
+        " Read up to size bytes, like file.read() "
+        if size is None or size < 0:
+            return b''.join(self.iter_chunks())
+        if self._buffer_pos == len(self._buffer):
+            if self._done:
+                return b''
+            self._buffer, self._buffer_pos = self._next_chunk(), 0
+            if not self._buffer:
+                self._done = True
+                return b''
+        data = self._buffer[self._buffer_pos:self._buffer_pos+size]
+        self._buffer_pos += len(data)
+        return data
+
+    def iter_chunks(self):
+        " Yield the rest of the download in chunks "
+        while True:
+            data = self.read(MAX_READ_SIZE)
+            if not data:
+                return
+            yield data
+
+    def drain(self):
+        " Download the rest, e.g. to complete the hashes "
+        for _ in self.iter_chunks():
+            pass
+
+    def hexdigests(self):
+        " Return the hashes of everything downloaded so far as hex strings "
+        return {name: file_hash.hexdigest() for name, file_hash in self.hashes.items()}
+
+    def close(self):
+        " Stop downloading "
+        self._close_request()
+
+
+def _download_with_requests(url, dest, show_progress=True):
+    """
+    Do a wget: Download the file specified in url to the directory dest.
+    Interrupted downloads are resumed (see _Download).
+
+    Return the filename and a dict with the hex digests of the file (see
+    _new_hashes()), which are calculated while downloading.
+    """
+    filename = os.path.join(dest, os.path.split(url)[1])
+    download = _Download(url, show_progress)
+    try:
+        with open(filename, 'wb') as out_file:
+            for buff in download.iter_chunks():
+                out_file.write(buff)
+    finally:
+        download.close()
+    return filename, download.hexdigests()
+
+def _download_with_wget(url, dest):
+    " Use the wget tool itself, download into dest "
     from pybombs.utils import sysutils
     from pybombs.utils import subproc
     wget = sysutils.which('wget')
     if wget is None:
         raise PBException("wget executable not found")
-    filename = os.path.split(url)[1]
-    retval = subproc.monitor_process([wget, url], throw=True)
+    filename = os.path.join(dest, os.path.split(url)[1])
+    retval = subproc.monitor_process([wget, url], throw=True, cwd=dest)
     if retval:
         raise PBException("wget failed to wget")
-    return filename, get_md5(filename)
+    return filename, _hash_file(filename)
 
 class Wget(FetcherBase):
     """
@@ -110,43 +319,145 @@ class Wget(FetcherBase):
     def __init__(self):
         FetcherBase.__init__(self)
 
-    def fetch_url(self, url, dest, dirname, args=None):
+    def fetch_url(self, url, dest, dirname, args=None, use_cache=True):
         """
         - src: URL, without the <type>+ prefix.
         - dest: Store the fetched stuff into here
         - dirname: Put the result into a dir with this name, it'll be a subdir of dest
         - args: Additional args to pass to the actual fetcher
+        - use_cache: Use a previously downloaded file from the download cache,
+                     if available. Downloads are always added to the cache.
         """
+        args = args or {}
+        dist_cache = DistCacheManager()
+        if use_cache:
+            cached_filename = dist_cache.get(url, args.get('md5'))
+            if cached_filename is not None:
+                self.log.info("Using cached download: {0}".format(cached_filename))
+                return self._unpack(cached_filename, url, dest, dirname, True)
+        path = os.path.join(dest, dirname)
+        path_existed = os.path.isdir(path)
+        # Streaming extracts before the hashes can be checked, which is only
+        # safe if we can throw away the result:
+        pinned = 'md5' in args or 'sha256' in args
+        if STREAMABLE_URL_RE.search(url) and not (pinned and path_existed):
+            self.log.debug("Downloading and unpacking: {0}".format(url))
+            hashes, cached_filename = self._fetch_streaming(url, path, dist_cache)
+            if hashes is not None:
+                if not self._check_hashes(url, hashes, args):
+                    if not path_existed:
+                        shutil.rmtree(path, ignore_errors=True)
+                    if cached_filename is not None:
+                        os.remove(cached_filename)
+                    return False
+                if cached_filename is not None:
+                    dist_cache.add(url, cached_filename, hashes['md5'],
+                                   name=os.path.basename(url), move=True)
+                return True
+            if not path_existed:
+                shutil.rmtree(path, ignore_errors=True)
         try:
             self.log.debug("Downloading file: {0}".format(url))
-            filename, md5_hash = _download_with_requests(url)
+            filename, hashes = _download_with_requests(url, dest)
         except IOError as ex:
             self.log.error("Download using requests failed: " + str(ex))
             try:
                 self.log.warn("Attempting to download using wget...")
-                filename, md5_hash = _download_with_wget(url)
+                filename, hashes = _download_with_wget(url, dest)
             except PBException as ex:
                 self.log.warn(str(ex))
                 return False
-        self.log.debug("MD5: {0}".format(md5_hash))
-        if 'md5' in args and args['md5'] != md5_hash:
-            self.log.error("While downloading {fname}: MD5 hashes to not match. Expected {exp}, got {actual}.".format(
-                fname=filename, exp=args['md5'], actual=md5_hash
-            ))
+        if not self._check_hashes(filename, hashes, args):
+            os.remove(filename)
             return False
+        dist_cache.add(url, filename, hashes['md5'])
+        return self._unpack(filename, url, dest, dirname, False)
+
+    def _check_hashes(self, filename, hashes, args):
+        " Return True if hashes match the ones given in the recipe args "
+        self.log.debug("MD5: {0}".format(hashes['md5']))
+        for hash_name in ('md5', 'sha256'):
+            if hash_name in args and args[hash_name] != hashes[hash_name]:
+                self.log.error("While downloading {fname}: {hname} hashes to not match. Expected {exp}, got {actual}.".format(
+                    fname=filename, hname=hash_name.upper(), exp=args[hash_name], actual=hashes[hash_name]
+                ))
+                return False
+        return True
+
+    def _fetch_streaming(self, url, path, dist_cache):
+        """
+        Download the tarball at url, and extract it into path while it's
+        downloading, so it never has to be stored. If dist_cache is enabled,
+        a copy is written into a temporary file there, though.
+
+        Returns a tuple (hashes, filename) with the hex digests of the
+        download and the temporary file (or None). If the download can't be
+        streamed, returns (None, None).
+        """
+        tee_file, tee_filename = None, None
+        if dist_cache.enabled():
+            try:
+                tee_file, tee_filename = dist_cache.new_file()
+            except (IOError, OSError) as ex:
+                self.log.debug("Can't write to download cache: {0}".format(ex))
+        download = _Download(url, tee=tee_file)
+        streamed = False
+        try:
+            with compression.open_tar_stream(download) as archive:
+                utils.extract_tar(archive, path)
+            # Trailing padding counts for the hashes, too:
+            download.drain()
+            streamed = True
+        except (IOError, OSError, tarfile.TarError) as ex:
+            self.log.debug("Can't unpack {0} while downloading: {1}".format(url, ex))
+        finally:
+            download.close()
+            if tee_file is not None:
+                tee_file.close()
+        if not streamed:
+            if tee_filename is not None:
+                os.remove(tee_filename)
+            return None, None
+        return download.hexdigests(), tee_filename
+
+    def _unpack(self, filename, url, dest, dirname, from_cache):
+        """
+        Move the contents of the downloaded file into dest/dirname. Files
+        from the cache are left alone, anything else is removed once it's
+        extracted.
+        """
         if utils.is_archive(filename):
             # Move archive contents to the correct source location:
-            utils.extract_to(filename, dirname)
-            # Remove the archive once it has been extracted:
-            os.remove(filename)
+            utils.extract_to(filename, os.path.join(dest, dirname))
+            if not from_cache:
+                # Remove the archive once it has been extracted:
+                os.remove(filename)
+        elif from_cache:
+            shutil.copy(filename, os.path.join(dest, os.path.basename(url)))
         return True
 
+    def probe(self, url, timeout):
+        """
+        Send a HEAD request for url. Servers that don't allow HEAD requests
+        (405) count as responding.
+        """
+        try:
+            req = _get_session().head(url, allow_redirects=True, timeout=timeout)
+        except ImportError:
+            return None
+        except Exception as ex:
+            self.log.debug("Probing {0} failed: {1}".format(url, ex))
+            return False
+        return req.status_code < 400 or req.status_code == 405
+
     def update_src(self, src, dest, dirname, args=None):
         """
         For an update, we grab the archive and copy it over into the existing
-        directory. Luckily, that's exactly the same as fetch_url().
+        directory. Luckily, that's exactly the same as fetch_url(), except
+        that the archive is downloaded again, unless its MD5 sum is known.
         """
-        return self.fetch_url(src, dest, dirname, args)
+        args = args or {}
+        return self.fetch_url(src, dest, dirname, args, use_cache='md5' in args)
 
     #def get_version(self, recipe, url):
         ## TODO tbw
@@ -22,73 +22,208 @@
 
 from __future__ import print_function
 import os
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
 from six import iteritems
 from pybombs import pb_logging
+from pybombs.config_manager import config_manager
 from pybombs.utils import sysutils
 from pybombs.utils import subproc
+from pybombs.utils import workers
+
+# Serializes changes to the git cache when several packages are fetched
+# at the same time
+GIT_CACHE_LOCK = threading.RLock()
+# Default number of remotes that are fetched at the same time
+DEFAULT_FETCH_JOBS = 8
+
+# Git cache path -> [lock file, nesting depth], for the file locks this
+# process holds. Protected by GIT_CACHE_LOCK.
+_FILE_LOCKS = {}
 
 class GitCacheManager(object):
-    " Git cache manager "
-    def __init__(self, path):
+    """
+    Git cache manager.
+
+    Changes to the cache (adding remotes, recording fetch times) are done
+    while holding a file lock, so several PyBOMBS processes can share one
+    cache. Fetches happen outside of the lock: git can fetch different
+    remotes into one repository at the same time.
+    """
+    lock_filename = 'pybombs.lock'
+    fetch_times_filename = 'pybombs-fetch-times'
+
+    def __init__(self, path, max_age=None):
+        """
+        - path: The git cache
+        - max_age: Remotes that were fetched less than max_age seconds ago
+                   are not fetched again. Defaults to the git-cache-max-age
+                   setting.
+        """
         self.path = path
         self.log = pb_logging.logger.getChild("GitCacheManager")
+        if max_age is None:
+            try:
+                max_age = int(config_manager.get('git-cache-max-age'))
+            except (TypeError, ValueError):
+                max_age = int(config_manager.defaults['git-cache-max-age'][0])
+                self.log.warn("Invalid git-cache-max-age setting: {0}. Using {1} s.".format(
+                    config_manager.get('git-cache-max-age'), max_age))
+        self.max_age = max_age
         self.ensure_repo_exists(path)
         self.remotes = self.get_existing_remotes()
 
+    @contextmanager
+    def lock(self):
+        """
+        Lock the cache against other threads and processes. Can be nested.
+        """
+        with GIT_CACHE_LOCK:
+            key = os.path.realpath(self.path)
+            if key not in _FILE_LOCKS:
+                lock_file = open(os.path.join(self.path, self.lock_filename), 'a')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                _FILE_LOCKS[key] = [lock_file, 0]
+            _FILE_LOCKS[key][1] += 1
+            try:
+                yield
+            finally:
+                _FILE_LOCKS[key][1] -= 1
+                if not _FILE_LOCKS[key][1]:
+                    lock_file = _FILE_LOCKS.pop(key)[0]
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+
     def run_git_command(self, args):
-        " Run a git command in path, return to previous cwd, return output "
-        git_cmd = ['git'] + args
-        cwd = os.getcwd()
-        os.chdir(self.path)
-        output = subproc.check_output(git_cmd)
-        os.chdir(cwd)
-        return output
+        " Run a git command in path, return output "
+        return subproc.check_output(['git'] + args, cwd=self.path)
 
     def ensure_repo_exists(self, path):
         " Guarantee that path is a writable git repo. "
-        if not sysutils.dir_is_writable(path):
-            self.log.info("Creating new git cache in {path}".format(path=path))
-            sysutils.mkdir_writable(path)
-            self.run_git_command(['init', '--bare'])
+        with GIT_CACHE_LOCK:
+            if not sysutils.dir_is_writable(path):
+                self.log.info("Creating new git cache in {path}".format(path=path))
+                sysutils.mkdir_writable(path)
+        with self.lock():
+            if not os.path.exists(os.path.join(path, 'HEAD')):
+                self.run_git_command(['init', '--bare'])
 
     def get_existing_remotes(self):
         " Return dict remotename->url from current git repo "
-        all_remotes = [x.strip() for x in self.run_git_command(['remote']).split()]
-        return {
-            remote: self.run_git_command(['config', '--get', "remote.%s.url" % remote]).strip()
-            for remote in all_remotes
-        }
+        try:
+            config = self.run_git_command(['config', '--get-regexp', r'^remote\..*\.url$'])
+        except subproc.CalledProcessError:
+            # No remotes yet
+            return {}
+        remotes = {}
+        for line in config.splitlines():
+            key, _, url = line.partition(' ')
+            remotes[key[len('remote.'):-len('.url')]] = url.strip()
+        return remotes
+
+    def get_fetch_times(self):
+        " Return a dict remotename->time it was last fetched "
+        fetch_times = {}
+        try:
+            with open(os.path.join(self.path, self.fetch_times_filename)) as times_file:
+                for line in times_file:
+                    name, _, fetch_time = line.strip().rpartition(' ')
+                    fetch_times[name] = float(fetch_time)
+        except (IOError, OSError, ValueError):
+            pass
+        return fetch_times
+
+    def _set_fetch_times(self, names, fetch_time):
+        " Record that the remotes in names were fetched at fetch_time "
+        with self.lock():
+            self.remotes = self.get_existing_remotes()
+            fetch_times = self.get_fetch_times()
+            fetch_times.update({name: fetch_time for name in names})
+            sysutils.write_file_atomic(
+                os.path.join(self.path, self.fetch_times_filename),
+                ''.join(
+                    "{0} {1}\n".format(name, fetch_times[name])
+                    for name in sorted(fetch_times) if name in self.remotes
+                ).encode('utf-8')
+            )
 
     def add_remote(self, name, url, fetch=False):
         """
         Add a single remote by name and url.
-        If fetch is True, will fetch that remote.
+        If fetch is True, will fetch that remote, unless it's up to date.
         """
         self.log.debug("Adding remote: {name} -> {url}".format(name=name, url=url))
-        if url not in self.remotes.values():
-            if name in self.remotes:
-                self.log.warning(
-                    "Trying to add another remote with same name {name}"
-                    .format(name=name)
-                )
-                return
-            self.run_git_command(['remote', 'add', name, url])
-            self.remotes[name] = url
-        else:
-            self.log.debug("Remote URL {url} already registered.".format(url=url))
+        with self.lock():
+            # Another process might have added it in the meantime
+            self.remotes = self.get_existing_remotes()
+            if url not in self.remotes.values():
+                if name in self.remotes:
+                    self.log.warning(
+                        "Trying to add another remote with same name {name}"
+                        .format(name=name)
+                    )
+                    return
+                self.run_git_command(['remote', 'add', name, url])
+                self.remotes[name] = url
+            else:
+                self.log.debug("Remote URL {url} already registered.".format(url=url))
+                name = [x for x in self.remotes if self.remotes[x] == url][0]
         if fetch:
-            self.run_git_command(['remote', 'update', name])
+            self.fetch([name])
 
-    def add_remotes(self, remotes, fetch=False):
+    def add_remotes(self, remotes, fetch=False, jobs=None, force=False):
         """
         Fetch all remotes in dict remotes.
         remotes is of format name->url
-        If fetch is True, runs fetch --all afterwards.
+        If fetch is True, fetches all remotes afterwards (see fetch()), and
+        returns its result.
         """
-        for name, url in iteritems(remotes):
-            while name in self.remotes:
-                name += '_'
-            self.add_remote(name, url, False)
+        with self.lock():
+            self.remotes = self.get_existing_remotes()
+            for name, url in iteritems(remotes):
+                if url in self.remotes.values():
+                    continue
+                while name in self.remotes:
+                    name += '_'
+                self.add_remote(name, url, False)
         if fetch:
-            self.run_git_command(['fetch', '--all', '--prune'])
+            return self.fetch(sorted(self.remotes.keys()), jobs, force)
+        return {}
 
+    def fetch(self, names, jobs=None, force=False):
+        """
+        Fetch the remotes in names, using up to `jobs' git processes at the
+        same time. Remotes that were fetched within the last max_age seconds
+        are skipped, unless force is True.
+
+        Returns a dict remotename->(success, duration) for every remote that
+        was fetched.
+        """
+        if not force:
+            fetch_times = self.get_fetch_times()
+            now = time.time()
+            names = [
+                name for name in names
+                if now - fetch_times.get(name, 0) > self.max_age
+            ]
+        if not names:
+            self.log.debug("All remotes are up to date.")
+            return {}
+        def _fetch_one(name):
+            " Fetch a single remote "
+            self.log.debug("Fetching remote {0}".format(name))
+            start = time.time()
+            ret_code = subproc.monitor_process(
+                ['git', 'fetch', '--prune', '--quiet', name],
+                interactive=True,
+                cwd=self.path,
+            )
+            if ret_code != 0:
+                self.log.warning("Failed to fetch {0} into git cache".format(name))
+            return (ret_code == 0, time.time() - start)
+        fetch_time = time.time()
+        results = workers.run_parallel(_fetch_one, names, jobs or DEFAULT_FETCH_JOBS)
+        self._set_fetch_times([name for name in results if results[name][0]], fetch_time)
+        return results
@@ -21,9 +21,17 @@
 """ Handles installing multiple packets """
 
 from __future__ import print_function
+import heapq
+import threading
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue  # Py3k
 from pybombs import pb_logging
 from pybombs import package_manager
 from pybombs import dep_manager
+from pybombs.requirer import Requirer
+from pybombs.utils import subproc
 from pybombs.pb_exception import PBException
 
 class InstallManager(object):
@@ -46,10 +54,20 @@ class InstallManager(object):
             no_deps=False,
             verify=False,
             static=False,
-            install_type=None
+            install_type=None,
+            jobs=1,
+            fetch_jobs=1,
         ):
         """
         Install packages.
+
+        - jobs: Maximum number of source packages that are built at the same
+                time. A package is only started once all of its dependencies
+                are installed.
+        - fetch_jobs: When updating, the sources of all source packages are
+                      updated before any builds start, this many at a time.
+                      If it's 1, every source is updated right before its
+                      package is built.
         """
         def _check_if_pkg_goes_into_tree(pkg):
             " Return True if pkg has a legitimate right to be in the tree. "
@@ -65,12 +83,12 @@ class InstallManager(object):
                 raise PBException("Unresolved install path.")
             if not self.pm.installed(pkg):
                 # If it's not installed, we'll try a binary install...
-                self.log.debug("Testing binary install for package {pkg}.".format(pkg=pkg))
-                if self.pm.install(pkg, install_type="binary",
-                                   static=static, verify=verify,
-                                   fail_silently=True):
-                    self.log.trace("Binary install successful, so we don't put it into tree.")
-                    # ...and if that worked, it doesn't have to go into the tree.
+                if not static and pkg not in binary_failed \
+                        and self.pm.exists_binary(pkg):
+                    # ...and if that works, it doesn't have to go into the tree.
+                    # Binary installs are batched after the tree is complete.
+                    self.log.debug("Queueing binary install for package {pkg}.".format(pkg=pkg))
+                    binary_candidates.append(pkg)
                     return False
                 self.log.trace("Not installed: It goes into tree.")
                 # Now it's still not installed, so it has to go into the tree:
@@ -85,18 +103,34 @@ class InstallManager(object):
                 if self.pm.installed(pkg, install_type="source"):
                     self.log.trace("Package was source-installed, and needs update.")
                     return True
-                # Otherwise, we should give it a shot:
+                # Otherwise, we should give it a shot (once the tree is done):
                 self.log.trace("Doesn't go into tree, but we'll try a packager update.")
-                self.pm.update(pkg, install_type="binary")
+                binary_updates.append(pkg)
                 return False
             assert False # Should never reach this line
-        _checker_cache = {}
-        def _cached_check_if_pkg_goes_into_tree(pkg, check_callback):
-            if pkg in _checker_cache:
-                return _checker_cache[pkg]
-            ret_val = check_callback(pkg)
-            _checker_cache[pkg] = ret_val
-            return ret_val
+        def _cached_check_if_pkg_goes_into_tree(pkg):
+            " Only check every package once, even if the tree is made again "
+            if pkg not in tree_decisions:
+                tree_decisions[pkg] = _check_if_pkg_goes_into_tree(pkg)
+            return tree_decisions[pkg]
+        def _install_source_pkg(pkg):
+            " Install or update a single source package. Returns True on success. "
+            if mode == 'install' and deps_only and pkg in packages:
+                self.log.debug("Skipping `{0}' because only deps are requested.".format(pkg))
+                return True
+            if self.pm.installed(pkg):
+                self.log.info("Updating package: {0}".format(pkg))
+                if not self.pm.update(pkg, install_type="source", verify=verify):
+                    self.log.error("Error updating package {0}. Aborting.".format(pkg))
+                    return False
+                self.log.info("Update successful: {0}".format(pkg))
+            else:
+                self.log.info("Installing package: {0}".format(pkg))
+                if not self.pm.install(pkg, install_type="source", static=static, verify=verify):
+                    self.log.error("Error installing package {0}. Aborting.".format(pkg))
+                    return False
+                self.log.info("Installation successful: {0}".format(pkg))
+            return True
         ####### install() starts here #########
         ### Sanity checks
         if fail_if_not_exists:
@@ -107,38 +141,162 @@ class InstallManager(object):
         extra_info_logger = self.log.info if not quiet else self.log.debug
         ### Make install tree and install binary packages
         extra_info_logger("Phase 1: Creating install tree and installing binary packages:")
-        install_tree = dep_manager.DepManager().make_dep_tree(
-            packages,
-            lambda pkg: _cached_check_if_pkg_goes_into_tree(pkg, _check_if_pkg_goes_into_tree)
-        )
+        dep_mgr = dep_manager.DepManager()
+        binary_candidates = []
+        binary_failed = set()
+        binary_updates = []
+        tree_decisions = {}
+        while True:
+            del binary_candidates[:]
+            install_tree = dep_mgr.make_dep_tree(packages, _cached_check_if_pkg_goes_into_tree)
+            if not binary_candidates:
+                break
+            extra_info_logger("Installing binary packages: {0}".format(", ".join(binary_candidates)))
+            failed = self.pm.install_batch(binary_candidates, static=static, verify=verify)
+            if not failed:
+                break
+            # Packages that failed to install as binaries go into the tree,
+            # which means their dependencies need resolving, too:
+            self.log.debug("Binary install failed for: {0}".format(", ".join(failed)))
+            binary_failed.update(failed)
+            for pkg in failed:
+                tree_decisions.pop(pkg, None)
+        for pkg in binary_updates:
+            self.pm.update(pkg, install_type="binary")
         if len(install_tree) == 0 and not quiet:
             extra_info_logger("No packages to install.")
             return True
         if (self.log.getEffectiveLevel() <= 20 or print_tree) and not quiet:
             print("Install tree:")
             install_tree.pretty_print()
+            print(dep_mgr.get_stats_str(install_tree))
         if len(install_tree) > 0 and install_type == "binary":
             self.log.error("Install method was `binary', but source packages are left over!")
             return False
         extra_info_logger("Phase 1 complete: All binary dependencies installed.")
         ### Recursively install/update source packages, starting at the leaf nodes
         extra_info_logger("Phase 2: Recursively installing source packages to prefix:")
-        for pkg in install_tree.serialize():
-            if mode == 'install' and deps_only and pkg in packages:
-                self.log.debug("Skipping `{0}' because only deps are requested.")
-                continue
-            if self.pm.installed(pkg):
-                self.log.info("Updating package: {0}".format(pkg))
-                if not self.pm.update(pkg, install_type="source", verify=verify):
-                    self.log.error("Error updating package {0}. Aborting.".format(pkg))
-                    return False
-                self.log.info("Update successful.")
-            else:
-                self.log.info("Installing package: {0}".format(pkg))
-                if not self.pm.install(pkg, install_type="source", static=static, verify=verify):
-                    self.log.error("Error installing package {0}. Aborting.".format(pkg))
+        install_order = install_tree.serialize()
+        if update_if_exists and fetch_jobs > 1:
+            self._update_sources([
+                pkg for pkg in install_order
+                if not (mode == 'install' and deps_only and pkg in packages)
+            ], fetch_jobs)
+        if jobs > 1 and len(install_order) > 1:
+            self.log.debug("Building up to {0} source packages in parallel.".format(jobs))
+            # Settle host system requirements once, before any workers start:
+            Requirer().assert_requirements(['build-essential'])
+            self.pm.src.show_progress = False
+            if not self._run_parallel(
+                    install_tree,
+                    install_order,
+                    _install_source_pkg,
+                    jobs):
+                return False
+        else:
+            for pkg in install_order:
+                if not _install_source_pkg(pkg):
                     return False
-                self.log.info("Installation successful.")
         extra_info_logger("Phase 2 complete: All source packages installed.")
         return True
 
+    def _update_sources(self, pkgs, fetch_jobs):
+        """
+        Update the sources of all packages in pkgs that were installed from
+        source, fetch_jobs at a time (see Fetcher.update_all()).
+        """
+        from pybombs import recipe
+        from pybombs.fetcher import Fetcher
+        recipes = [
+            recipe.get_recipe(pkg) for pkg in pkgs
+            if self.pm.installed(pkg, install_type="source")
+        ]
+        if recipes:
+            self.log.info("Updating sources of {0} packages.".format(len(recipes)))
+            Fetcher().update_all(recipes, fetch_jobs)
+
+    def _run_parallel(self, install_graph, install_order, install_func, jobs):
+        """
+        Call install_func on every package in install_order, using up to
+        `jobs' worker threads. A package is only started once all of its
+        dependencies in install_graph were installed successfully. If
+        several packages are ready, they are started in install_order.
+
+        After a failure, no new packages are started, but the ones that are
+        already running are allowed to finish.
+
+        Returns True if all packages were installed successfully.
+        """
+        order_idx = {pkg: idx for idx, pkg in enumerate(install_order)}
+        # Package -> number of dependencies that are not yet installed
+        pending = {
+            pkg: len(install_graph.get_dependencies(pkg))
+            for pkg in install_order
+        }
+        # Heap of (order_idx, package) for all packages that can be started
+        ready = [(order_idx[pkg], pkg) for pkg in install_order if pending[pkg] == 0]
+        for pkg in install_order:
+            if pending[pkg] == 0:
+                del pending[pkg]
+        task_queue = Queue()
+        result_queue = Queue()
+        def _worker():
+            " Install packages from task_queue until we get a None "
+            while True:
+                pkg = task_queue.get()
+                if pkg is None:
+                    return
+                try:
+                    result = install_func(pkg)
+                except Exception as ex:
+                    self.log.error("Unexpected error while installing {0}: {1}".format(pkg, str(ex)))
+                    result = False
+                result_queue.put((pkg, result))
+        workers = [
+            threading.Thread(target=_worker)
+            for _ in range(min(jobs, len(install_order)))
+        ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        running = set()
+        failed = []
+        try:
+            while True:
+                while not failed and ready and len(running) < len(workers):
+                    pkg = heapq.heappop(ready)[1]
+                    running.add(pkg)
+                    self.log.debug("Starting package {0}.".format(pkg))
+                    task_queue.put(pkg)
+                if not running:
+                    break
+                pkg, result = result_queue.get()
+                running.remove(pkg)
+                if not result:
+                    failed.append(pkg)
+                    continue
+                for dependee in install_graph.get_dependees(pkg):
+                    pending[dependee] -= 1
+                    if pending[dependee] == 0:
+                        del pending[dependee]
+                        heapq.heappush(ready, (order_idx[dependee], dependee))
+        except KeyboardInterrupt:
+            self.log.info("Caught Ctrl+C. Cancelling all running builds.")
+            subproc.cancel_all_processes()
+            raise
+        finally:
+            for _ in workers:
+                task_queue.put(None)
+        if failed:
+            self.log.error("Failed to install: {0}".format(", ".join(failed)))
+            not_installed = sorted(list(pending.keys()) + [pkg for _, pkg in ready])
+            if not_installed:
+                self.log.error("Not installed: {0}".format(", ".join(not_installed)))
+            return False
+        if pending:
+            self.log.error("Unresolvable dependencies between packages: {0}".format(
+                ", ".join(sorted(pending.keys()))
+            ))
+            return False
+        return True
+
@@ -23,6 +23,7 @@ Inventory Manager
 """
 
 import os
+import threading
 from pybombs import pb_logging
 from pybombs.pb_exception import PBException
 from pybombs.config_file import PBConfigFile
@@ -36,6 +37,8 @@ class Inventory(object):
 
     Except for save(), none of the methods actually writes to the
     inventory file.
+
+    All methods are safe to call from multiple threads.
     """
     _states = {
         'none':       (0,  'Package is not installed or fetched',),
@@ -50,6 +53,7 @@ class Inventory(object):
             inventory_file=None,
         ):
         self._filename = inventory_file
+        self._lock = threading.RLock()
         self.log = pb_logging.logger.getChild("Inventory")
         self._state_names = {}
         for state in self._states.keys():
@@ -75,9 +79,10 @@ class Inventory(object):
         created.
         """
         self.log.debug("Saving inventory to file {0}...".format(self._filename))
-        if not os.path.isdir(os.path.split(self._filename)[0]):
-            os.mkdir(os.path.split(self._filename)[0])
-        self._invfile.save()
+        with self._lock:
+            if not os.path.isdir(os.path.split(self._filename)[0]):
+                os.mkdir(os.path.split(self._filename)[0])
+            self._invfile.save()
 
     def has(self, pkg):
         """
@@ -89,9 +94,10 @@ class Inventory(object):
         """
         Remove package pkg from the inventory.
         """
-        if self.has(pkg):
-            del self._invfile.data[pkg]
-            self._invfile.save()
+        with self._lock:
+            if self.has(pkg):
+                del self._invfile.data[pkg]
+                self._invfile.save()
 
     def get_state(self, pkg):
         """
@@ -119,10 +125,11 @@ class Inventory(object):
                     pass
         if not state in self.get_valid_states():
             raise ValueError("Invalid state: {0}".format(state))
-        if not self.has(pkg):
-            self._invfile.data[pkg] = {}
         self.log.debug("Setting state to `{0}'".format(self._state_names[state]))
-        self._invfile.update({pkg: {'state': state}})
+        with self._lock:
+            if not self.has(pkg):
+                self._invfile.data[pkg] = {}
+            self._invfile.update({pkg: {'state': state}})
 
     def get_version(self, pkg, default_version=None):
         """
@@ -145,7 +152,8 @@ class Inventory(object):
         if not self.has(pkg):
             raise PBException("Cannot set version for package {0} if it's not in the inventory!".format(pkg))
         self.log.debug("Setting version to {0}".format(version))
-        self._invfile.data[pkg]["version"] = version
+        with self._lock:
+            self._invfile.data[pkg]["version"] = version
 
     def set_key(self, pkg, key, value):
         """
@@ -155,10 +163,11 @@ class Inventory(object):
             return self.set_state(pkg, value)
         if key == 'version':
             return self.set_version(pkg, value)
-        if not self.has(pkg):
-            self._invfile.data[pkg] = {}
         self.log.trace("Setting key {k} on package {p} to {v}.".format(k=key, p=pkg, v=value))
-        self._invfile.data[pkg][key] = value
+        with self._lock:
+            if not self.has(pkg):
+                self._invfile.data[pkg] = {}
+            self._invfile.data[pkg][key] = value
 
     def get_key(self, pkg, key):
         """
@@ -0,0 +1,224 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+""" Mirror selection for recipes with several sources """
+
+import os
+import re
+import time
+from six.moves.urllib.parse import urlparse
+from pybombs import pb_logging
+from pybombs.config_manager import config_manager
+from pybombs.utils import sysutils
+from pybombs.utils import workers
+
+# Weight of the newest measurement in the average latency of a host
+LATENCY_WEIGHT = 0.3
+# Probes get this much longer than their timeout before we stop waiting
+PROBE_GRACE_TIME = 1 # s
+
+def get_host(src):
+    """
+    Return the host (and port) that the source URI src points to, or None
+    for local sources.
+    """
+    url = re.sub(r'^[a-z]+\+', '', src.strip())
+    if '://' in url:
+        return urlparse(url).netloc.rpartition('@')[2].lower() or None
+    # scp-style, i.e. [user@]host:path
+    mobj = re.match(r'^(?:[^@/:]+@)?([^/:]+):', url)
+    if mobj:
+        return mobj.group(1).lower()
+    return None
+
+
+class HostStats(object):
+    " Latency and failure statistics for one host "
+    def __init__(self, latency=None, successes=0, failures=0, last_seen=0.0):
+        # Average probe latency in s, None if it never responded
+        self.latency = latency
+        self.successes = successes
+        # Failures since the last success
+        self.failures = failures
+        self.last_seen = last_seen
+
+    def update(self, latency):
+        " Record a probe that took latency s, or a failure if it's None "
+        self.last_seen = time.time()
+        if latency is None:
+            self.failures += 1
+            return
+        self.successes += 1
+        self.failures = 0
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_WEIGHT * (latency - self.latency)
+
+
+class MirrorManager(object):
+    """
+    Picks the fastest of several sources for the same package.
+
+    All sources are probed concurrently (see FetcherBase.probe()), with a
+    short timeout, so a dead mirror costs seconds instead of a full TCP
+    timeout. The results are kept per host in the cache directory, so later
+    runs know which hosts are slow or down even when they can't be probed.
+    """
+    stats_name = 'mirror-stats'
+
+    def __init__(self, stats_dir=None, timeout=None):
+        """
+        - stats_dir: Defaults to ~/.pybombs/cache/
+        - timeout: In s, defaults to the mirror-probe-timeout setting
+        """
+        self.log = pb_logging.logger.getChild("MirrorManager")
+        if timeout is None:
+            try:
+                timeout = float(config_manager.get('mirror-probe-timeout'))
+            except (TypeError, ValueError):
+                timeout = float(config_manager.defaults['mirror-probe-timeout'][0])
+                self.log.warn("Invalid mirror-probe-timeout setting: {0}. Using {1} s.".format(
+                    config_manager.get('mirror-probe-timeout'), timeout))
+        self.timeout = timeout
+        if stats_dir is None:
+            stats_dir = config_manager.get_cache_dir()
+        self.stats_filename = None
+        if stats_dir is not None:
+            self.stats_filename = os.path.join(stats_dir, self.stats_name)
+
+    def get_stats(self):
+        " Return a dict host -> HostStats for all hosts we know about "
+        stats = {}
+        if self.stats_filename is None:
+            return stats
+        try:
+            with open(self.stats_filename) as stats_file:
+                for line in stats_file:
+                    fields = line.split()
+                    if len(fields) != 5:
+                        continue
+                    host, latency, successes, failures, last_seen = fields
+                    stats[host] = HostStats(
+                        None if latency == '-' else float(latency),
+                        int(successes), int(failures), float(last_seen),
+                    )
+        except (IOError, OSError, ValueError):
+            pass
+        return stats
+
+    def record(self, results):
+        """
+        Update the statistics with results, a list of (source, latency)
+        tuples. latency is None for failures. Local sources are ignored.
+        """
+        results = [(get_host(src), latency) for src, latency in results]
+        results = [(host, latency) for host, latency in results if host is not None]
+        if not results or self.stats_filename is None:
+            return
+        # Other processes might have updated the file since we last read it
+        stats = self.get_stats()
+        for host, latency in results:
+            stats.setdefault(host, HostStats()).update(latency)
+        try:
+            sysutils.write_file_atomic(
+                self.stats_filename,
+                ''.join(
+                    "{0} {1} {2} {3} {4:.0f}\n".format(
+                        host,
+                        '-' if host_stats.latency is None else '{0:.4f}'.format(host_stats.latency),
+                        host_stats.successes, host_stats.failures, host_stats.last_seen,
+                    ) for host, host_stats in sorted(stats.items())
+                ).encode('utf-8')
+            )
+        except (IOError, OSError) as ex:
+            self.log.debug("Could not write mirror statistics: {0}".format(ex))
+
+    def probe_all(self, sources, probe):
+        """
+        Call probe(source, timeout) for all sources at the same time (see
+        FetcherBase.probe() for what it returns). Waits no longer than the
+        timeout (plus a little grace time).
+
+        Returns a dict source -> (result, latency). Probes that raised or
+        didn't return in time count as False.
+        """
+        def _probe(src):
+            " Probe a single source "
+            start = time.time()
+            try:
+                result = probe(src, self.timeout)
+            except Exception as ex:
+                self.log.debug("Probing {0} failed: {1}".format(src, ex))
+                result = False
+            return (result, time.time() - start)
+        unique_sources = set(sources)
+        results = workers.run_parallel(
+            _probe, unique_sources, len(unique_sources),
+            timeout=self.timeout + PROBE_GRACE_TIME,
+        )
+        for src in sources:
+            if src not in results:
+                self.log.debug("Probing {0} timed out.".format(src))
+                results[src] = (False, self.timeout)
+        return results
+
+    def rank(self, sources, probe):
+        """
+        Return sources sorted by how fast they should be to fetch from, after
+        probing them all (see probe_all()):
+        - Sources that responded come first, fastest first
+        - Then sources that can't be probed, ordered by the statistics of
+          their hosts (fewest recent failures, then lowest latency)
+        - Sources that failed come last
+        Otherwise, the original order is kept. The probe results are added
+        to the statistics.
+        """
+        results = self.probe_all(sources, probe)
+        stats = self.get_stats()
+        def _key(idx_src):
+            " Sort key for (index, source) "
+            idx, src = idx_src
+            result, latency = results[src]
+            if result:
+                return (0, 0, latency, idx)
+            if result is None:
+                host_stats = stats.get(get_host(src)) or HostStats()
+                return (
+                    1, host_stats.failures,
+                    float('inf') if host_stats.latency is None else host_stats.latency,
+                    idx,
+                )
+            return (2, 0, 0, idx)
+        ranked = [src for _, src in sorted(enumerate(sources), key=_key)]
+        for src in ranked:
+            result, latency = results[src]
+            self.log.debug("Source {0}: {1}".format(
+                src,
+                {True: "responded in {0:.0f} ms".format(latency * 1000),
+                 False: "failed", None: "can't be probed"}[result]
+            ))
+        if ranked and ranked[0] != sources[0]:
+            self.log.info("Using fastest source: {0}".format(ranked[0]))
+        self.record([
+            (src, latency if result else None)
+            for src, (result, latency) in results.items() if result is not None
+        ])
+        return ranked
@@ -146,6 +146,16 @@ class PackageManager(object):
         self.pmc.known_installable[name] = False
         return False
 
+    def exists_binary(self, name):
+        """
+        Check if one of the binary packagers can install this package.
+        """
+        r = recipe.get_recipe(name)
+        for pkgr in self.get_packagers(name, install_type="binary"):
+            if pkgr.exists(r):
+                return True
+        return False
+
     def installed(self, name, return_pkgr_name=False, install_type=None, ignore_pkg_flag=False):
         """
         Check to see if this recipe is installed (identified by its name).
@@ -250,6 +260,64 @@ class PackageManager(object):
         self.pmc.known_installed[install_type][name] = bool(install_result)
         return install_result
 
+    def install_batch(self, names, static=False, verify=False):
+        """
+        Install several packages with the binary packagers. Packages that the
+        same packager can install are installed with a single call to that
+        packager (e.g. one `apt-get install' for all of them), then every
+        package is verified on its own. Packages that fail this way are
+        retried one by one with install().
+
+        Returns the list of packages that could not be installed.
+        """
+        self.log.debug("install_batch({0}, static={1})".format(names, static))
+        batches = []  # List of (packager, [(recipe, native names), ...])
+        single = []
+        for name in names:
+            if self.check_package_flag(name, 'forceinstalled'):
+                continue
+            rec = recipe.get_recipe(name)
+            pkg_names = None
+            for pkgr in ([] if static else self.get_packagers(name, "binary")):
+                pkg_names = pkgr.get_install_names(rec)
+                if pkg_names is not None:
+                    break
+            if pkg_names is None:
+                single.append(name)
+                continue
+            for batch_pkgr, batch in batches:
+                if batch_pkgr is pkgr:
+                    batch.append((rec, pkg_names))
+                    break
+            else:
+                batches.append((pkgr, [(rec, pkg_names)]))
+        for pkgr, batch in batches:
+            all_pkg_names = []
+            for _, pkg_names in batch:
+                all_pkg_names += [x for x in pkg_names if x not in all_pkg_names]
+            batch_result = pkgr.install_batch(all_pkg_names)
+            if batch_result is None:
+                single += [rec.id for rec, _ in batch]
+                continue
+            if not batch_result:
+                # Some packages may still have made it, so check them all:
+                self.log.debug("Batch install with {0} failed.".format(pkgr.name))
+            for rec, _ in batch:
+                if not pkgr.installed(rec) or (verify and not pkgr.verify(rec)):
+                    self.log.debug("Package {0} not installed by batch install.".format(rec.id))
+                    single.append(rec.id)
+                    continue
+                for install_type in ("any", "binary"):
+                    self.pmc.known_installed[install_type][rec.id] = True
+        failed = []
+        for name in single:
+            if self.install(name, install_type="binary", static=static,
+                            verify=verify, fail_silently=True):
+                self.pmc.known_installed["any"][name] = True
+            else:
+                failed.append(name)
+        return failed
+
     def update(self, name, verify=False, install_type=None):
         """
         Update the given package. Returns True if successful, False otherwise.
@@ -23,11 +23,165 @@ Packager: apt
 """
 
 from __future__ import absolute_import
+import io
+import os
 import re
+import gzip
+import zlib
 import subprocess
+try:
+    import lzma
+except ImportError:
+    lzma = None
+from pybombs import pb_logging
 from pybombs.packagers.extern import ExternCmdPackagerBase, ExternPackager
 from pybombs.utils import subproc
 from pybombs.utils import sysutils
+from pybombs.utils.vcompare import vcompare
+
+
+# Debian version strings are normalized to their numeric upstream part,
+# e.g. 1:2.39.5-1ubuntu1 -> 2.39.5
+DEB_VERSION_PATTERN = \
+    r'(?:\d+:)?(?P<ver>[0-9]+\.[0-9]+\.[0-9]+|[0-9]+\.[0-9]+|[0-9]+[a-z]+|[0-9]+)'
+DEB_VERSION_RE = re.compile(DEB_VERSION_PATTERN)
+
+# What reading a truncated or corrupt (compressed) list file can raise
+LIST_READ_ERRORS = (IOError, OSError, EOFError, zlib.error) + \
+    ((lzma.LZMAError,) if lzma is not None else ())
+
+def normalize_deb_version(version):
+    """
+    Turn a full Debian version string into the format we use for version
+    comparisons. Returns False if that's not possible.
+    """
+    mobj = DEB_VERSION_RE.match(version)
+    if mobj is None:
+        return False
+    return mobj.group('ver')
+
+
+class DpkgDatabase(object):
+    """
+    Reads dpkg's status file and apt's package lists directly, instead of
+    running dpkg or apt-cache once for every package.
+
+    Both are parsed into dictionaries on first use, and parsed again if
+    they were modified since.
+    """
+    packages_list_suffixes = ('_Packages', '_Packages.gz') + \
+        (('_Packages.xz',) if lzma is not None else ())
+
+    def __init__(self, status_file='/var/lib/dpkg/status', lists_dir='/var/lib/apt/lists'):
+        self.log = pb_logging.logger.getChild("DpkgDatabase")
+        self.status_file = status_file
+        self.lists_dir = lists_dir
+        self._installed = None
+        self._installed_mtime = None
+        self._available = None
+        self._available_mtime = None
+
+    def get_installed_version(self, pkgname):
+        """
+        Return the normalized installed version of pkgname, or False if it's
+        not installed. Returns None if the status file can't be read.
+        """
+        try:
+            mtime = os.stat(self.status_file).st_mtime
+        except OSError:
+            return None
+        if self._installed is None or mtime != self._installed_mtime:
+            installed = {}
+            try:
+                for pkg, arch, version, status in self._read_stanzas([self.status_file]):
+                    if status is not None and status.split()[-1] == 'installed':
+                        self._add_version(installed, pkg, arch, version)
+            except LIST_READ_ERRORS as ex:
+                self.log.debug("Can't read {0}: {1}".format(self.status_file, ex))
+                return None
+            self._installed = installed
+            self._installed_mtime = mtime
+        return self._installed.get(pkgname, False)
+
+    def get_available_version(self, pkgname):
+        """
+        Return the highest normalized version of pkgname that's either
+        installed or in one of apt's package lists, or False if there is none.
+        Returns None if there are no package lists, or one of them is corrupt.
+        """
+        try:
+            mtime = os.stat(self.lists_dir).st_mtime
+            list_files = sorted(
+                os.path.join(self.lists_dir, filename)
+                for filename in os.listdir(self.lists_dir)
+                if filename.endswith(self.packages_list_suffixes)
+            )
+        except OSError:
+            return None
+        if not list_files:
+            return None
+        if self._available is None or mtime != self._available_mtime:
+            available = {}
+            try:
+                for pkg, arch, version, _ in self._read_stanzas(list_files):
+                    self._add_version(available, pkg, arch, version)
+            except LIST_READ_ERRORS as ex:
+                self.log.debug("Can't read apt's package lists: {0}".format(ex))
+                return None
+            self._available = available
+            self._available_mtime = mtime
+        available_version = self._available.get(pkgname, False)
+        installed_version = self.get_installed_version(pkgname)
+        if installed_version and (not available_version or
+                                  not vcompare('<=', installed_version, available_version)):
+            return installed_version
+        return available_version
+
+    @staticmethod
+    def _add_version(versions, pkg, arch, version):
+        """
+        Store version for pkg and pkg:arch, unless there's a higher version
+        already.
+        """
+        version = normalize_deb_version(version)
+        if not version:
+            return
+        for key in (pkg, "{0}:{1}".format(pkg, arch)):
+            if key not in versions or not vcompare('<=', version, versions[key]):
+                versions[key] = version
+
+    def _read_stanzas(self, filenames):
+        """
+        Yield (package, architecture, version, status) for every stanza in
+        filenames. Only the fields we need are parsed.
+        """
+        for filename in filenames:
+            fields = {}
+            with self._open(filename) as list_file:
+                for line in list_file:
+                    if not line.strip():
+                        if 'Package' in fields and 'Version' in fields:
+                            yield (fields['Package'], fields.get('Architecture'),
+                                   fields['Version'], fields.get('Status'))
+                        fields = {}
+                        continue
+                    if line[0] in ' \t':
+                        continue
+                    key, _, value = line.partition(':')
+                    if key in ('Package', 'Architecture', 'Version', 'Status'):
+                        fields[key] = value.strip()
+            if 'Package' in fields and 'Version' in fields:
+                yield (fields['Package'], fields.get('Architecture'),
+                       fields['Version'], fields.get('Status'))
+
+    @staticmethod
+    def _open(filename):
+        " Open a (possibly compressed) list file for reading text "
+        if filename.endswith('.gz'):
+            return io.TextIOWrapper(gzip.open(filename), encoding='utf-8', errors='replace')
+        if filename.endswith('.xz'):
+            return io.TextIOWrapper(lzma.open(filename), encoding='utf-8', errors='replace')
+        return io.open(filename, encoding='utf-8', errors='replace')
 
 
 class ExternalApt(ExternPackager):
@@ -43,107 +197,91 @@ class ExternalApt(ExternPackager):
         else:
             self.getcmd = 'apt-get'
             self.searchcmd = 'apt-cache'
+        self.dpkg_db = DpkgDatabase()
 
-        try:
-            import apt
-            self.cache = apt.Cache()
-        except (ImportError, AttributeError):
-            # ImportError is caused by apt being completely missing
-            # AttributeError is caused by us importing ourselves (we have no
-            #   Cache() method) because python-apt is missing and we got a
-            #   relative import instead
-            self.log.info("Install python-apt to speed up apt processing.")
-            self.cache = None
+    def get_state_files(self):
+        """
+        dpkg's status file changes on every (un)install, the lists directory
+        on every apt-get update.
+        """
+        return [self.dpkg_db.status_file, self.dpkg_db.lists_dir]
 
     def get_available_version(self, pkgname):
         """
         Check which version is available.
         """
-        if self.cache:
-            self.log.trace("Checking apt for `{0}'".format(pkgname))
-            (ver, is_installed) = self.check_cache(pkgname)
+        ver = self.dpkg_db.get_available_version(pkgname)
+        if ver is not None:
             if ver:
                 self.log.debug("Package {0} has version {1} in repositories".format(pkgname, ver))
             return ver
-        else:
-            try:
-                self.log.trace("Checking {0} for `{1}'".format(self.searchcmd, pkgname))
-                ver = subproc.match_output(
-                    [self.searchcmd, "show", pkgname],
-                    r'Version: (?:\d+:)?(?P<ver>[0-9]+\.[0-9]+\.[0-9]+|[0-9]+\.[0-9]+|[0-9]+[a-z]+|[0-9]+).*\n',
-                    'ver'
-                )
-                if ver is None:
-                    return False
-                if ver:
-                    self.log.debug("Package {0} has version {1} in repositories".format(pkgname, ver))
-                return ver
-            except subprocess.CalledProcessError:
-                # Could be an issue, but most likely it means the package doesn't exist.
-                self.log.debug(
-                    "{cmd} show {pkg} failed.".format(cmd=self.searchcmd, pkg=pkgname)
-                )
+        try:
+            self.log.trace("Checking {0} for `{1}'".format(self.searchcmd, pkgname))
+            ver = subproc.match_output(
+                [self.searchcmd, "show", pkgname],
+                r'Version: ' + DEB_VERSION_PATTERN + r'.*\n',
+                'ver'
+            )
+            if ver is None:
+                return False
+            if ver:
+                self.log.debug("Package {0} has version {1} in repositories".format(pkgname, ver))
+            return ver
+        except subprocess.CalledProcessError:
+            # Could be an issue, but most likely it means the package doesn't exist.
+            self.log.debug(
+                "{cmd} show {pkg} failed.".format(cmd=self.searchcmd, pkg=pkgname)
+            )
         return False
 
     def get_installed_version(self, pkgname):
         """
-        Use dpkg (or python-apt) to determine and return the currently installed version.
-        If pkgname is not installed, return None.
+        Read dpkg's status file (or use dpkg -s) to determine and return the
+        currently installed version.
+        If pkgname is not installed, return False.
         """
-        if self.cache:
-            (ver, is_installed) = self.check_cache(pkgname)
-            if is_installed:
-                self.log.debug("Package {0} has version {1} installed".format(pkgname, ver))
-            return ver if is_installed else False
-        else:
-            try:
-                ver = subproc.match_output(
-                    ["dpkg", "-s", pkgname],
-                    r'^Version: (?:\d+:)?(?P<ver>[0-9]+\.[0-9]+\.[0-9]+|[0-9]+\.[0-9]+|[0-9]+[a-z]+|[0-9]+)',
-                    'ver'
-                )
-                if ver is None:
-                    self.log.debug("Looks like dpkg -s can't find package {pkg}. This is most likely a bug.".format(pkg=pkgname))
-                    return False
+        ver = self.dpkg_db.get_installed_version(pkgname)
+        if ver is not None:
+            if ver:
                 self.log.debug("Package {0} has version {1} installed".format(pkgname, ver))
-                return ver
-            except subprocess.CalledProcessError:
-                # This usually means the packet is not installed -- not a problem.
+            return ver
+        try:
+            ver = subproc.match_output(
+                ["dpkg", "-s", pkgname],
+                r'^Version: ' + DEB_VERSION_PATTERN,
+                'ver'
+            )
+            if ver is None:
+                self.log.debug("Looks like dpkg -s can't find package {pkg}. This is most likely a bug.".format(pkg=pkgname))
                 return False
-            except Exception as e:
-                self.log.error("Running dpkg -s failed.")
-                self.log.trace(str(e))
+            self.log.debug("Package {0} has version {1} installed".format(pkgname, ver))
+            return ver
+        except subprocess.CalledProcessError:
+            # This usually means the packet is not installed -- not a problem.
+            return False
+        except Exception as e:
+            self.log.error("Running dpkg -s failed.")
+            self.log.trace(str(e))
         return False
 
     def install(self, pkgname):
         """
         apt(-get) -y install pkgname
         """
+        return self.install_batch([pkgname])
+
+    def install_batch(self, pkgnames):
+        """
+        apt(-get) -y install pkgname1 pkgname2 ...
+        """
         try:
-            subproc.monitor_process([self.getcmd, "-y", "install", pkgname], elevate=True, throw=True)
-            if self.cache:
-                self.cache.open()
+            subproc.monitor_process([self.getcmd, "-y", "install"] + list(pkgnames), elevate=True, throw=True)
             return True
         except Exception as ex:
             self.log.error("Running {0} install failed.".format(self.getcmd))
             self.log.trace(str(ex))
             return False
 
-    def check_cache(self, pkgname):
-        try:
-            pkg = self.cache[pkgname]
-        except:
-            return (False, False)
-
-        vers = pkg.versions
-        first_ver = vers[0].version
-        ver = re.search(r'(?:\d+:)?(?P<ver>[0-9]+\.[0-9]+\.[0-9]+|[0-9]+\.[0-9]+|[0-9]+[a-z]+|[0-9]+)', first_ver)
-        if ver is None:
-            return (False, pkg.is_installed)
-        ver = ver.group('ver')
-        return (ver, pkg.is_installed)
-
-
 
 class Apt(ExternCmdPackagerBase):
     """
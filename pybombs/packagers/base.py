@@ -71,6 +71,23 @@ class PackagerBase(object):
         """
         raise NotImplementedError()
 
+    def get_install_names(self, recipe):
+        """
+        Return the list of native package names that install() would install
+        for recipe, so several recipes can be installed with install_batch().
+        Return None if this packager can't install recipe, or doesn't support
+        batched installs.
+        """
+        return None
+
+    def install_batch(self, pkg_names):
+        """
+        Install a list of native package names (see get_install_names()) in
+        one go. Return True on success, False on failure, and None if this
+        packager doesn't support batched installs.
+        """
+        return None
+
     def update(self, recipe):
         """
         Returns the updated version of package (identified by recipe)
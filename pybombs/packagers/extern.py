@@ -22,9 +22,136 @@
 Packager: Base class for external packagers
 """
 
+import os
+import atexit
+import threading
+from six.moves import cPickle as pickle
+from pybombs import pb_logging
+from pybombs.config_manager import config_manager
 from pybombs.packagers.base import PackagerBase
+from pybombs.recipe import PBCompiledRequirementExpr
+from pybombs.utils import sysutils
 from pybombs.utils.vcompare import vcompare
 
+
+# The rpm database, for all packagers based on rpm. Depending on the rpm
+# version, it's a Berkeley DB or an SQLite file, in one of two locations.
+RPMDB_STATE_FILES = [
+    '/var/lib/rpm',
+    '/var/lib/rpm/Packages',
+    '/var/lib/rpm/rpmdb.sqlite',
+    '/usr/lib/sysimage/rpm',
+    '/usr/lib/sysimage/rpm/rpmdb.sqlite',
+]
+
+class ExternStateCache(object):
+    """
+    Persistent cache of installed and available versions of native packages,
+    so we don't have to ask apt, dnf, pkg-config etc. about the same package
+    on every run.
+
+    Every packager provides a list of state files (e.g. /var/lib/dpkg/status)
+    that change whenever packages are installed or removed. Their mtimes form
+    a fingerprint, which is checked on every lookup; if it differs, all cached
+    results of that packager are dropped.
+    """
+    cache_version = 1
+    cache_file_name = 'packagers.pkl'
+
+    def __init__(self):
+        self.log = pb_logging.logger.getChild("ExternStateCache")
+        self._lock = threading.Lock()
+        self._filename = None
+        # (packager name, state files) -> (fingerprint, {(query, pkgname): version})
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        " Load the cache file, or start with an empty cache "
+        self._entries = {}
+        cache_dir = config_manager.get_cache_dir()
+        if cache_dir is None:
+            return
+        self._filename = os.path.join(cache_dir, self.cache_file_name)
+        try:
+            with open(self._filename, 'rb') as cache_file:
+                version, entries = pickle.load(cache_file)
+            if version == self.cache_version:
+                self._entries = entries
+        except (IOError, OSError):
+            pass
+        except Exception as ex:
+            self.log.debug("Ignoring invalid cache file {0}: {1}".format(self._filename, ex))
+
+    @staticmethod
+    def get_fingerprint(state_files):
+        """
+        Return the mtimes of all state files, or None if none of them exist.
+        """
+        fingerprint = []
+        for state_file in state_files:
+            try:
+                fingerprint.append(os.stat(state_file).st_mtime)
+            except OSError:
+                fingerprint.append(None)
+        if not any(mtime is not None for mtime in fingerprint):
+            return None
+        return tuple(fingerprint)
+
+    def get(self, packager_name, state_files, query, pkgname, query_func):
+        """
+        Return the cached result of query ('installed' or 'available') for
+        native package pkgname. On a cache miss, query_func(pkgname) is called
+        and its result is stored.
+        """
+        fingerprint = self.get_fingerprint(state_files)
+        if fingerprint is None:
+            return query_func(pkgname)
+        key = (packager_name, tuple(state_files))
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == fingerprint and (query, pkgname) in entry[1]:
+                return entry[1][(query, pkgname)]
+        result = query_func(pkgname)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != fingerprint:
+                entry = (fingerprint, {})
+                self._entries[key] = entry
+            entry[1][(query, pkgname)] = result
+            self._dirty = True
+        return result
+
+    def invalidate(self, packager_name):
+        """
+        Drop all cached results for a packager, e.g. after it installed
+        something.
+        """
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            for key in [key for key in self._entries if key[0] == packager_name]:
+                del self._entries[key]
+                self._dirty = True
+
+    def save(self):
+        " Write the cache back to disk, if it changed. "
+        with self._lock:
+            if not self._dirty or self._filename is None:
+                return
+            try:
+                sysutils.write_file_atomic(
+                    self._filename, pickle.dumps((self.cache_version, self._entries), 2))
+                self._dirty = False
+            except (IOError, OSError) as ex:
+                self.log.debug("Could not write cache file {0}: {1}".format(self._filename, ex))
+
+EXTERN_STATE_CACHE = ExternStateCache()
+atexit.register(EXTERN_STATE_CACHE.save)
+
+
 class ExternPackager(object):
     """
     Base class for wrappers around external packagers.
@@ -32,6 +159,15 @@ class ExternPackager(object):
     def __init__(self, logger):
         self.log = logger
 
+    def get_state_files(self):
+        """
+        Return a list of files and directories whose mtimes change whenever
+        packages are installed, removed, or become available through this
+        packager (e.g. /var/lib/dpkg/status). Versions are cached on disk
+        until one of these changes. Returning None disables the cache.
+        """
+        return None
+
     def get_available_version(self, pkgname):
         """
         Return a version that we can install through this package manager.
@@ -58,6 +194,13 @@ class ExternPackager(object):
         """
         return self.install(pkgname)
 
+    def install_batch(self, pkgnames):
+        """
+        Install all of pkgnames in a single call to the packager.
+        Returns None if the packager doesn't support that.
+        """
+        return None
+
 class ExternReadOnlyPackager(ExternPackager):
     """
     Wraps a read-only packager, i.e. one that can't itself install packages
@@ -122,6 +265,35 @@ class ExternCmdPackagerBase(PackagerBase):
         self.log.trace("install({0}, static={1})".format(recipe.id, static))
         return self._packager_run_tree(recipe, self._package_install)
 
+    def get_install_names(self, recipe):
+        """
+        Return the list of native package names that install() would install
+        for recipe, or None if it can't be installed by this packager.
+        For || alternatives, the first one that exists is picked, just like
+        install() would.
+        """
+        try:
+            satisfy_rule = recipe.get_package_reqs(self.pkgtype)
+        except KeyError:
+            return None
+        if satisfy_rule is None:
+            return None
+        if satisfy_rule is True:
+            return []
+        return self._get_install_names(satisfy_rule)
+
+    def install_batch(self, pkg_names):
+        """
+        Install a list of native package names in one go.
+        """
+        if not pkg_names:
+            return True
+        self.log.debug("Installing in one batch: {0}".format(", ".join(pkg_names)))
+        result = self.packager.install_batch(pkg_names)
+        if result is not None:
+            EXTERN_STATE_CACHE.invalidate(self.name)
+        return result
+
     def update(self, recipe):
         """
         Returns the updated version of package (identified by recipe)
@@ -170,12 +342,50 @@ class ExternCmdPackagerBase(PackagerBase):
         self.log.trace("Calling ev for recursive satisfier rule evaluation")
         return satisfy_rule.ev(satisfy_evaluator)
 
+    def _get_install_names(self, satisfy_rule):
+        """
+        Recursively collect the native package names for a compiled satisfier
+        rule. Returns None if the rule can't be satisfied.
+        """
+        if isinstance(satisfy_rule, PBCompiledRequirementExpr):
+            if satisfy_rule.combiner == '||':
+                for operand in satisfy_rule.operands:
+                    pkg_names = self._get_install_names(operand)
+                    if pkg_names is not None:
+                        return pkg_names
+                return None
+            pkg_names = []
+            for operand in satisfy_rule.operands:
+                operand_names = self._get_install_names(operand)
+                if operand_names is None:
+                    return None
+                pkg_names += operand_names
+            return pkg_names
+        if self._package_exists(satisfy_rule.name, satisfy_rule.compare, satisfy_rule.version):
+            return [satisfy_rule.name]
+        return None
+
+    def _get_available_version(self, pkg_name):
+        " Cached version of self.packager.get_available_version() "
+        return self._cached_query('available', pkg_name, self.packager.get_available_version)
+
+    def _get_installed_version(self, pkg_name):
+        " Cached version of self.packager.get_installed_version() "
+        return self._cached_query('installed', pkg_name, self.packager.get_installed_version)
+
+    def _cached_query(self, query, pkg_name, query_func):
+        " Run query_func(pkg_name) through the persistent state cache "
+        state_files = self.packager.get_state_files()
+        if state_files is None:
+            return query_func(pkg_name)
+        return EXTERN_STATE_CACHE.get(self.name, state_files, query, pkg_name, query_func)
+
     def _package_exists(self, pkg_name, comparator=">=", required_version=None):
         """
         Check if `pkg_name` is installable through this packager.
         Return type same as 'exists()'.
         """
-        available_version = self.packager.get_available_version(pkg_name)
+        available_version = self._get_available_version(pkg_name)
         if available_version is True:
             return True
         if available_version is False \
@@ -192,9 +402,11 @@ class ExternCmdPackagerBase(PackagerBase):
         """
         if not self._package_exists(pkg_name, comparator, required_version):
             return False
-        if not self.packager.update(pkg_name):
+        updated = self.packager.update(pkg_name)
+        EXTERN_STATE_CACHE.invalidate(self.name)
+        if not updated:
             return False
-        installed_version = self.packager.get_installed_version(pkg_name)
+        installed_version = self._get_installed_version(pkg_name)
         if installed_version is False \
                 or (required_version is not None and not vcompare(comparator, installed_version, required_version)):
             return False
@@ -210,9 +422,11 @@ class ExternCmdPackagerBase(PackagerBase):
         """
         if not self._package_exists(pkg_name, comparator, required_version):
             return False
-        if not self.packager.install(pkg_name):
+        installed = self.packager.install(pkg_name)
+        EXTERN_STATE_CACHE.invalidate(self.name)
+        if not installed:
             return False
-        installed_version = self.packager.get_installed_version(pkg_name)
+        installed_version = self._get_installed_version(pkg_name)
         if installed_version is False \
                 or installed_version is None \
                 or (required_version is not None and not vcompare(comparator, installed_version, required_version)):
@@ -224,7 +438,7 @@ class ExternCmdPackagerBase(PackagerBase):
         Queries the current package manager to see if a package is installed.
         Return type same as 'installed()'.
         """
-        installed_version = self.packager.get_installed_version(pkg_name)
+        installed_version = self._get_installed_version(pkg_name)
         if not installed_version:
             return False
         if required_version is None:
@@ -37,6 +37,12 @@ class ExternalPacman(ExternPackager):
         if sysutils.which('pacman') is not None:
             self.command = 'pacman'
 
+    def get_state_files(self):
+        """
+        The local and sync databases.
+        """
+        return ['/var/lib/pacman/local', '/var/lib/pacman/sync']
+
     def get_available_version(self, pkgname):
         """
         Return a version that we can install through this package manager.
@@ -98,12 +104,19 @@ class ExternalPacman(ExternPackager):
         """
         return self._run_cmd(pkgname, '-S')
 
+    def install_batch(self, pkgnames):
+        """
+        pacman install pkgname1 pkgname2 ...
+        """
+        return self._run_cmd(pkgnames, '-S')
+
     def _run_cmd(self, pkgname, cmd):
         """
-        Call pacman with cmd.
+        Call pacman with cmd. pkgname may also be a list of packages.
         """
+        pkgnames = pkgname if isinstance(pkgname, list) else [pkgname]
         try:
-            subproc.monitor_process([self.command, "--noconfirm", cmd, pkgname], elevate=True)
+            subproc.monitor_process([self.command, "--noconfirm", cmd] + pkgnames, elevate=True)
             return True
         except Exception as ex:
             self.log.error("Running `{0} {1}' failed.".format(self.command, cmd))
@@ -22,7 +22,9 @@
 Packager: pkg-config
 """
 
+import glob
 import subprocess
+from pybombs.config_manager import config_manager
 from pybombs.packagers.extern import ExternCmdPackagerBase, ExternReadOnlyPackager
 from pybombs.utils import sysutils
 from pybombs.utils import subproc
@@ -34,6 +36,31 @@ class ExternalPkgConfig(ExternReadOnlyPackager):
     def __init__(self, logger):
         ExternReadOnlyPackager.__init__(self, logger)
 
+    # pkg-config's default search paths
+    default_pc_dirs = [
+        '/usr/lib/pkgconfig',
+        '/usr/lib64/pkgconfig',
+        '/usr/lib/*/pkgconfig',
+        '/usr/share/pkgconfig',
+        '/usr/local/lib/pkgconfig',
+        '/usr/local/share/pkgconfig',
+    ]
+
+    def get_state_files(self):
+        """
+        All directories pkg-config searches for .pc files (their mtimes change
+        when .pc files are added or replaced), plus the prefix inventory.
+        """
+        prefix = config_manager.get_active_prefix()
+        state_files = [
+            pc_dir for pc_dir in prefix.env.get('PKG_CONFIG_PATH', '').split(':') if pc_dir
+        ]
+        for pc_dir in self.default_pc_dirs:
+            state_files += sorted(glob.glob(pc_dir))
+        if prefix.inv_file is not None:
+            state_files.append(prefix.inv_file)
+        return state_files
+
     def get_installed_version(self, pkgname):
         """
         Use pkg-config to determine and return the currently installed version.
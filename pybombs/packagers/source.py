@@ -45,6 +45,9 @@ class Source(PackagerBase):
         self.prefix = self.cfg.get_active_prefix()
         self.inventory = self.prefix.inventory
         self.static = False
+        # If False, build output is swallowed instead of drawing progress
+        # bars (e.g. when several packages are built at the same time)
+        self.show_progress = True
 
     def supported(self):
         """
@@ -82,7 +85,6 @@ class Source(PackagerBase):
             os.makedirs(self.prefix.src_dir)
         self.static = static
         recipe.set_static(static)
-        cwd = os.getcwd()
         get_state = lambda: (self.inventory.get_state(recipe.id) or 0)
         set_state = lambda state: self.inventory.set_state(recipe.id, state) or self.inventory.save()
         if not hasattr(recipe, 'source') or len(recipe.source) == 0:
@@ -93,6 +95,9 @@ class Source(PackagerBase):
             if update:
                 if get_state() < self.inventory.STATE_CONFIGURED:
                     raise PBException("Can't update package {0}, it's not yet configured.".format(recipe.id))
+                if get_state() == self.inventory.STATE_INSTALLED and Fetcher().is_up_to_date(recipe):
+                    self.log.info("Package {0} is up to date.".format(recipe.id))
+                    return True
                 Fetcher().update(recipe)
                 set_state(self.inventory.STATE_CONFIGURED)
             self.log.debug("State on package {0} is {1}".format(recipe.id, get_state()))
@@ -109,17 +114,15 @@ class Source(PackagerBase):
                 fail_if_builddir_missing=update,
             )
         except PBException as err:
-            os.chdir(cwd)
             self.log.error("Problem occurred while building package {0}:\n{1}".format(recipe.id, str(err).strip()))
             return False
-        ### Housekeeping
-        os.chdir(cwd)
         return True
 
     def update(self, recipe):
         """
         Update the source package. Algorithm:
         - Check it's at least in state 'configured'
+        - If it's installed and the source is up to date, stop here
         - Do a fetch-update
         - Set state to 'fetched' if it was not configured, and 'configured'
           otherwise
@@ -134,7 +137,6 @@ class Source(PackagerBase):
         """
         Remove a source-installed installation.
         """
-        cwd = os.getcwd()
         pkg_src_dir = os.path.normpath(os.path.join(self.prefix.src_dir, recipe.id))
         builddir = os.path.normpath(os.path.join(pkg_src_dir, recipe.installdir))
         get_state = lambda: (self.inventory.get_state(recipe.id) or 0)
@@ -148,9 +150,8 @@ class Source(PackagerBase):
                 self.log.warn("Package claims to be installed, but no build dir. Cannot do a proper uninstall.")
             else:
                 try:
-                    os.chdir(builddir)
+                    recipe.vars['builddir'] = builddir
                     self.make_clean(recipe)
-                    os.chdir(cwd)
                 except PBException as ex:
                     self.log.warn("Uninstall failed: {0}.".format(str(ex)))
                     return False
@@ -169,19 +170,16 @@ class Source(PackagerBase):
         - Trigger run_build
         """
         self.inventory.set_state(recipe.id, self.inventory.STATE_FETCHED)
-        cwd = os.getcwd() # run_build() will change the directory
         try:
             self.run_build(
                 recipe,
                 make_clean=make_clean,
                 nuke_builddir=nuke_builddir,
             )
-            os.chdir(cwd)
             return True
         except PBException as err:
             self.log.error("Problem occurred while building package {0}:".format(recipe.id))
             self.log.error(str(err).strip())
-        os.chdir(cwd)
         return False
 
     def run_build(self,
@@ -231,7 +229,7 @@ class Source(PackagerBase):
                 if fail_if_builddir_missing:
                     raise PBException("Can't update package {0}, build directory seems to be missing.".format(recipe.id))
                 os.mkdir(builddir)
-        os.chdir(builddir)
+        # All build commands run inside recipe.vars['builddir']:
         recipe.vars['builddir'] = builddir
         ### Run the build process
         if get_state() < self.inventory.STATE_CONFIGURED:
@@ -264,13 +262,13 @@ class Source(PackagerBase):
         """
         self.log.debug("Configuring recipe {0}".format(recipe.id))
         self.log.debug("Using vars - {0}".format(recipe.vars))
-        self.log.debug("In cwd - {0}".format(os.getcwd()))
+        self.log.debug("In build dir - {0}".format(recipe.vars.get('builddir')))
         pre_cmd = recipe.var_replace_all(self.get_command('configure', recipe))
         cmd = self.filter_cmd(pre_cmd, recipe, 'config_filter')
         o_proc = None
         if self.log.getEffectiveLevel() >= pb_logging.DEBUG and not try_again:
-            o_proc = output_proc.OutputProcessorMake(preamble="Configuring: ")
-        if subproc.monitor_process(cmd, shell=True, o_proc=o_proc) == 0:
+            o_proc = self.get_o_proc(preamble="Configuring: ")
+        if subproc.monitor_process(cmd, shell=True, o_proc=o_proc, cwd=recipe.vars.get('builddir')) == 0:
             self.log.debug("Configure successful.")
             return True
         # OK, something went wrong.
@@ -286,13 +284,13 @@ class Source(PackagerBase):
         Run 'make clean' or whatever clears a build before recompiling
         """
         self.log.debug("Uninstalling from recipe {0}".format(recipe.id))
-        self.log.debug("In cwd - {0}".format(os.getcwd()))
+        self.log.debug("In build dir - {0}".format(recipe.vars.get('builddir')))
         o_proc = None
         if self.log.getEffectiveLevel() >= pb_logging.DEBUG and not try_again:
-            o_proc = output_proc.OutputProcessorMake(preamble="Uninstalling: ")
+            o_proc = self.get_o_proc(preamble="Uninstalling: ")
         cmd = recipe.var_replace_all(self.get_command('uninstall', recipe))
         cmd = self.filter_cmd(cmd, recipe, 'uninstall_filter')
-        if subproc.monitor_process(cmd, shell=True, o_proc=o_proc) == 0:
+        if subproc.monitor_process(cmd, shell=True, o_proc=o_proc, cwd=recipe.vars.get('builddir')) == 0:
             self.log.debug("Uninstall successful")
             return True
         # OK, something bad happened.
@@ -311,13 +309,15 @@ class Source(PackagerBase):
         makewidth to 1 and show the build output.
         """
         self.log.debug("Building recipe {0}".format(recipe.id))
-        self.log.debug("In cwd - {0}".format(os.getcwd()))
+        self.log.debug("In build dir - {0}".format(recipe.vars.get('builddir')))
         o_proc = None
         if self.log.getEffectiveLevel() >= pb_logging.DEBUG and not try_again and not recipe.make_interactive:
-            o_proc = output_proc.OutputProcessorMake(preamble="Building:    ")
+            o_proc = self.get_o_proc(preamble="Building:    ")
         cmd = recipe.var_replace_all(self.get_command('make', recipe))
         cmd = self.filter_cmd(cmd, recipe, 'make_filter')
-        if subproc.monitor_process(cmd, shell=True, o_proc=o_proc) == 0:
+        if subproc.monitor_process(
+                cmd, shell=True, o_proc=o_proc, interactive=recipe.make_interactive,
+                cwd=recipe.vars.get('builddir')) == 0:
             self.log.debug("Make successful")
             return True
         # OK, something bad happened.
@@ -333,13 +333,13 @@ class Source(PackagerBase):
         Run 'make test' or whatever checks a build was successful
         """
         self.log.debug("Verifying package {0}".format(recipe.id))
-        self.log.debug("In cwd - {0}".format(os.getcwd()))
+        self.log.debug("In build dir - {0}".format(recipe.vars.get('builddir')))
         o_proc = None
         if self.log.getEffectiveLevel() >= pb_logging.DEBUG and not try_again:
-            o_proc = output_proc.OutputProcessorMake(preamble="Verifying: ")
+            o_proc = self.get_o_proc(preamble="Verifying: ")
         cmd = recipe.var_replace_all(self.get_command('verify', recipe))
         cmd = self.filter_cmd(cmd, recipe, 'make_filter')
-        if subproc.monitor_process(cmd, shell=True, o_proc=o_proc) == 0:
+        if subproc.monitor_process(cmd, shell=True, o_proc=o_proc, cwd=recipe.vars.get('builddir')) == 0:
             self.log.debug("Verification successful")
             return True
         # OK, something bad happened.
@@ -356,13 +356,13 @@ class Source(PackagerBase):
         Run 'make install' or whatever copies the files to the right place.
         """
         self.log.debug("Installing package {0}".format(recipe.id))
-        self.log.debug("In cwd - {0}".format(os.getcwd()))
+        self.log.debug("In build dir - {0}".format(recipe.vars.get('builddir')))
         pre_cmd = recipe.var_replace_all(self.get_command('install', recipe))
         cmd = self.filter_cmd(pre_cmd, recipe, 'install_filter')
         o_proc = None
         if self.log.getEffectiveLevel() >= pb_logging.DEBUG:
-            o_proc = output_proc.OutputProcessorMake(preamble="Installing:  ")
-        if subproc.monitor_process(cmd, shell=True, o_proc=o_proc) == 0:
+            o_proc = self.get_o_proc(preamble="Installing:  ")
+        if subproc.monitor_process(cmd, shell=True, o_proc=o_proc, cwd=recipe.vars.get('builddir')) == 0:
             self.log.debug("Installation successful")
             return True
         raise PBException("Installation failed")
@@ -371,6 +371,15 @@ class Source(PackagerBase):
     #########################################################################
     # Helpers
     #########################################################################
+    def get_o_proc(self, preamble):
+        """
+        Return the output processor for a build step. Unless progress is
+        disabled, this is a progress bar.
+        """
+        if not self.show_progress:
+            return output_proc.OutputProcessorQuiet()
+        return output_proc.OutputProcessorMake(preamble=preamble)
+
     def filter_cmd(self, unfiltered_command, recipe, filter_flag):
         """
         - Get a filter from the recipe flags identified by filter_flag
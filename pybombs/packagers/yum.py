@@ -25,7 +25,7 @@ Packager: yum or dnf
 import os
 import re
 import subprocess
-from pybombs.packagers.extern import ExternCmdPackagerBase, ExternPackager
+from pybombs.packagers.extern import ExternCmdPackagerBase, ExternPackager, RPMDB_STATE_FILES
 from pybombs.utils import subproc
 from pybombs.utils import sysutils
 from pybombs.utils import utils
@@ -42,6 +42,12 @@ class ExternalYumDnf(ExternPackager):
         elif sysutils.which('yum') is not None:
             self.command = 'yum'
 
+    def get_state_files(self):
+        """
+        The rpm database, and the repository metadata caches.
+        """
+        return RPMDB_STATE_FILES + ['/var/cache/dnf', '/var/cache/yum']
+
     def get_available_version(self, pkgname):
         """
         Return a version that we can install through this package manager.
@@ -115,12 +121,19 @@ class ExternalYumDnf(ExternPackager):
         """
         return self._run_cmd(pkgname, 'update')
 
+    def install_batch(self, pkgnames):
+        """
+        yum/dnf install pkgname1 pkgname2 ...
+        """
+        return self._run_cmd(pkgnames, 'install')
+
     def _run_cmd(self, pkgname, cmd):
         """
-        Call yum or dnf with cmd.
+        Call yum or dnf with cmd. pkgname may also be a list of packages.
         """
+        pkgnames = pkgname if isinstance(pkgname, list) else [pkgname]
         try:
-            subproc.monitor_process([self.command, "-y", cmd, pkgname], elevate=True)
+            subproc.monitor_process([self.command, "-y", cmd] + pkgnames, elevate=True)
             return True
         except Exception as ex:
             self.log.error("Running `{0} install' failed.".format(self.command))
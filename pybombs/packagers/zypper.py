@@ -25,7 +25,7 @@ Packager: zypper (OpenSUSE)
 import os
 import re
 import subprocess
-from pybombs.packagers.extern import ExternCmdPackagerBase, ExternPackager
+from pybombs.packagers.extern import ExternCmdPackagerBase, ExternPackager, RPMDB_STATE_FILES
 from pybombs.utils import subproc
 from pybombs.utils import sysutils
 from pybombs.utils import utils
@@ -44,6 +44,12 @@ class ExternalZypper(ExternPackager):
         else:
             self.fastcommand = None
 
+    def get_state_files(self):
+        """
+        The rpm database, and the repository metadata cache.
+        """
+        return RPMDB_STATE_FILES + ['/var/cache/zypp/solv']
+
     def get_available_version(self, pkgname):
         """
         Return a version that we can install through this package manager.
@@ -141,12 +147,19 @@ class ExternalZypper(ExternPackager):
         """
         return self._run_cmd(pkgname, 'update')
 
+    def install_batch(self, pkgnames):
+        """
+        zypper install pkgname1 pkgname2 ...
+        """
+        return self._run_cmd(pkgnames, 'install')
+
     def _run_cmd(self, pkgname, cmd):
         """
-        Call zypper with cmd.
+        Call zypper with cmd. pkgname may also be a list of packages.
         """
+        pkgnames = pkgname if isinstance(pkgname, list) else [pkgname]
         try:
-            subproc.monitor_process([self.command, cmd, "-y", pkgname], elevate=True)
+            subproc.monitor_process([self.command, cmd, "-y"] + pkgnames, elevate=True)
             return True
         except Exception as ex:
             self.log.error("Running `{0} install' failed.".format(self.command))
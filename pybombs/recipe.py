@@ -24,7 +24,7 @@ Recipe representation class.
 
 import re
 import os
-import shlex
+from collections import namedtuple
 from six import iteritems
 try:
     from collections.abc import Sequence
@@ -37,7 +37,7 @@ from pybombs import recipe_manager
 from pybombs import config_manager
 from pybombs.pb_exception import PBException
 from pybombs.config_file import PBConfigFile
-from pybombs.utils import dict_merge
+from pybombs.utils import dict_merge, dict_merge_shared
 
 class PBPackageRequirement(object):
     """
@@ -91,49 +91,35 @@ class PBPackageRequirementScanner(object):
     Turns a package requirement string (something like
     libfoo >= 2.0 && libbar >= 3.0) into a PBPackageRequirement(Pair).
     """
-    ### Tokens => Functors
-    # Token matching is simple: If the key is a string, it must match. If it's
-    # a tuple, the token must be an element. If it's a regular expression
-    # MatchObject, it has to match().
-    lexicon = {
-        # Package name
-        re.compile(r'[a-zA-Z-][a-zA-Z0-9./+_-]+'): lambda s, tok: s.pl_pkg(tok),
-        # Version
-        re.compile(r'[0-9]+[0-9.]*'): lambda s, tok: s.pl_ver(tok),
-        # Open parens
-        '(': lambda s, tok: s.pl_lpar(tok),
-        # Close parens
-        ')': lambda s, tok: s.pl_rpar(tok),
-        # Comparators
-        ('>=', '<=', '==', '!='): lambda s, tok: s.pl_cmp(tok),
-        # Combiners
-        ('&&', '||'): lambda s, tok: s.pl_cmb(tok),
-    }
+    # All tokens are matched by a single regex, in one pass. Words are runs of
+    # word characters; a word that is neither a package name, a version, a
+    # comparator nor a combiner is invalid.
+    _word = r'[A-Za-z0-9_./+<>=&|-]'
+    token_re = re.compile(r"""
+        (?P<space>\s+)
+        |(?P<comment>\#.*)
+        |(?P<pkg>[a-zA-Z-][a-zA-Z0-9./+_-]{w}*)
+        |(?P<ver>[0-9]{w}*)
+        |(?P<lpar>\()
+        |(?P<rpar>\))
+        |(?P<cmp>(?:>=|<=|==|!=)(?!{w}))
+        |(?P<cmb>(?:&&|\|\|)(?!{w}))
+        |(?P<invalid>{w}+|.)
+    """.format(w=_word), re.VERBOSE)
 
     def __init__(self, req_string):
         self.preq = None
         self.stack = []
         if not req_string:
             return
-        lexer = shlex.shlex(req_string)
-        lexer.wordchars += '-<>=.&|/+'
-        while True:
-            token = lexer.get_token()
-            if token == lexer.eof:
-                self.end_distro_pkg_expr()
-                break
-            self.get_token_functor(token)(self, token)
-
-    def get_token_functor(self, token):
-        " Return a functor for a given token or throw "
-        for (match, functor) in self.lexicon.items():
-            if isinstance(match, str) and token == match:
-                return functor
-            if isinstance(match, tuple) and token in match:
-                return functor
-            if hasattr(match, 'match') and match.match(token):
-                return functor
-        raise PBException("Invalid token: {0}".format(token))
+        for mo in self.token_re.finditer(req_string):
+            token_type = mo.lastgroup
+            if token_type in ('space', 'comment'):
+                continue
+            if token_type == 'invalid':
+                raise PBException("Invalid token: {0}".format(mo.group()))
+            self.token_handlers[token_type](self, mo.group())
+        self.end_distro_pkg_expr()
 
     def pl_pkg(self, pkg_name):
         " Called in a package requirements list, when a package name is found "
@@ -199,12 +185,100 @@ class PBPackageRequirementScanner(object):
         " Return result, or None for no requirements. "
         return self.preq
 
+    token_handlers = {
+        'pkg': pl_pkg,
+        'ver': pl_ver,
+        'lpar': pl_lpar,
+        'rpar': pl_rpar,
+        'cmp': pl_cmp,
+        'cmb': pl_cmb,
+    }
+
+
+class PBCompiledRequirement(namedtuple('PBCompiledRequirement', 'name compare version')):
+    """
+    Immutable version of PBPackageRequirement
+    """
+    __slots__ = ()
+
+    def ev(self, func):
+        """
+        Run func() with this requirement
+        """
+        return func(self.name, self.compare, self.version)
+
+    def __str__(self, lvl=0):
+        return " "*lvl + "Requirement({0}, {1}, {2})".format(self.name, self.compare, self.version)
+
+
+class PBCompiledRequirementExpr(namedtuple('PBCompiledRequirementExpr', 'combiner operands')):
+    """
+    Immutable combination of requirements, e.g. a || b || c. Chains of the
+    same combiner are flattened into one expression.
+    """
+    __slots__ = ()
+
+    def ev(self, func):
+        """
+        Evaluate the operands from left to right. Like Python's `and' and
+        `or', this stops at the first operand that decides the result, and
+        returns that operand's value.
+        """
+        for operand in self.operands:
+            result = operand.ev(func)
+            if bool(result) == (self.combiner == '||'):
+                break
+        return result
+
+    def __str__(self, lvl=0):
+        return "\n".join(
+            [" "*lvl + "RequirementExpr: ({0})".format(self.combiner)] +
+            [operand.__str__(lvl+1) for operand in self.operands]
+        )
+
+
+def _compile_preq(preq):
+    """
+    Turn the output of PBPackageRequirementScanner into an immutable tree of
+    PBCompiledRequirement(Expr)s.
+    """
+    if preq is None:
+        return None
+    if isinstance(preq, PBPackageRequirement):
+        return PBCompiledRequirement(preq.name, preq.compare or ">=", preq.version)
+    if preq.combiner is None or preq.second is None:
+        return _compile_preq(preq.first)
+    operands = []
+    for operand in (_compile_preq(preq.first), _compile_preq(preq.second)):
+        if isinstance(operand, PBCompiledRequirementExpr) \
+                and operand.combiner == preq.combiner:
+            operands.extend(operand.operands)
+        else:
+            operands.append(operand)
+    return PBCompiledRequirementExpr(preq.combiner, tuple(operands))
+
+
+PACKAGE_REQS_CACHE = {}
+def compile_package_reqs(req_string):
+    """
+    Compile a package requirement string into an immutable expression
+    (see PBCompiledRequirement(Expr)), or None for no requirements.
+
+    Every string is only compiled once per process.
+    """
+    try:
+        return PACKAGE_REQS_CACHE[req_string]
+    except KeyError:
+        compiled = _compile_preq(PBPackageRequirementScanner(req_string).get_preq())
+        PACKAGE_REQS_CACHE[req_string] = compiled
+        return compiled
+
 
 def load_recipe_from_file(filename):
     """
     Turn a .lwr file into a valid recipe datastructure.
     """
-    data = PBConfigFile(filename).get()
+    data = PBConfigFile(filename, read_only=True).get()
     # Make sure dependencies is always a valid list:
     if 'depends' in data and data['depends'] is not None:
         if not isinstance(data['depends'], Sequence):
@@ -216,6 +290,36 @@ def load_recipe_from_file(filename):
     return data
 
 
+def load_inherited_recipe_data(filename):
+    """
+    Load a .lwr file and merge in the fully inherited data of the template
+    it inherits from.
+
+    Returns a tuple (data, template_files). template_files is the list of
+    template files that were merged in, or None if the recipe inherits from
+    an unknown template. The returned data shares nested values with the
+    template cache, so it needs to be copied before it's modified.
+    """
+    data = load_recipe_from_file(filename)
+    inherit_from = data.get('inherit', 'empty')
+    if not inherit_from:
+        return data, []
+    try:
+        parent_data, template_files = \
+            recipe_manager.recipe_manager.get_template_data(inherit_from)
+    except PBException:
+        pb_logging.logger.getChild(
+            "Recipe[{0}]".format(os.path.splitext(os.path.basename(filename))[0])
+        ).warn("Recipe attempting to inherit from unknown template {0}".format(
+            inherit_from
+        ))
+        return data, None
+    data['depends'] = data['depends'] + parent_data['depends']
+    data = dict_merge_shared(parent_data, data)
+    data['inherit'] = parent_data.get('inherit')
+    return data, template_files
+
+
 def normalize_package_data(package_data_dict):
     """
     Make sure the package data follows certain rules.
@@ -235,25 +339,8 @@ class Recipe(object):
         self.log = pb_logging.logger.getChild("Recipe[{0}]".format(self.id))
         self.inherit = 'empty'
         self._static = False
-        # Load original recipe:
         self.log.trace("Loading recipe file: {0}".format(filename))
-        self._data = load_recipe_from_file(filename)
-        # Recursively do the inheritance:
-        while self._data.get('inherit', 'empty'):
-            inherit_from = self._data.get('inherit', 'empty')
-            try:
-                filename = recipe_manager.recipe_manager.get_template_filename(inherit_from)
-                self.log.trace("Loading template file: {0}".format(filename))
-            except PBException:
-                self.log.warn("Recipe attempting to inherit from unknown template {0}".format(
-                    inherit_from
-                ))
-                break
-            self.log.trace("Inheriting from file {0}".format(filename))
-            parent_data = load_recipe_from_file(filename)
-            self._data['depends'] = self._data['depends'] + parent_data['depends']
-            self._data = dict_merge(parent_data, self._data)
-            self._data['inherit'] = parent_data.get('inherit')
+        self._data = recipe_manager.recipe_manager.get_recipe_data(filename)
         if self._data.get('target') == 'package':
             self._data = self.get_local_package_data()
         else:
@@ -279,7 +366,7 @@ class Recipe(object):
 
     def get_package_reqs(self, pkg_type):
         """
-        Return a PBPackageRequirement(Pair) object for the selected
+        Return a PBCompiledRequirement(Expr) object for the selected
         pkg_type. E.g., if pkg_type is 'deb', you can use this to
         figure out which .deb packages to install.
 
@@ -293,8 +380,7 @@ class Recipe(object):
                 req_string = getattr(self, satisfy_key, {}).get(pkg_type)
         if req_string is True:
             return req_string
-        self.log.trace("Parsing requirements string: {}".format(req_string))
-        return PBPackageRequirementScanner(req_string).get_preq()
+        return compile_package_reqs(req_string)
 
     def set_static(self, static):
         """
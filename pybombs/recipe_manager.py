@@ -23,9 +23,112 @@ Recipe Manager: Handles the available recipes
 """
 
 import os
+import atexit
+import hashlib
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import six
+from six.moves import cPickle as pickle
 from pybombs import config_manager
 from pybombs import pb_logging
 from pybombs.pb_exception import PBException
+from pybombs.utils import dict_merge_shared
+from pybombs.utils import sysutils
+
+def _to_builtin(obj):
+    """
+    Recursively convert the loader-specific types in recipe data (e.g.
+    ruamel's CommentedMap) to plain Python types, so they can be pickled
+    independently of the YAML library.
+    """
+    if isinstance(obj, Mapping):
+        return OrderedDict((k, _to_builtin(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [_to_builtin(x) for x in obj]
+    if obj is None or isinstance(obj, bool):
+        return obj
+    for builtin_type in (six.text_type, str, int, float):
+        if isinstance(obj, builtin_type):
+            return builtin_type(obj)
+    return obj
+
+
+class RecipeIndex(object):
+    """
+    On-disk cache of fully inherited recipe data for one recipe location.
+
+    An entry is only valid as long as the recipe file and all the templates
+    it inherits from still have the same mtime and size as when the entry
+    was stored. The data of every entry is pickled separately, so loading
+    the index is cheap, and every lookup returns a fresh copy.
+    """
+    index_version = 1
+
+    def __init__(self, location, cache_dir):
+        self.log = pb_logging.logger.getChild("RecipeIndex")
+        self.filename = os.path.join(
+            cache_dir,
+            "recipes-{0}.idx".format(hashlib.md5(location.encode('utf-8')).hexdigest())
+        )
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        " Load the index file, or start with an empty index "
+        self._entries = {}
+        try:
+            with open(self.filename, 'rb') as index_file:
+                version, entries = pickle.load(index_file)
+            if version == self.index_version:
+                self._entries = entries
+        except (IOError, OSError):
+            pass
+        except Exception as ex:
+            self.log.debug("Ignoring invalid recipe index {0}: {1}".format(self.filename, ex))
+
+    def get(self, filename, get_file_stat):
+        """
+        Return the cached data for recipe file filename, or None if there is
+        no valid entry. get_file_stat is a callable that returns the stat
+        key for a file.
+        """
+        if self._entries is None:
+            self._load()
+        entry = self._entries.get(filename)
+        if entry is None:
+            return None
+        file_stats, data = entry
+        if any(get_file_stat(path) != file_stat for path, file_stat in file_stats):
+            return None
+        return pickle.loads(data)
+
+    def store(self, filename, data, file_stats):
+        """
+        Store the data for recipe file filename. file_stats is a list of
+        (path, stat key) tuples for the recipe and all its templates.
+        """
+        if self._entries is None:
+            self._load()
+        self._entries[filename] = (file_stats, pickle.dumps(data, 2))
+        self._dirty = True
+
+    def save(self):
+        """
+        Write the index back to disk, if it changed. The file is replaced
+        atomically, so concurrent PyBOMBS processes never see a partial index.
+        """
+        if not self._dirty:
+            return
+        try:
+            sysutils.write_file_atomic(
+                self.filename, pickle.dumps((self.index_version, self._entries), 2))
+            self._dirty = False
+        except (IOError, OSError) as ex:
+            self.log.debug("Could not write recipe index {0}: {1}".format(self.filename, ex))
+
 
 class RecipeListManager(object):
     """
@@ -47,9 +150,14 @@ class RecipeListManager(object):
         self._recipe_list = {}
         self._template_list = {}
         self._locations = []
+        self._indexes = {}
+        self._file_stats = {}
+        self._template_cache = {}
+        self._index_dir = self.cfg.get_cache_dir()
         for recipe_loc in self.cfg.get_recipe_locations():
             self.log.debug("Adding recipe location: {0}".format(recipe_loc))
             self._append_location(recipe_loc)
+        atexit.register(self.save_indexes)
 
     def get_recipe_filename(self, name):
         """
@@ -68,6 +176,90 @@ class RecipeListManager(object):
         except KeyError:
             raise PBException("Unable to find template {0}!".format(template))
 
+    def get_template_data(self, template, _resolving=()):
+        """
+        Returns a tuple (data, template_files) with the fully inherited data
+        of a template, and the list of template files that went into it.
+        template_files is None if the inheritance chain contains an unknown
+        template.
+
+        Every template chain is only loaded and merged once. The returned data
+        is shared between all callers and must not be modified.
+
+        Raises a PBException if the template itself is unknown.
+        """
+        if template in self._template_cache:
+            return self._template_cache[template]
+        if template in _resolving:
+            raise PBException("Circular template inheritance: {0}".format(
+                " -> ".join(_resolving + (template,))
+            ))
+        from pybombs.recipe import load_recipe_from_file
+        filename = self.get_template_filename(template)
+        self.log.trace("Loading template file: {0}".format(filename))
+        data = load_recipe_from_file(filename)
+        template_files = [filename]
+        inherit_from = data.get('inherit')
+        if inherit_from and inherit_from not in self._template_list:
+            self.log.warn("Template {0} attempting to inherit from unknown template {1}".format(
+                template, inherit_from
+            ))
+            template_files = None
+        elif inherit_from:
+            parent_data, parent_files = \
+                self.get_template_data(inherit_from, _resolving + (template,))
+            data['depends'] = data['depends'] + parent_data['depends']
+            data = dict_merge_shared(parent_data, data)
+            data['inherit'] = parent_data.get('inherit')
+            if parent_files is None:
+                template_files = None
+            else:
+                template_files += parent_files
+        self._template_cache[template] = (data, template_files)
+        return data, template_files
+
+    def get_recipe_data(self, filename):
+        """
+        Return the fully inherited data of the recipe in filename.
+
+        If the recipe lives in one of our recipe locations, it is served from
+        that location's index when possible, and only parsed if the recipe or
+        any of its templates changed since it was indexed.
+        """
+        from pybombs.recipe import load_inherited_recipe_data
+        filename = os.path.abspath(filename)
+        index = self._indexes.get(os.path.dirname(filename))
+        if index is not None:
+            data = index.get(filename, self._get_file_stat)
+            if data is not None:
+                return data
+        data, template_files = load_inherited_recipe_data(filename)
+        data = _to_builtin(data)
+        if index is not None and template_files is not None:
+            index.store(
+                filename, data,
+                [(path, self._get_file_stat(path)) for path in [filename] + template_files]
+            )
+        return data
+
+    def save_indexes(self):
+        """ Write all modified recipe indexes back to disk """
+        for index in self._indexes.values():
+            index.save()
+
+    def _get_file_stat(self, filename):
+        """
+        Return (mtime, size) for filename, or None if it doesn't exist.
+        Results are cached for the lifetime of this process.
+        """
+        if filename not in self._file_stats:
+            try:
+                file_stat = os.stat(filename)
+                self._file_stats[filename] = (file_stat.st_mtime, file_stat.st_size)
+            except OSError:
+                self._file_stats[filename] = None
+        return self._file_stats[filename]
+
     def list_all(self):
         """ Returns a list of all recipe names """
         return self._recipe_list.keys()
@@ -89,6 +281,8 @@ class RecipeListManager(object):
             self.log.error("'{0}' is not a directory.".format(dirname))
             return
         self.log.debug("Scanning directory '{0}' for recipes...".format(dirname))
+        if self._index_dir is not None:
+            self._indexes[os.path.abspath(dirname)] = RecipeIndex(os.path.abspath(dirname), self._index_dir)
         # Load list of .lwr files from this dir:
         lwr_files = [f for f in os.listdir(dirname) if os.path.splitext(f)[1] == '.lwr']
         self.log.debug("Found {0} new recipes.".format(len(lwr_files)))
@@ -22,7 +22,12 @@
 A requirer is a class that itself has dependencies on packages.
 """
 
+import threading
+
 REQUIRER_CHECKED_CACHE = []
+# Serializes host system installs when packages are built in parallel.
+# Re-entrant, because installing a requirement may itself hit a requirer.
+REQUIRER_LOCK = threading.RLock()
 
 def require_hostsys_dependencies(deps):
     """
@@ -32,25 +37,26 @@ def require_hostsys_dependencies(deps):
     if not deps:
         return
     global REQUIRER_CHECKED_CACHE
-    deps_to_check = [d for d in deps if d not in REQUIRER_CHECKED_CACHE]
-    if not deps_to_check:
-        return
-    from pybombs import install_manager
-    from pybombs.config_manager import config_manager
-    REQUIRER_CHECKED_CACHE += deps_to_check
-    try:
-        config_manager.set_config_reference('pybombs')
-        install_manager.InstallManager().install(
-            deps_to_check,
-            'install', # install / update
-            fail_if_not_exists=False,
-            update_if_exists=False,
-            quiet=True,
-            print_tree=False,
-            install_type="binary", # Requirers may not request source packages
-        )
-    finally:
-        config_manager.set_config_reference('prefix')
+    with REQUIRER_LOCK:
+        deps_to_check = [d for d in deps if d not in REQUIRER_CHECKED_CACHE]
+        if not deps_to_check:
+            return
+        from pybombs import install_manager
+        from pybombs.config_manager import config_manager
+        REQUIRER_CHECKED_CACHE += deps_to_check
+        try:
+            config_manager.set_config_reference('pybombs')
+            install_manager.InstallManager().install(
+                deps_to_check,
+                'install', # install / update
+                fail_if_not_exists=False,
+                update_if_exists=False,
+                quiet=True,
+                print_tree=False,
+                install_type="binary", # Requirers may not request source packages
+            )
+        finally:
+            config_manager.set_config_reference('prefix')
 
 class Requirer(object):
     """
@@ -26,46 +26,202 @@ import os
 import zipfile
 import tarfile
 import tempfile
-import shutil
+import posixpath
 from pybombs import pb_logging
+from pybombs.utils import compression
+
+def _normalize_member_name(name):
+    """
+    Return the normalized name of an archive member, or None if it would
+    end up outside of the directory we're extracting to.
+    """
+    name = posixpath.normpath(name.replace('\\', '/'))
+    if name == '.':
+        return ''
+    if name.startswith('/') or name == '..' or name.startswith('../'):
+        return None
+    return name
+
+
+class _PrefixStripper(object):
+    """
+    Removes the top-level directory from the names of archive members, as
+    long as every member is inside the same one. Works on the fly, so it
+    can be used while streaming an archive: If a member turns up that is
+    not in that directory, everything extracted so far is moved back into
+    it, and no more names are changed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.prefix = None
+        self.stripping = True
+        self._extracted = set()
+
+    def strip(self, name, is_dir):
+        " Return the name name should be extracted to "
+        if not self.stripping:
+            return name
+        top, _, rest = name.partition('/')
+        if self.prefix is None and (rest or is_dir):
+            self.prefix = top
+        if top == self.prefix and (rest or is_dir):
+            if rest:
+                self._extracted.add(rest.partition('/')[0])
+            return rest
+        self._unstrip()
+        return name
+
+    def strip_link(self, linkname):
+        " Like strip(), for hard link targets "
+        if not self.stripping or self.prefix is None:
+            return linkname
+        top, _, rest = linkname.partition('/')
+        return rest if top == self.prefix else linkname
+
+    def _unstrip(self):
+        " Move everything extracted so far back into prefix "
+        self.stripping = False
+        if self.prefix is None:
+            return
+        log = pb_logging.logger.getChild("extract_to")
+        log.debug("Archive has more than one top-level entry, keeping {0}/".format(self.prefix))
+        tmp_dir = tempfile.mkdtemp(dir=self.path)
+        for entry in self._extracted:
+            os.rename(os.path.join(self.path, entry), os.path.join(tmp_dir, entry))
+        os.rename(tmp_dir, os.path.join(self.path, self.prefix))
+
+
+def extract_tar(archive, path):
+    """
+    Extract the opened tarfile archive into path. If all members are in a
+    common top-level directory, that directory is left out, i.e. its contents
+    end up in path. The archive may be opened in streaming mode ('r|*').
+    """
+    log = pb_logging.logger.getChild("extract_to")
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    stripper = _PrefixStripper(path)
+    directories = []
+    for member in archive:
+        name = _normalize_member_name(member.name)
+        if name is None:
+            log.warn("Skipping unsafe archive member: {0}".format(member.name))
+            continue
+        if not name:
+            continue
+        name = stripper.strip(name, member.isdir())
+        if not name:
+            continue
+        member.name = name
+        if member.isdir():
+            dir_path = os.path.join(path, name)
+            if not os.path.isdir(dir_path):
+                os.makedirs(dir_path)
+            directories.append((member, stripper.stripping))
+            continue
+        if member.islnk():
+            link_target = _normalize_member_name(member.linkname)
+            if link_target is None:
+                log.warn("Skipping unsafe archive member: {0}".format(member.name))
+                continue
+            member.linkname = stripper.strip_link(link_target)
+        archive.extract(member, path)
+    # Like extractall(), set directory attributes last, in case they're
+    # not writable. If the prefix was put back, so were the directories.
+    for member, stripped in reversed(directories):
+        if stripped and not stripper.stripping:
+            dir_path = os.path.join(path, stripper.prefix, member.name)
+        else:
+            dir_path = os.path.join(path, member.name)
+        try:
+            os.utime(dir_path, (member.mtime, member.mtime))
+            os.chmod(dir_path, member.mode)
+        except OSError:
+            pass
+
+
+def extract_zip(archive, path):
+    """
+    Like extract_tar(), for an opened zipfile archive.
+    """
+    log = pb_logging.logger.getChild("extract_to")
+    members = []
+    for member in archive.infolist():
+        name = _normalize_member_name(member.filename)
+        if name is None:
+            log.warn("Skipping unsafe archive member: {0}".format(member.filename))
+        elif name:
+            members.append((member, name))
+    # Zip files have an index, so we can look for a common prefix first:
+    prefix = None
+    for member, name in members:
+        top, _, rest = name.partition('/')
+        if (not rest and not member.filename.endswith('/')) \
+                or (prefix is not None and top != prefix):
+            prefix = None
+            break
+        prefix = top
+    for member, name in members:
+        if prefix is not None:
+            name = name[len(prefix)+1:]
+            if not name:
+                continue
+        member.filename = name + ('/' if member.filename.endswith('/') else '')
+        archive.extract(member, path)
+
 
 def extract_to(filename, path):
     """
-    Extract an archive into a directory. Return the prefix for the extracted files.
+    Extract an archive into a directory. If everything in the archive is
+    inside one top-level directory, its contents are extracted straight
+    into path. Tarballs are decompressed by the fastest tool on the host
+    (see compression).
     """
     log = pb_logging.logger.getChild("extract_to")
-    if tarfile.is_tarfile(filename):
-        archive = tarfile.open(filename)
-        names = archive.getnames()
-    elif zipfile.is_zipfile(filename):
-        archive = zipfile.ZipFile(filename)
-        names = archive.namelist()
-    else:
-        raise RuntimeError("Cannot extract {}: Unknown archive type")
     log.debug("Unpacking {0}".format(filename))
-    if len(names) == 1:
-        prefix = os.path.split(archive.getnames()[0])[0]
-    else:
-        prefix = os.path.commonprefix(archive.getnames())
-    if not prefix:
-        prefix = '.'
-    log.debug("Common prefix: {0}".format(prefix))
-    if prefix == '.':
-        if not os.path.isdir(path):
-            os.mkdir(path)
-        archive.extractall(path=path)
-    else:
-        tmp_dir = os.path.normpath(tempfile.mkdtemp())
-        log.debug("Moving {0} -> {1}".format(os.path.normpath(os.path.join(tmp_dir, prefix)), path))
-        archive.extractall(path=tmp_dir)
-        shutil.move(os.path.normpath(os.path.join(tmp_dir, prefix)), path) # Will work if arguments are equal
-    archive.close()
+    if not tarfile.is_tarfile(filename) and zipfile.is_zipfile(filename):
+        archive = zipfile.ZipFile(filename)
+        try:
+            extract_zip(archive, path)
+        finally:
+            archive.close()
+        return True
+    with open(filename, 'rb') as archive_file:
+        try:
+            with compression.open_tar_stream(archive_file) as archive:
+                extract_tar(archive, path)
+        except tarfile.ReadError as ex:
+            raise RuntimeError("Cannot extract {0}: {1}".format(filename, ex))
     return True
 
 def is_archive(filename):
     """
     Return True if 'filename' is a zipped archive.
     """
-    return os.path.isfile(filename) and \
-            (tarfile.is_tarfile(filename) or zipfile.is_zipfile(filename))
-
+    if not os.path.isfile(filename):
+        return False
+    if tarfile.is_tarfile(filename) or zipfile.is_zipfile(filename):
+        return True
+    # tarfile doesn't know all the formats we can decompress. For those,
+    # check if the first block of the decompressed data is a tar header:
+    with open(filename, 'rb') as archive_file:
+        codec = compression.detect_codec(archive_file.read(compression.MAGIC_SIZE))
+        if codec is None or codec.tar_mode is not None:
+            return False
+        archive_file.seek(0)
+        try:
+            stream = compression.decompress(archive_file)
+        except (IOError, OSError):
+            return False
+        try:
+            block = b''
+            while len(block) < tarfile.BLOCKSIZE:
+                data = stream.read(tarfile.BLOCKSIZE - len(block))
+                if not data:
+                    break
+                block += data
+        except (IOError, OSError):
+            return False
+        finally:
+            stream.close()
+    return block[257:262] == b'ustar'
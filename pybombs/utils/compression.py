@@ -0,0 +1,290 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+"""
+Compression formats for tarballs, and fast ways to (de)compress them.
+
+If the host has a parallel (or simply faster) tool for a format, such as
+pigz, lbzip2, `xz -T0` or zstd, that tool does the work in a separate
+process. Otherwise, Python's own codecs are used.
+"""
+
+import os
+import errno
+import tarfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from pybombs.utils import sysutils
+
+# Set to False to always use Python's codecs
+USE_HOST_TOOLS = True
+PIPE_CHUNK_SIZE = 1024 * 1024 # bytes
+
+_TOOL_CACHE = {}
+_TOOL_CACHE_LOCK = threading.Lock()
+
+def find_tool(executable):
+    """
+    Return the path to executable, or None if the host doesn't have it.
+    Like Requirer checks, every tool is only looked up once.
+    """
+    with _TOOL_CACHE_LOCK:
+        if executable not in _TOOL_CACHE:
+            _TOOL_CACHE[executable] = sysutils.which(executable)
+        return _TOOL_CACHE[executable]
+
+
+class Codec(object):
+    """
+    A compression format.
+
+    - magic: The bytes every compressed file starts with
+    - host_tools: List of (executable, decompress args, compress args),
+                  best first. The tools must read from stdin and write to
+                  stdout with these arguments.
+    - tar_mode: The compression tarfile calls this format (e.g. 'gz'), or
+                None if tarfile can't handle it.
+    """
+    def __init__(self, name, magic, host_tools, tar_mode=None):
+        self.name = name
+        self.magic = magic
+        self.host_tools = host_tools
+        self.tar_mode = tar_mode
+
+    def get_tool(self, compress=False):
+        " Return the command line for the best tool on the host, or None "
+        if not USE_HOST_TOOLS:
+            return None
+        for executable, decompress_args, compress_args in self.host_tools:
+            path = find_tool(executable)
+            if path is not None:
+                return [path] + (compress_args if compress else decompress_args)
+        return None
+
+CODECS = {codec.name: codec for codec in (
+    Codec('gzip', b'\x1f\x8b', [('pigz', ['-dc'], ['-c'])], 'gz'),
+    Codec('bzip2', b'BZh', [
+        ('lbzip2', ['-dc'], ['-c']),
+        ('pbzip2', ['-dc'], ['-c']),
+    ], 'bz2'),
+    Codec('xz', b'\xfd7zXZ\x00', [('xz', ['-dc', '-T0'], ['-c', '-T0'])], 'xz'),
+    Codec('zstd', b'\x28\xb5\x2f\xfd', [('zstd', ['-dcq'], ['-cq', '-T0'])]),
+)}
+MAGIC_SIZE = max(len(codec.magic) for codec in CODECS.values())
+
+def detect_codec(header):
+    " Return the Codec for data starting with header, or None "
+    for codec in CODECS.values():
+        if header.startswith(codec.magic):
+            return codec
+    return None
+
+
+class _Prepended(object):
+    " Reads header, then the rest of fileobj "
+    def __init__(self, header, fileobj):
+        self._header = header
+        self._fileobj = fileobj
+
+    def read(self, size=-1):
+        " Like file.read() "
+        if not self._header:
+            return self._fileobj.read(size)
+        if size is None or size < 0:
+            data, self._header = self._header + self._fileobj.read(), b''
+            return data
+        data, self._header = self._header[:size], self._header[size:]
+        if len(data) < size:
+            # tarfile expects full reads while it detects the compression
+            data += self._fileobj.read(size - len(data))
+        return data
+
+    def finish(self):
+        " Nothing to wait for "
+        pass
+
+    def close(self):
+        " Nothing to clean up "
+        pass
+
+
+class _ToolStream(object):
+    """
+    The output of a decompression tool, as a file object. If fileobj is a
+    real file, the tool reads it directly; otherwise, a thread feeds it.
+    """
+    def __init__(self, cmd, fileobj, header, real_file):
+        self.cmd = cmd
+        self._error = None
+        self._closing = False
+        self._feeder = None
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=fileobj if real_file else subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            close_fds=True,
+        )
+        if not real_file:
+            self._feeder = threading.Thread(target=self._feed, args=(fileobj, header))
+            self._feeder.daemon = True
+            self._feeder.start()
+
+    def _feed(self, fileobj, header):
+        " Copy header and fileobj to the tool, until it's all gone "
+        try:
+            data = header
+            while data and not self._closing:
+                self.proc.stdin.write(data)
+                data = fileobj.read(PIPE_CHUNK_SIZE)
+        except (IOError, OSError) as ex:
+            self._error = ex
+        finally:
+            try:
+                self.proc.stdin.close()
+            except (IOError, OSError):
+                pass
+
+    def read(self, size=-1):
+        " Like file.read() "
+        return self.proc.stdout.read(size)
+
+    def finish(self):
+        """
+        Read the rest of the output and wait for the tool. Raises an IOError
+        if the input couldn't be read, or the tool failed.
+        """
+        while self.proc.stdout.read(PIPE_CHUNK_SIZE):
+            pass
+        if self._feeder is not None:
+            self._feeder.join()
+        stderr = self.proc.stderr.read()
+        ret_code = self.proc.wait()
+        if self._error is not None and getattr(self._error, 'errno', None) != errno.EPIPE:
+            raise self._error
+        if ret_code != 0:
+            raise IOError("{0} failed with return code {1}: {2}".format(
+                self.cmd[0], ret_code, stderr.decode('utf-8', 'replace').strip()))
+
+    def close(self):
+        " Stop the tool, if it's still running "
+        self._closing = True
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self.proc.stdout.close()
+        self.proc.stderr.close()
+
+
+def _is_real_file(fileobj):
+    " Return True if fileobj is an actual file a subprocess can read from "
+    try:
+        fileobj.fileno()
+        fileobj.tell()
+        return True
+    except (AttributeError, IOError, OSError, ValueError):
+        return False
+
+def decompress(fileobj):
+    """
+    Return a file object that reads the decompressed contents of fileobj.
+    If there's a host tool for its format, it is used, otherwise, the data
+    is returned as is (tarfile can decompress it itself).
+
+    The returned object also has finish(), to be called after reading
+    everything, and close().
+    """
+    real_file = _is_real_file(fileobj)
+    start = fileobj.tell() if real_file else None
+    header = b''
+    while len(header) < MAGIC_SIZE:
+        data = fileobj.read(MAGIC_SIZE - len(header))
+        if not data:
+            break
+        header += data
+    codec = detect_codec(header)
+    cmd = codec.get_tool() if codec is not None else None
+    if cmd is None and codec is not None and codec.tar_mode is None:
+        raise IOError("Can't decompress {0} data without the {1} tool".format(
+            codec.name, codec.host_tools[0][0]))
+    if real_file:
+        fileobj.seek(start)
+        header = b''
+    if cmd is None:
+        return _Prepended(header, fileobj)
+    if real_file:
+        # The tool reads from the OS file position, not from fileobj's buffer
+        os.lseek(fileobj.fileno(), start, os.SEEK_SET)
+    return _ToolStream(cmd, fileobj, header, real_file)
+
+
+@contextmanager
+def open_tar_stream(fileobj):
+    """
+    Open the (possibly compressed) tarball in fileobj in stream mode ('r|'),
+    decompressing it with the fastest tool available.
+    """
+    stream = decompress(fileobj)
+    try:
+        archive = tarfile.open(fileobj=stream, mode='r|*')
+        try:
+            yield archive
+        finally:
+            archive.close()
+        stream.finish()
+    finally:
+        stream.close()
+
+
+@contextmanager
+def open_tar_writer(filename, codec_name=None):
+    """
+    Open a tarball for writing to filename, compressed with the codec
+    called codec_name (not compressed if that's None).
+    """
+    codec = CODECS[codec_name] if codec_name is not None else None
+    cmd = codec.get_tool(compress=True) if codec is not None else None
+    if cmd is None:
+        if codec is not None and codec.tar_mode is None:
+            raise IOError("Can't compress {0} data without the {1} tool".format(
+                codec.name, codec.host_tools[0][0]))
+        archive = tarfile.open(filename, 'w:' + (codec.tar_mode if codec else ''))
+        try:
+            yield archive
+        finally:
+            archive.close()
+        return
+    with open(filename, 'wb') as out_file:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=out_file, close_fds=True)
+        try:
+            archive = tarfile.open(fileobj=proc.stdin, mode='w|')
+            try:
+                yield archive
+            finally:
+                archive.close()
+            proc.stdin.close()
+            ret_code = proc.wait()
+            if ret_code != 0:
+                raise IOError("{0} failed with return code {1}".format(cmd[0], ret_code))
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
@@ -64,7 +64,7 @@ class OutputProcessor(object):
     def process_output(self, stdoutdata, stderrdata):
         """
         This is called every time there's new output. May contain
-        multiple lines.
+        multiple lines, and lines may be split across calls.
         """
         raise NotImplementedError("process_output() not overridden.")
 
@@ -79,6 +79,21 @@ class OutputProcessorDots(OutputProcessor):
     def process_output(self, stdoutdata, stderrdata):
         sys.stdout.write('.')
 
+class OutputProcessorQuiet(OutputProcessor):
+    """
+    Swallows all output. Used when several processes run at once and their
+    progress bars would only garble each other.
+    """
+    def __init__(self):
+        OutputProcessor.__init__(self)
+        self.extra_popen_args = {'stdout': PIPE, 'stderr': STDOUT}
+
+    def process_output(self, stdoutdata, stderrdata):
+        pass
+
+    def process_final(self):
+        pass
+
 class OutputProcessorMake(OutputProcessor):
     """
     Shows progress when running 'make'
@@ -92,9 +107,13 @@ class OutputProcessorMake(OutputProcessor):
         self.percentage = 0
         self.call_count = 0
         self.percent_regex = re.compile(r'(?<=\[)[ 0-9]{3}(?=%\])')
+        # End of the previous chunk, in case a percentage was split
+        self._tail = ''
 
     def process_output(self, stdoutdata, stderrdata):
         self.call_count += 1
+        if stdoutdata:
+            stdoutdata, self._tail = self._tail + stdoutdata, stdoutdata[-6:]
         if self.percent_found:
             self._update_percentage(stdoutdata)
             sys.stdout.write(self._make_percentage_line())
@@ -25,20 +25,49 @@ Subprocess utils
 from __future__ import print_function
 import os
 import re
+import codecs
+import select
+import sys
+import time
 import signal
 import subprocess
 import threading
 try:
-    from Queue import Queue, Empty
+    import selectors
 except ImportError:
-    from queue import Queue, Empty  # Py3k
+    selectors = None # Python 2
 from pybombs.pb_logging import logger
 from pybombs.pb_exception import PBException
 
-READ_TIMEOUT = 0.1 # s
+# Output is read and handed to output processors in chunks of at most this
+# size, per stream. Nothing else is buffered, so memory use doesn't depend on
+# how much output a process produces.
+READ_CHUNK_SIZE = 65536 # bytes
+MAX_DRAIN_CHUNKS = 16
+PROGRESS_INTERVAL = 0.25 # s
+# Time processes get to exit after SIGTERM, before they get a SIGKILL
+KILL_TIMEOUT = 5 # s
+
+# Every process gets its own process group, so it can be killed along with
+# everything it started. It stays in our session, so it keeps the controlling
+# terminal. Processes that need to read from the terminal (elevated or
+# interactive ones, e.g. sudo asking for passwords, or git asking for
+# credentials) are the exception: Outside the foreground process group,
+# reading from the terminal would stop them.
+if sys.version_info >= (3, 11):
+    NEW_GROUP_POPEN_ARGS = {'process_group': 0}
+elif hasattr(os, 'setpgrp'):
+    NEW_GROUP_POPEN_ARGS = {'preexec_fn': os.setpgrp}
+else:
+    NEW_GROUP_POPEN_ARGS = {}
 
 CalledProcessError = subprocess.CalledProcessError
 
+# Quit events of all processes currently run through monitor_process().
+# Setting one of these makes the corresponding monitor kill its process.
+_ACTIVE_QUIT_EVENTS = set()
+_ACTIVE_QUIT_EVENTS_LOCK = threading.Lock()
+
 
 def check_output(*args, **kwargs):
     """
@@ -50,90 +79,331 @@ def check_output(*args, **kwargs):
     return subprocess.check_output(*args, **kwargs).decode('utf-8')
 
 
-def get_child_pids(pid):
+def call_with_timeout(args, timeout, **kwargs):
+    """
+    Run args, like subprocess.call(), but kill it (and its children) if it
+    hasn't finished after timeout seconds. Output is discarded unless
+    stdout/stderr are given. Other kwargs are passed to Popen.
+
+    Returns the process's return value, or None if it timed out.
+    """
+    with open(os.devnull, 'wb') as devnull:
+        kwargs.setdefault('stdout', devnull)
+        kwargs.setdefault('stderr', devnull)
+        popen_args = dict(NEW_GROUP_POPEN_ARGS)
+        popen_args.update(kwargs)
+        proc = subprocess.Popen(args, **popen_args)
+        deadline = time.time() + timeout
+        while proc.poll() is None:
+            if time.time() > deadline:
+                kill_process_tree(proc)
+                return None
+            time.sleep(0.01)
+    return proc.returncode
+
+
+def _get_process_table():
     """
-    Returns a list of all child pids associated with this pid.
+    Returns a dictionary {pid: (ppid, pgid)} of all running processes.
+    Reads /proc where available, otherwise asks ps once. Zombies are skipped,
+    they can't be signalled anyway.
     """
-    get_child_pids_cmd = ["ps", "-o", "pid", "--ppid", str(pid), "--no-headers"]
+    table = {}
     try:
-        children = check_output(get_child_pids_cmd).strip().split("\n")
+        pids = [int(x) for x in os.listdir('/proc') if x.isdigit()]
+    except OSError:
+        pids = None
+    if pids is not None:
+        for pid in pids:
+            try:
+                with open('/proc/{0}/stat'.format(pid), 'rb') as stat_file:
+                    stat = stat_file.read()
+            except (IOError, OSError):
+                continue # Already gone
+            # The command name may contain anything, so skip past its last ')'
+            fields = stat[stat.rfind(b')') + 2:].split()
+            if fields[0] != b'Z':
+                table[pid] = (int(fields[1]), int(fields[2]))
+        return table
+    try:
+        ps_output = check_output(["ps", "-e", "-o", "pid=,ppid=,pgid=,stat="])
     except (OSError, subprocess.CalledProcessError):
-        return []
-    return [int(child) for child in children]
+        return table
+    for line in ps_output.splitlines():
+        fields = line.split()
+        if len(fields) == 4 and not fields[3].startswith('Z'):
+            table[int(fields[0])] = (int(fields[1]), int(fields[2]))
+    return table
 
 
-def kill_process_tree(process, pid=None):
+def get_child_pids(pid, table=None):
+    """
+    Returns a list of all child pids associated with this pid, including
+    grandchildren etc.
     """
-    Kill the process and, if possible, all associated child processes.
+    if table is None:
+        table = _get_process_table()
+    children = {}
+    for child_pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(child_pid)
+    result = []
+    todo = [pid]
+    while todo:
+        for child_pid in children.get(todo.pop(), []):
+            result.append(child_pid)
+            todo.append(child_pid)
+    return result
+
 
-    TODO make more portable.
+def _get_own_group(pid):
     """
-    if pid is None:
-        pid = process.pid
-    children = get_child_pids(pid)
-    for child_pid in children:
-        kill_process_tree(child_pid)
-    if process is not None:
-        try:
-            process.terminate()
-        except OSError:
-            return
-    else:
-        try:
-            os.kill(pid, signal.SIGTERM)
-        except OSError:
+    Returns pid if the process pid is the leader of its own process group
+    (see NEW_GROUP_POPEN_ARGS), or None. This also works after the leader
+    was reaped, as long as anything in its group is still running.
+    """
+    try:
+        return pid if os.getpgid(pid) == pid else None
+    except OSError:
+        pass
+    try:
+        os.killpg(pid, 0)
+        return pid
+    except OSError:
+        return None
+
+
+def kill_process_tree(process, timeout=KILL_TIMEOUT):
+    """
+    Kill the process and all associated child processes.
+
+    The process group of process (if it has its own) and all of its
+    descendants get a SIGTERM. Whatever is still running after timeout
+    seconds gets a SIGKILL.
+    """
+    pid = process.pid
+    pgid = _get_own_group(pid)
+    # Remember the descendants now: Once their parent is gone, they're
+    # reparented and can't be found by walking the tree anymore.
+    table = _get_process_table()
+    targets = set(get_child_pids(pid, table))
+    def _get_remaining():
+        " Return the targets that are still running "
+        table = _get_process_table()
+        remaining = set(x for x in targets if x in table)
+        if pgid is not None:
+            # Sweep the group for stragglers that were started since
+            remaining.update(x for x, (_, x_pgid) in table.items() if x_pgid == pgid)
+        if process.poll() is None:
+            remaining.add(pid)
+        return remaining
+    def _send_signal(sig, pids):
+        " Send sig to all pids, and the process group "
+        if pgid is not None:
             try:
-                os.kill(pid, signal.SIGKILL)
+                os.killpg(pgid, sig)
             except OSError:
-                return
+                pass
+        for target_pid in pids:
+            try:
+                os.kill(target_pid, sig)
+            except OSError:
+                pass # Gone already, or not ours (e.g. elevated)
+    remaining = _get_remaining()
+    _send_signal(signal.SIGTERM, remaining)
+    deadline = time.time() + timeout
+    while remaining and time.time() < deadline:
+        time.sleep(0.05)
+        remaining = _get_remaining()
+    if remaining:
+        logger.getChild("kill_process_tree()").debug(
+            "Processes did not terminate, killing: {0}".format(
+                ", ".join(str(x) for x in sorted(remaining))))
+        _send_signal(signal.SIGKILL, remaining)
+    process.poll()
 
-def run_with_output_processing(p, o_proc, event, cleanup=None):
+class WakeupEvent(object):
+    """
+    Like threading.Event, but it can also be waited on along with file
+    descriptors: once set, fileno() becomes readable.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._read_fd, self._write_fd = os.pipe()
+
+    def fileno(self):
+        " File descriptor that becomes readable when the event is set "
+        return self._read_fd
+
+    def set(self):
+        " Set the event and wake up anyone waiting for it "
+        with self._lock:
+            if self._write_fd is not None and not self._event.is_set():
+                self._event.set()
+                os.write(self._write_fd, b'x')
+
+    def is_set(self):
+        " Returns True if the event was set "
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        " Block until the event is set, or timeout expires "
+        return self._event.wait(timeout)
+
+    def close(self):
+        " Release the pipe. The event can still be queried afterwards. "
+        with self._lock:
+            for fd in (self._read_fd, self._write_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._read_fd = self._write_fd = None
+
+
+class _FdWaiter(object):
+    """
+    Waits until any of a set of file descriptors becomes readable. Uses the
+    selectors module where available, and plain select() on Python 2.
+    """
+    def __init__(self):
+        self._selector = selectors.DefaultSelector() if selectors is not None else None
+        self._fds = set()
+
+    def register(self, fd):
+        " Start watching fd "
+        self._fds.add(fd)
+        if self._selector is not None:
+            self._selector.register(fd, selectors.EVENT_READ)
+
+    def unregister(self, fd):
+        " Stop watching fd "
+        self._fds.discard(fd)
+        if self._selector is not None:
+            self._selector.unregister(fd)
+
+    def wait(self, timeout=None):
+        " Return the set of readable fds. timeout=None waits forever. "
+        if self._selector is not None:
+            return set(key.fd for key, _ in self._selector.select(timeout))
+        return set(select.select(list(self._fds), [], [], timeout)[0])
+
+    def close(self):
+        " Release the selector "
+        if self._selector is not None:
+            self._selector.close()
+
+
+def _get_exit_fd(proc):
     """
-    Run a previously created process p through
-    an output processor o_proc.
+    Returns a file descriptor that becomes readable when proc exits, and a
+    callback to release it. Uses a pidfd on Linux, and a helper thread
+    that waits for the process everywhere else.
     """
-    def enqueue_output(stdout_data, stdout_queue, stderr_data, stderr_queue):
-        " Puts the output from the process into the queue "
-        for line in iter(stdout_data.readline, b''):
-            stdout_queue.put(line)
-        stdout_data.close()
-        if stderr_data is not None:
-            for line in iter(stderr_data.readline, b''):
-                stderr_queue.put(line)
-            stderr_data.close()
-    def poll_queue(q):
-        " Safe polling from queue "
-        line = ""
+    if hasattr(os, 'pidfd_open'):
         try:
-            line = q.get(timeout=READ_TIMEOUT).decode('utf-8')
-        except Empty:
-            return ""
-        # Got line:
-        return line
-    # Init thread and queue
-    q_stdout = Queue()
-    q_stderr = Queue()
-    t = threading.Thread(target=enqueue_output, args=(p.stdout, q_stdout, p.stderr, q_stderr))
-    # End the thread when the program terminates
-    t.daemon = True
-    t.start()
-    # Run loop
-    while p.poll() is None: # Run while process is alive
-        line_stdout = poll_queue(q_stdout)
-        line_stderr = poll_queue(q_stderr)
-        o_proc.process_output(line_stdout, line_stderr)
-        event.wait(0.05)
-        if event.is_set():
-            kill_process_tree(p)
-            if cleanup is not None:
-                cleanup()
-            return 1
-    o_proc.process_final()
+            pidfd = os.pidfd_open(proc.pid)
+            return pidfd, lambda: os.close(pidfd)
+        except OSError:
+            pass
+    exit_event = WakeupEvent()
+    def _wait_for_exit():
+        " Wait for proc in the background "
+        proc.wait()
+        exit_event.set()
+    waiter = threading.Thread(target=_wait_for_exit)
+    waiter.daemon = True
+    waiter.start()
+    return exit_event.fileno(), exit_event.close
+
+
+def run_with_output_processing(p, o_proc, event, cleanup=None):
+    """
+    Run a previously created process p until it exits, or until event (a
+    WakeupEvent) is set, in which case it is killed and cleanup() is
+    called.
+
+    If o_proc is given, stdout and stderr are both read as soon as output is
+    available, so neither can fill up its pipe and stall the process. The
+    output is handed to the output processor in chunks of at most
+    READ_CHUNK_SIZE bytes per stream.
+
+    There is no polling: Output, process exit and event are all waited on
+    at the same time.
+    """
+    streams = {}
+    decoders = {}
+    for name in ('stdout', 'stderr'):
+        stream = getattr(p, name)
+        if o_proc is not None and stream is not None:
+            streams[stream.fileno()] = name
+            decoders[name] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    exit_fd, close_exit_fd = _get_exit_fd(p)
+    waiter = _FdWaiter()
+    for fd in list(streams.keys()) + [exit_fd, event.fileno()]:
+        waiter.register(fd)
+    def _read_output(readable):
+        " Read available output from all readable streams "
+        output = {'stdout': '', 'stderr': ''}
+        for fd in [fd for fd in readable if fd in streams]:
+            name = streams[fd]
+            data = os.read(fd, READ_CHUNK_SIZE)
+            if not data: # EOF
+                waiter.unregister(fd)
+                del streams[fd]
+            output[name] += decoders[name].decode(data, not data)
+        if output['stdout'] or output['stderr']:
+            o_proc.process_output(output['stdout'], output['stderr'])
+    try:
+        while True:
+            # With an output processor, wake up every now and then even
+            # without output, so it can keep its progress indicator moving.
+            readable = waiter.wait(PROGRESS_INTERVAL if o_proc is not None else None)
+            if event.fileno() in readable or event.is_set():
+                kill_process_tree(p)
+                if cleanup is not None:
+                    cleanup()
+                return 1
+            if o_proc is not None:
+                if readable:
+                    _read_output(readable)
+                else:
+                    o_proc.process_output('', '')
+            if exit_fd in readable:
+                break
+        # The process is done. Read what's left in the pipes, but don't wait
+        # for EOF: Processes it left behind might still hold them open (and
+        # keep writing to them, so only read what fits into a pipe buffer).
+        for _ in range(MAX_DRAIN_CHUNKS):
+            readable = waiter.wait(0)
+            if not any(fd in streams for fd in readable):
+                break
+            _read_output(readable)
+        p.wait()
+    finally:
+        waiter.close()
+        close_exit_fd()
+        for stream in (p.stdout, p.stderr):
+            if stream is not None:
+                stream.close()
+    if o_proc is not None:
+        o_proc.process_final()
     return p.returncode
 
-def _process_thread(event, args, kwargs):
+def cancel_all_processes():
+    """
+    Kill every process that is currently being run by monitor_process(),
+    regardless of which thread started it. Their cleanup callbacks are
+    executed as if they were cancelled by Ctrl+C.
+    """
+    with _ACTIVE_QUIT_EVENTS_LOCK:
+        for quit_event in _ACTIVE_QUIT_EVENTS:
+            quit_event.set()
+
+def _prepare_command(args, kwargs, log):
     """
-    This actually runs the process.
+    Apply the monitor_process() options in kwargs (shell, elevate, env, cwd,
+    o_proc) to the command args. Returns a tuple (args, popen_args, o_proc,
+    cmd_pp), where popen_args are the keyword arguments for Popen, o_proc
+    is the output processor or None, and cmd_pp is the command for printing.
     """
     def elevate_command(args, elevate_pre_args):
         " Modify the command to run with elevated privileges. "
@@ -157,56 +427,59 @@ def _process_thread(event, args, kwargs):
             )
     from pybombs.config_manager import config_manager
     from pybombs.utils import output_proc
-    _process_thread.result = 0
-    extra_popen_args = {}
-    use_oproc = False
+    popen_args = {}
     o_proc = kwargs.get('o_proc')
     if isinstance(o_proc, output_proc.OutputProcessor):
-        use_oproc = True
-        extra_popen_args = o_proc.extra_popen_args
+        popen_args.update(o_proc.extra_popen_args)
+    else:
+        o_proc = None
+    if not kwargs.get('elevate') and not kwargs.get('interactive'):
+        popen_args.update(NEW_GROUP_POPEN_ARGS)
     if kwargs.get('shell', False) and isinstance(args, list):
         args = ' '.join(args)
     if kwargs.get('elevate'):
         args = elevate_command(args, config_manager.get('elevate_pre_args'))
-    log = logger.getChild("_process_thread()")
+    popen_args['env'] = kwargs.get('env', config_manager.get_active_prefix().env)
+    popen_args['cwd'] = kwargs.get('cwd')
     cmd_pp = pretty_print_cmd(args)
     if kwargs.get('elevate'):
         log.info("Executing command with elevated privileges: `{cmd}'"
                  .format(cmd=cmd_pp))
     else:
         log.debug("Executing command `{cmd}'".format(cmd=cmd_pp))
+    return args, popen_args, o_proc, cmd_pp
+
+def _log_launch_failure(log, cmd_pp, kwargs):
+    " Explain why a command could not be started. "
+    from pybombs.config_manager import config_manager
+    log.error("Failure executing command `{cmd}'!".format(cmd=cmd_pp))
+    if kwargs.get('elevate'):
+        log.debug("Make sure command can be elevated using `{epa}' " \
+                       "on this platform!".format(
+                           epa=config_manager.get('elevate_pre_args')))
+
+def _process_thread(event, args, kwargs, result):
+    """
+    This actually runs the process. The return value is stored in
+    result['value'].
+    """
+    result['value'] = 0
+    log = logger.getChild("_process_thread()")
+    args, popen_args, o_proc, cmd_pp = _prepare_command(args, kwargs, log)
     try:
         proc = subprocess.Popen(
             args,
             shell=kwargs.get('shell', False),
-            env=kwargs.get('env', config_manager.get_active_prefix().env),
-            **extra_popen_args
+            **popen_args
         )
     except OSError:
-        log.error("Failure executing command `{cmd}'!".format(cmd=cmd_pp))
-        if kwargs.get('elevate'):
-            log.debug("Make sure command can be elevated using `{epa}' " \
-                           "on this platform!".format(
-                               epa=config_manager.get('elevate_pre_args')))
+        _log_launch_failure(log, cmd_pp, kwargs)
+        result['value'] = -1
         return -1
-    if use_oproc:
-        ret_code = run_with_output_processing(
-            proc, o_proc,
-            event, kwargs.get('cleanup')
-        )
-    else:
-        # Wait until the process is done, or monitor_process() sends us the
-        # quit event
-        ret_code = None
-        while ret_code is None and not event.is_set():
-            ret_code = proc.poll()
-            event.wait(1)
-            if event.is_set():
-                kill_process_tree(proc)
-                if kwargs.get('cleanup') is not None:
-                    kwargs.get('cleanup')()
-                break
-    _process_thread.result = ret_code
+    ret_code = run_with_output_processing(
+        proc, o_proc, event, kwargs.get('cleanup')
+    )
+    result['value'] = ret_code
     event.set()
     return ret_code
 
@@ -227,29 +500,35 @@ def monitor_process(args, **kwargs):
     - o_proc: An output processor
     - cleanup: A callback to clean up artifacts if the process is killed
     - elevate: Run with elevated privileges (e.g., 'sudo <command>')
+    - interactive: The process might need to prompt the user on the terminal
+    - cwd: Run the process in this directory instead of the current one
 
     Returns the process's return value.
     """
     log = logger.getChild("monitor_process()")
     if kwargs.get('elevate'):
         log.debug("Running with elevated privileges.")
+    result = {'value': 0}
+    quit_event = WakeupEvent()
+    with _ACTIVE_QUIT_EVENTS_LOCK:
+        _ACTIVE_QUIT_EVENTS.add(quit_event)
+    monitor_thread = threading.Thread(
+        target=_process_thread,
+        args=(quit_event, args, kwargs, result)
+    )
     try:
-        quit_event = threading.Event()
-        monitor_thread = threading.Thread(
-            target=_process_thread,
-            args=(quit_event, args, kwargs)
-        )
         monitor_thread.start()
         while monitor_thread.is_alive():
-            # Try if it's finished:
+            # join() returns as soon as the thread is done; the timeout only
+            # keeps us responsive to Ctrl+C on Python 2.
             monitor_thread.join(1)
             if quit_event.is_set() or not monitor_thread.is_alive():
                 log.debug("Thread signaled termination or returned")
                 break
-        log.debug("Return value: {0}".format(_process_thread.result))
-        if _process_thread.result != 0 and kwargs.get("throw", False):
-            raise PBException("Process returned value: " + str(_process_thread.result))
-        return _process_thread.result
+        log.debug("Return value: {0}".format(result['value']))
+        if result['value'] != 0 and kwargs.get("throw", False):
+            raise PBException("Process returned value: " + str(result['value']))
+        return result['value']
     except KeyboardInterrupt:
         print("")
         log.info("Caught Ctrl+C. Killing all sub-processes.")
@@ -261,6 +540,11 @@ def monitor_process(args, **kwargs):
             raise ex
         else:
             return -1
+    finally:
+        with _ACTIVE_QUIT_EVENTS_LOCK:
+            _ACTIVE_QUIT_EVENTS.discard(quit_event)
+        if not monitor_thread.is_alive():
+            quit_event.close()
 
 
 def match_output(command, pattern, match_key=None, **kwargs):
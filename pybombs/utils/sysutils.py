@@ -27,6 +27,8 @@ import re
 import os
 import os.path as op
 import sys
+import shutil
+import tempfile
 from pybombs.pb_exception import PBException
 
 def which(program, env=None):
@@ -89,6 +91,38 @@ def mkdirp_writable(dir_path, log=None):
             return False
     return mkdir_writable(dir_path, log)
 
+def _write_atomic(filename, write_func):
+    " Call write_func on a temporary file, then rename that to filename "
+    fd, tmp_filename = tempfile.mkstemp(
+        dir=os.path.dirname(filename) or '.',
+        prefix='.' + os.path.basename(filename) + '.',
+    )
+    try:
+        with os.fdopen(fd, 'wb') as out_file:
+            write_func(out_file)
+        os.rename(tmp_filename, filename)
+    except Exception:
+        os.remove(tmp_filename)
+        raise
+
+def write_file_atomic(filename, data):
+    """
+    Write data (bytes) to filename. The data is written to a temporary file
+    in the same directory, which is then renamed, so readers never see a
+    partially written file.
+    """
+    _write_atomic(filename, lambda out_file: out_file.write(data))
+
+def copy_file_atomic(src_filename, filename):
+    """
+    Like write_file_atomic(), but copies the contents of src_filename.
+    """
+    def _copy(out_file):
+        " Copy in chunks, the file might be big "
+        with open(src_filename, 'rb') as in_file:
+            shutil.copyfileobj(in_file, out_file)
+    _write_atomic(filename, _copy)
+
 def require_subdirs(base_path, subdirs, log=None):
     """
     subdirs is a list of subdirectories that need to exist inside path.
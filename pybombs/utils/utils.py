@@ -23,7 +23,7 @@ Utilities
 """
 
 import sys
-from copy import deepcopy
+from copy import copy, deepcopy
 from six import iteritems
 from builtins import input
 try:
@@ -45,6 +45,22 @@ def dict_merge(a, b):
             result[k] = deepcopy(v)
     return result
 
+def dict_merge_shared(a, b):
+    """
+    Like dict_merge(), but without the deep copies. The result is a new
+    dictionary, but all values that didn't need merging are shared with a
+    or b. Neither a nor b are modified.
+    """
+    if not isinstance(b, Mapping):
+        return b
+    result = copy(a)
+    for k, v in iteritems(b):
+        if k in result and isinstance(result[k], Mapping):
+            result[k] = dict_merge_shared(result[k], v)
+        else:
+            result[k] = v
+    return result
+
 def confirm(question, default="N", timeout=0):
     """
     Ask the question, return True if answered positive, or False if
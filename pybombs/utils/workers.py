@@ -0,0 +1,85 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+"""
+Worker thread pool for running I/O bound tasks in parallel
+"""
+
+import time
+import threading
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue  # Py3k
+from pybombs.utils import subproc
+
+def run_parallel(func, items, jobs, on_error=None, timeout=None):
+    """
+    Call func(item) for all items, in up to `jobs' worker threads, and
+    return a dict item -> return value. Items must be hashable and unique.
+
+    - on_error: If func raises an Exception, the result for that item is
+                on_error(item, exception) instead. Without on_error, the
+                item gets no result.
+    - timeout: Stop waiting after this many seconds. Items that aren't done
+               by then get no result; their workers are left to finish in
+               the background.
+
+    On Ctrl+C, all processes started through subproc are cancelled.
+    """
+    items = list(items)
+    if not items:
+        return {}
+    task_queue = Queue()
+    results = {}
+    def _worker():
+        " Process items from task_queue until we get a None "
+        while True:
+            item = task_queue.get()
+            if item is None:
+                return
+            try:
+                results[item] = func(item)
+            except Exception as ex:
+                if on_error is not None:
+                    results[item] = on_error(item, ex)
+    for item in items:
+        task_queue.put(item)
+    workers = [threading.Thread(target=_worker) for _ in range(max(1, min(jobs, len(items))))]
+    for worker in workers:
+        worker.daemon = True
+        task_queue.put(None)
+        worker.start()
+    deadline = None if timeout is None else time.time() + timeout
+    try:
+        for worker in workers:
+            # Join with a timeout, so we stay responsive to Ctrl+C
+            while worker.is_alive():
+                if deadline is None:
+                    worker.join(1)
+                elif time.time() < deadline:
+                    worker.join(max(0, min(1, deadline - time.time())))
+                else:
+                    break
+    except KeyboardInterrupt:
+        subproc.cancel_all_processes()
+        raise
+    # Late workers might still add results:
+    return dict(results)
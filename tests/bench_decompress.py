@@ -0,0 +1,96 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python tests/bench_decompress.py [SIZE_MB]'
+"""
+Benchmark: Create and extract tarballs in every format, once with the
+host's compression tools and once with Python's own codecs.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from pybombs.utils import archives
+from pybombs.utils import compression
+
+def make_tree(path, size):
+    " Create size bytes of compressible files below path "
+    words = [
+        ''.join(random.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(random.randint(2, 10)))
+        for _ in range(5000)
+    ]
+    file_size = 4 * 1024 * 1024
+    for idx in range(max(1, size // file_size)):
+        dirname = os.path.join(path, 'dir{0}'.format(idx % 10))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(os.path.join(dirname, 'file{0}.txt'.format(idx)), 'w') as out_file:
+            written = 0
+            while written < file_size:
+                line = ' '.join(random.choice(words) for _ in range(12)) + '\n'
+                out_file.write(line)
+                written += len(line)
+
+def bench(tmp_dir, src_dir, codec_name):
+    " Return the time it takes to create and to extract the tarball "
+    filename = os.path.join(tmp_dir, 'bench.tar.' + codec_name)
+    path = os.path.join(tmp_dir, 'extracted')
+    start = time.time()
+    with compression.open_tar_writer(filename, codec_name) as archive:
+        archive.add(src_dir, arcname='bench')
+    t_compress = time.time() - start
+    start = time.time()
+    archives.extract_to(filename, path)
+    t_extract = time.time() - start
+    shutil.rmtree(path)
+    os.remove(filename)
+    return t_compress, t_extract
+
+def main():
+    " Go, go, go! "
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        src_dir = os.path.join(tmp_dir, 'src')
+        make_tree(src_dir, size_mb * 1024 * 1024)
+        print("Tarballs of {0} MB:".format(size_mb))
+        for codec_name, codec in sorted(compression.CODECS.items()):
+            compression.USE_HOST_TOOLS = True
+            tool = codec.get_tool()
+            results = []
+            if tool is not None:
+                results.append((os.path.basename(tool[0]), bench(tmp_dir, src_dir, codec_name)))
+            if codec.tar_mode is not None:
+                compression.USE_HOST_TOOLS = False
+                results.append(('python', bench(tmp_dir, src_dir, codec_name)))
+            for name, (t_compress, t_extract) in results:
+                print("  {0:6} {1:8} create: {2:6.2f}s  extract: {3:6.2f}s ({4:.0f} MB/s)".format(
+                    codec_name, name, t_compress, t_extract, size_mb / t_extract))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == "__main__":
+    main()
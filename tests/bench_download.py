@@ -0,0 +1,119 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python tests/bench_download.py [SIZE_MB]'
+"""
+Benchmark: Download a file from a local HTTP server, the way the wget
+fetcher used to (1 KiB reads, progress on every chunk), and with the
+current download engine.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import math
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+import requests
+from pybombs.fetchers import wget
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    " Keep-alive connections must not block each other "
+    daemon_threads = True
+
+class DataHandler(BaseHTTPRequestHandler):
+    " Serves server.data "
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.server.data)))
+        self.end_headers()
+        self.wfile.write(self.server.data)
+
+    def log_message(self, *args):
+        pass
+
+def download_1k(url, dest, devnull):
+    " The old _download_with_requests(), minus the resume logic "
+    filename = os.path.join(dest, os.path.split(url)[1])
+    req = requests.get(url, stream=True, headers={'User-Agent': 'PyBOMBS'})
+    filesize = float(req.headers.get('content-length', 0))
+    filesize_dl = 0
+    hash_md5 = hashlib.md5()
+    with open(filename, 'wb') as out_file:
+        for buff in req.iter_content(chunk_size=1024):
+            out_file.write(buff)
+            filesize_dl += len(buff)
+            hash_md5.update(buff)
+            status = r"%05d kB / %05d kB (%03d%%)" % (
+                int(math.ceil(filesize_dl/1000.)),
+                int(math.ceil(filesize/1000.)),
+                int(math.ceil(filesize_dl*100.)/filesize)
+            )
+            devnull.write(status + chr(8)*(len(status)+1))
+    return hash_md5.hexdigest()
+
+def download_engine(url, dest, devnull):
+    " The current download engine "
+    stdout = sys.stdout
+    sys.stdout = devnull
+    try:
+        return wget._download_with_requests(url, dest)[1]['md5']
+    finally:
+        sys.stdout = stdout
+
+def main():
+    " Go, go, go! "
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DataHandler)
+    server.data = os.urandom(size_mb * 1024 * 1024)
+    md5 = hashlib.md5(server.data).hexdigest()
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    url = 'http://127.0.0.1:{0}/bench.tar.gz'.format(server.server_address[1])
+    dest = tempfile.mkdtemp()
+    try:
+        with open(os.devnull, 'w') as devnull:
+            print("Downloading {0} MB:".format(size_mb))
+            for name, func in (("1 KiB chunks", download_1k), ("engine", download_engine)):
+                start = time.time()
+                assert func(url, dest, devnull) == md5
+                duration = time.time() - start
+                print("  {0:<13} {1:6.2f}s ({2:.0f} MB/s)".format(
+                    name + ":", duration, size_mb / duration))
+    finally:
+        server.shutdown()
+        shutil.rmtree(dest)
+
+if __name__ == "__main__":
+    main()
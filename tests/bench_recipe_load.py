@@ -0,0 +1,79 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# run as 'python tests/bench_recipe_load.py [NUM_RECIPES]'
+"""
+Benchmark: Parse a large set of synthetic recipes with the round-trip
+and the read-only YAML loaders.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+import shutil
+import tempfile
+from pybombs.config_file import PBConfigFile
+
+RECIPE = """# Synthetic recipe
+category: common
+depends:
+- boost
+- cppunit
+inherit: cmake
+source: git+https://example.com/pkg{idx}.git
+gitbranch: master
+satisfy:
+  deb: libpkg{idx}-dev >= 1.0 && libpkg{idx}-bin
+  rpm: pkg{idx}-devel >= 1.0
+vars:
+  config_opt: " -DENABLE_DOXYGEN=OFF -DENABLE_TESTING=OFF "
+configure: cmake .. -DCMAKE_INSTALL_PREFIX=$prefix $config_opt
+"""
+
+def bench(filenames, read_only):
+    " Load all files, return the time it took "
+    start = time.time()
+    for filename in filenames:
+        PBConfigFile(filename, read_only=read_only).get()
+    return time.time() - start
+
+def main():
+    " Go, go, go! "
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    recipe_dir = tempfile.mkdtemp()
+    try:
+        filenames = []
+        for idx in range(num_recipes):
+            filename = os.path.join(recipe_dir, "pkg{0}.lwr".format(idx))
+            with open(filename, 'w') as recipe_file:
+                recipe_file.write(RECIPE.format(idx=idx))
+            filenames.append(filename)
+        t_rt = bench(filenames, read_only=False)
+        t_ro = bench(filenames, read_only=True)
+        print("Loading {0} recipes:".format(num_recipes))
+        print("  round-trip: {0:.3f}s".format(t_rt))
+        print("  read-only:  {0:.3f}s ({1:.1f}x)".format(t_ro, t_rt / t_ro))
+    finally:
+        shutil.rmtree(recipe_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python tests/bench_satisfier.py [NUM_ITERATIONS]'
+"""
+Benchmark: Compile and evaluate satisfier strings, with and without the
+compiled expression cache.
+"""
+
+from __future__ import print_function
+import sys
+import time
+from pybombs.recipe import PBPackageRequirementScanner, compile_package_reqs
+
+REQ_STRINGS = [
+    "libboost-all-dev >= 1.60",
+    "qt5-default >= 5.0 || qtbase5-dev",
+    "python3-dev && python3-six && python3-mako >= 1.0",
+    "(libusb-1.0-0-dev || libusb-dev) && libudev-dev",
+    "liba || libb || libc || libd || libe",
+]
+
+def satisfy_evaluator(pkg_name, comparator, required_version):
+    " Fake packager: everything ending in 'dev' is available "
+    return pkg_name.endswith('dev')
+
+def main():
+    " Go, go, go! "
+    num_iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    start = time.time()
+    for _ in range(num_iterations):
+        for req_string in REQ_STRINGS:
+            PBPackageRequirementScanner(req_string).get_preq()
+    t_parse = time.time() - start
+    start = time.time()
+    for _ in range(num_iterations):
+        for req_string in REQ_STRINGS:
+            compile_package_reqs(req_string).ev(satisfy_evaluator)
+    t_cached = time.time() - start
+    n_evals = num_iterations * len(REQ_STRINGS)
+    print("{0} requirement strings:".format(n_evals))
+    print("  parse only:          {0:.3f}s ({1:.1f}us each)".format(t_parse, 1e6 * t_parse / n_evals))
+    print("  cached compile + ev: {0:.3f}s ({1:.1f}us each)".format(t_cached, 1e6 * t_cached / n_evals))
+
+if __name__ == "__main__":
+    main()
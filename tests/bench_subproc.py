@@ -0,0 +1,61 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python tests/bench_subproc.py [NUM_COMMANDS]'
+"""
+Benchmark: Per-command overhead of monitor_process() for trivial commands,
+compared to a plain subprocess.call().
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+import subprocess
+from pybombs.utils import subproc
+from pybombs.utils import output_proc
+
+def bench(func, num_commands):
+    " Run func() num_commands times, return the average time in ms "
+    start = time.time()
+    for _ in range(num_commands):
+        func()
+    return 1000 * (time.time() - start) / num_commands
+
+def main():
+    " Go, go, go! "
+    num_commands = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    env = dict(os.environ)
+    t_call = bench(lambda: subprocess.call(['true']), num_commands)
+    t_monitor = bench(lambda: subproc.monitor_process(["true"], env=env), num_commands)
+    t_oproc = bench(
+        lambda: subproc.monitor_process(
+            ['echo', 'foo'], env=env, o_proc=output_proc.OutputProcessorQuiet()),
+        num_commands
+    )
+    print("{0} trivial commands, average time per command:".format(num_commands))
+    print("  subprocess.call():                     {0:.2f} ms".format(t_call))
+    print("  monitor_process():                     {0:.2f} ms".format(t_monitor))
+    print("  monitor_process() w/ output processor: {0:.2f} ms".format(t_oproc))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import unittest
+import subprocess
+from pybombs.utils import archives
+from pybombs.utils import compression
+
+
+def make_tar(members, fileobj, mode='w:gz'):
+    " Write a tarball with members, a list of (name, contents or None for dirs) "
+    with tarfile.open(fileobj=fileobj, mode=mode) as archive:
+        for name, contents in members:
+            info = tarfile.TarInfo(name)
+            if contents is None:
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                archive.addfile(info)
+            else:
+                info.size = len(contents)
+                archive.addfile(info, io.BytesIO(contents))
+
+
+class TestArchives(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'pkg')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def list_path(self):
+        " Return all files below self.path "
+        result = []
+        for dirpath, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                result.append(os.path.relpath(os.path.join(dirpath, filename), self.path))
+        return sorted(result)
+
+    def extract_tar(self, members, stream=False):
+        tarball = os.path.join(self.tmp_dir, 'pkg.tar.gz')
+        with open(tarball, 'wb') as tar_file:
+            make_tar(members, tar_file)
+        if stream:
+            with open(tarball, 'rb') as tar_file:
+                with tarfile.open(fileobj=tar_file, mode='r|*') as archive:
+                    archives.extract_tar(archive, self.path)
+        else:
+            self.assertTrue(archives.extract_to(tarball, self.path))
+
+    def test_strip_prefix(self):
+        for stream in (False, True):
+            self.extract_tar([
+                ('./foo-1.0', None),
+                ('./foo-1.0/README', b'readme'),
+                ('foo-1.0/src', None),
+                ('foo-1.0/src/foo.c', b'int x;'),
+            ], stream)
+            self.assertEqual(self.list_path(), ['README', os.path.join('src', 'foo.c')])
+            with open(os.path.join(self.path, 'README')) as readme:
+                self.assertEqual(readme.read(), 'readme')
+            shutil.rmtree(self.path)
+
+    def test_no_common_prefix(self):
+        for stream in (False, True):
+            self.extract_tar([
+                ('foo-1.0/README', b'readme'),
+                ('foo-1.0/src/foo.c', b'int x;'),
+                ('bar/bar.c', b'int y;'),
+            ], stream)
+            self.assertEqual(self.list_path(), [
+                os.path.join('bar', 'bar.c'),
+                os.path.join('foo-1.0', 'README'),
+                os.path.join('foo-1.0', 'src', 'foo.c'),
+            ])
+            shutil.rmtree(self.path)
+
+    def test_top_level_files(self):
+        self.extract_tar([('README', b'readme'), ('foo.c', b'int x;')])
+        self.assertEqual(self.list_path(), ['README', 'foo.c'])
+
+    def test_unsafe_members(self):
+        self.extract_tar([
+            ('foo/README', b'readme'),
+            ('foo/../../evil', b'evil'),
+            ('/etc/evil', b'evil'),
+        ])
+        self.assertEqual(self.list_path(), ['README'])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, 'evil')))
+
+    def test_zip(self):
+        zip_filename = os.path.join(self.tmp_dir, 'pkg.zip')
+        with zipfile.ZipFile(zip_filename, 'w') as archive:
+            archive.writestr('foo-1.0/', b'')
+            archive.writestr('foo-1.0/README', b'readme')
+            archive.writestr('foo-1.0/src/foo.c', b'int x;')
+        self.assertTrue(archives.extract_to(zip_filename, self.path))
+        self.assertEqual(self.list_path(), ['README', os.path.join('src', 'foo.c')])
+
+    @unittest.skipIf(compression.find_tool('zstd') is None, "zstd not installed")
+    def test_is_archive_zstd(self):
+        tarball = os.path.join(self.tmp_dir, 'pkg.tar.zst')
+        with compression.open_tar_writer(tarball, 'zstd') as archive:
+            info = tarfile.TarInfo('foo-1.0/README')
+            info.size = 6
+            archive.addfile(info, io.BytesIO(b'readme'))
+        self.assertTrue(archives.is_archive(tarball))
+        # Not every zstd file is a tarball:
+        plain = os.path.join(self.tmp_dir, 'README.zst')
+        with open(plain, 'wb') as plain_file:
+            proc = subprocess.Popen(['zstd', '-cq'], stdin=subprocess.PIPE, stdout=plain_file)
+            proc.communicate(b'just some text\n' * 100)
+        self.assertEqual(proc.returncode, 0)
+        self.assertFalse(archives.is_archive(plain))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
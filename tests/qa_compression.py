@@ -0,0 +1,109 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from pybombs.utils import archives
+from pybombs.utils import compression
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.src_dir = os.path.join(self.tmp_dir, 'foo-1.0')
+        os.makedirs(os.path.join(self.src_dir, 'src'))
+        self.data = os.urandom(300 * 1024) * 3
+        with open(os.path.join(self.src_dir, 'src', 'foo.bin'), 'wb') as data_file:
+            data_file.write(self.data)
+
+    def tearDown(self):
+        compression.USE_HOST_TOOLS = True
+        shutil.rmtree(self.tmp_dir)
+
+    def make_tarball(self, codec_name):
+        " Deploy src_dir to a tarball, return its filename "
+        filename = os.path.join(self.tmp_dir, 'foo-1.0.tar.' + str(codec_name))
+        with compression.open_tar_writer(filename, codec_name) as archive:
+            archive.add(self.src_dir, arcname='foo-1.0')
+        return filename
+
+    def check_extracted(self, path):
+        with open(os.path.join(path, 'src', 'foo.bin'), 'rb') as data_file:
+            self.assertEqual(data_file.read(), self.data)
+
+    def get_codecs(self):
+        " All codecs we can test on this host "
+        return [
+            name for name, codec in compression.CODECS.items()
+            if codec.tar_mode is not None or codec.get_tool() is not None
+        ]
+
+    def test_round_trip(self):
+        for use_host_tools in (True, False):
+            compression.USE_HOST_TOOLS = use_host_tools
+            for codec_name in [None] + self.get_codecs():
+                if codec_name is not None \
+                        and not use_host_tools \
+                        and compression.CODECS[codec_name].tar_mode is None:
+                    continue
+                filename = self.make_tarball(codec_name)
+                with open(filename, 'rb') as tarball:
+                    self.assertEqual(
+                        compression.detect_codec(tarball.read(compression.MAGIC_SIZE)),
+                        compression.CODECS.get(codec_name))
+                path = os.path.join(self.tmp_dir, 'extracted')
+                self.assertTrue(archives.is_archive(filename))
+                archives.extract_to(filename, path)
+                self.check_extracted(path)
+                shutil.rmtree(path)
+                os.remove(filename)
+
+    def test_stream(self):
+        " Decompress from something that isn't a file "
+        for codec_name in self.get_codecs():
+            with open(self.make_tarball(codec_name), 'rb') as tarball:
+                stream = io.BytesIO(tarball.read())
+            path = os.path.join(self.tmp_dir, codec_name)
+            with compression.open_tar_stream(stream) as archive:
+                archives.extract_tar(archive, path)
+            self.check_extracted(path)
+
+    def test_corrupt(self):
+        xz_codec = compression.CODECS['xz']
+        if xz_codec.get_tool() is None:
+            self.skipTest("xz is not available")
+        with open(self.make_tarball('xz'), 'rb') as tarball:
+            data = tarball.read()
+        stream = io.BytesIO(data[:len(data) // 2] + b'\0' * 1000 + data[len(data) // 2:])
+        def _extract():
+            with compression.open_tar_stream(stream) as archive:
+                archives.extract_tar(archive, os.path.join(self.tmp_dir, 'corrupt'))
+        self.assertRaises((IOError, compression.tarfile.TarError), _extract)
+
+
+if __name__ == '__main__':
+    unittest.main()
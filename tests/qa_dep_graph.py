@@ -0,0 +1,75 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+
+import unittest
+from pybombs.dep_graph import DepGraph
+from pybombs.pb_exception import PBException
+
+
+class TestDepGraph(unittest.TestCase):
+
+    def make_diamond(self):
+        " gnuradio -> (uhd, volk) -> boost, plus an unrelated package "
+        graph = DepGraph()
+        graph.add_edge('gnuradio', 'uhd')
+        graph.add_edge('gnuradio', 'volk')
+        graph.add_edge('uhd', 'boost')
+        graph.add_edge('volk', 'boost')
+        graph.add_node('gqrx')
+        return graph
+
+    def test_membership(self):
+        graph = self.make_diamond()
+        self.assertIn('boost', graph)
+        self.assertNotIn('cmake', graph)
+        self.assertEqual(len(graph), 5)
+        self.assertFalse(graph.empty())
+        self.assertTrue(DepGraph().empty())
+
+    def test_shared_node_stored_once(self):
+        graph = self.make_diamond()
+        graph.add_edge('uhd', 'boost')
+        self.assertEqual(graph.get_values().count('boost'), 1)
+        self.assertEqual(graph.get_dependees('boost'), ['uhd', 'volk'])
+        self.assertEqual(graph.get_dependencies('uhd'), ['boost'])
+
+    def test_roots(self):
+        self.assertEqual(self.make_diamond().get_roots(), ['gnuradio', 'gqrx'])
+
+    def test_serialize(self):
+        graph = self.make_diamond()
+        order = graph.serialize()
+        self.assertEqual(sorted(order), sorted(graph.get_values()))
+        for pkg in order:
+            for dep in graph.get_dependencies(pkg):
+                self.assertLess(order.index(dep), order.index(pkg))
+
+    def test_serialize_cycle(self):
+        graph = DepGraph()
+        graph.add_edge('a', 'b')
+        graph.add_edge('b', 'a')
+        self.assertRaises(PBException, graph.serialize)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+import os
+import shutil
+import tempfile
+import unittest
+from pybombs.config_manager import config_manager
+from pybombs.distcache_manager import DistCacheManager
+from pybombs.utils import md5sum
+
+
+class TestDistCacheManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'dist')
+        os.mkdir(self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_file(self, name, size=1000, content=b'x'):
+        " Create a download called name "
+        filename = os.path.join(self.tmp_dir, name)
+        with open(filename, 'wb') as out_file:
+            out_file.write(content * size)
+        return filename
+
+    def test_add_get(self):
+        cache = DistCacheManager(self.cache_dir, 1024 * 1024)
+        url = 'https://example.com/foo-1.0.tar.gz'
+        self.assertIsNone(cache.get(url))
+        filename = self.make_file('foo-1.0.tar.gz')
+        md5 = md5sum(filename)
+        cached = cache.add(url, filename)
+        self.assertEqual(cached, os.path.join(self.cache_dir, md5, 'foo-1.0.tar.gz'))
+        self.assertEqual(cache.get(url), cached)
+        # The same content from somewhere else:
+        self.assertEqual(cache.get('https://mirror.example.com/foo.tar.gz', md5), cached)
+        self.assertIsNone(cache.get(url, 'd41d8cd98f00b204e9800998ecf8427e'))
+
+    def test_corrupt(self):
+        cache = DistCacheManager(self.cache_dir, 1024 * 1024)
+        url = 'https://example.com/foo.tar.gz'
+        cached = cache.add(url, self.make_file('foo.tar.gz'))
+        with open(cached, 'ab') as cached_file:
+            cached_file.write(b'garbage')
+        self.assertIsNone(cache.get(url))
+        self.assertFalse(os.path.exists(cached))
+
+    def test_lru_eviction(self):
+        cache = DistCacheManager(self.cache_dir, 2500)
+        urls = ['https://example.com/{0}.tar.gz'.format(x) for x in 'abc']
+        for idx, url in enumerate(urls[:2]):
+            cache.add(url, self.make_file(os.path.basename(url), content=url[-8:-7].encode()))
+            os.utime(cache.get(url), (idx, idx))
+        # Using a makes b the least recently used one:
+        self.assertIsNotNone(cache.get(urls[0]))
+        cache.add(urls[2], self.make_file('c.tar.gz', content=b'c'))
+        self.assertIsNotNone(cache.get(urls[0]))
+        self.assertIsNone(cache.get(urls[1]))
+        self.assertIsNotNone(cache.get(urls[2]))
+
+    def test_disabled(self):
+        cache = DistCacheManager(self.cache_dir, 0)
+        self.assertFalse(cache.enabled())
+        self.assertIsNone(cache.add('https://example.com/a.tar.gz', self.make_file('a.tar.gz')))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_invalid_size(self):
+        old_size = config_manager.get('dist-cache-size')
+        config_manager.set('dist-cache-size', 'lots')
+        try:
+            cache = DistCacheManager(self.cache_dir)
+        finally:
+            config_manager.set('dist-cache-size', old_size)
+        self.assertFalse(cache.enabled())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+
+import os
+import shutil
+import tempfile
+import unittest
+from pybombs.packagers.apt import DpkgDatabase, normalize_deb_version
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'dpkg')
+
+
+class TestDpkgDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = DpkgDatabase(
+            status_file=os.path.join(FIXTURE_DIR, 'status'),
+            lists_dir=os.path.join(FIXTURE_DIR, 'lists'),
+        )
+
+    def test_normalize(self):
+        self.assertEqual(normalize_deb_version('1:2.39.2-1.1'), '2.39.2')
+        self.assertEqual(normalize_deb_version('2.36-9+deb12u4'), '2.36')
+        self.assertFalse(normalize_deb_version('git20160101'))
+
+    def test_installed(self):
+        self.assertEqual(self.db.get_installed_version('libboost-dev'), '1.74.0')
+        self.assertEqual(self.db.get_installed_version('git'), '2.39.2')
+        self.assertEqual(self.db.get_installed_version('libc6:i386'), '2.36')
+        # Only config files left:
+        self.assertFalse(self.db.get_installed_version('python3-mako'))
+        self.assertFalse(self.db.get_installed_version('gnuradio'))
+
+    def test_available(self):
+        # Highest version across all lists, including compressed ones:
+        self.assertEqual(self.db.get_available_version('git'), '2.43.0')
+        self.assertEqual(self.db.get_available_version('python3-mako'), '1.2.4')
+        # Installed, but not in any list:
+        self.assertEqual(self.db.get_available_version('libc6'), '2.36')
+        self.assertFalse(self.db.get_available_version('gnuradio'))
+
+    def test_missing_files(self):
+        db = DpkgDatabase(
+            status_file=os.path.join(FIXTURE_DIR, 'nonexistent'),
+            lists_dir=os.path.join(FIXTURE_DIR, 'nonexistent'),
+        )
+        self.assertIsNone(db.get_installed_version('git'))
+        self.assertIsNone(db.get_available_version('git'))
+
+    def test_corrupt_lists(self):
+        lists_dir = tempfile.mkdtemp()
+        try:
+            for filename in os.listdir(os.path.join(FIXTURE_DIR, 'lists')):
+                shutil.copy(os.path.join(FIXTURE_DIR, 'lists', filename), lists_dir)
+            gz_file = [x for x in os.listdir(lists_dir) if x.endswith('.gz')][0]
+            with open(os.path.join(lists_dir, gz_file), 'rb') as list_file:
+                data = list_file.read()
+            for corrupt_data in (data[:len(data) // 2], data[:10] + b'\0' * (len(data) - 10)):
+                with open(os.path.join(lists_dir, gz_file), 'wb') as list_file:
+                    list_file.write(corrupt_data)
+                db = DpkgDatabase(os.path.join(FIXTURE_DIR, 'status'), lists_dir)
+                self.assertIsNone(db.get_available_version('git'))
+        finally:
+            shutil.rmtree(lists_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import unittest
+from pybombs.fetchers import File
+
+
+class TestFileFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.src_dir = os.path.join(self.tmp_dir, 'src')
+        os.mkdir(self.src_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_tarball(self, name):
+        " Create name.tar.gz, containing name-1.0/README "
+        top_dir = os.path.join(self.tmp_dir, name + '-1.0')
+        os.mkdir(top_dir)
+        with open(os.path.join(top_dir, 'README'), 'w') as readme:
+            readme.write(name)
+        tarball = os.path.join(self.tmp_dir, name + '.tar.gz')
+        with tarfile.open(tarball, 'w:gz') as archive:
+            archive.add(top_dir, arcname=name + '-1.0')
+        return tarball
+
+    def check_fetched(self, name):
+        with open(os.path.join(self.src_dir, name, 'README')) as readme:
+            self.assertEqual(readme.read(), name)
+
+    def test_fetch_into_dest(self):
+        tarball = self.make_tarball('foo')
+        cwd = os.getcwd()
+        self.assertTrue(File().fetch_url(tarball, self.src_dir, 'foo', {}))
+        self.assertEqual(os.getcwd(), cwd)
+        self.check_fetched('foo')
+        self.assertFalse(os.path.exists(os.path.join(self.src_dir, 'foo.tar.gz')))
+
+    def test_concurrent_fetches(self):
+        names = ['pkg{0}'.format(idx) for idx in range(8)]
+        tarballs = [self.make_tarball(name) for name in names]
+        results = {}
+        def _fetch(tarball, name):
+            results[name] = File().fetch_url(tarball, self.src_dir, name, {})
+        threads = [
+            threading.Thread(target=_fetch, args=(tarball, name))
+            for tarball, name in zip(tarballs, names)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {name: True for name in names})
+        for name in names:
+            self.check_fetched(name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+import os
+import shutil
+import tempfile
+import unittest
+from pybombs.fetchers import git
+from pybombs.utils import subproc
+from pybombs.utils import sysutils
+
+
+@unittest.skipIf(sysutils.which('git') is None, "git is not available")
+class TestGitFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.src_dir = os.path.join(self.tmp_dir, 'src')
+        os.mkdir(self.src_dir)
+        self.origin = os.path.join(self.tmp_dir, 'origin')
+        os.mkdir(self.origin)
+        self.git('init', '-q', '-b', 'master', cwd=self.origin)
+        self.git('config', 'uploadpack.allowFilter', 'true', cwd=self.origin)
+        self.commits = [self.commit('commit {0}'.format(idx)) for idx in range(5)]
+        self.git('tag', 'v1.0', self.commits[1], cwd=self.origin)
+        self.url = 'file://' + self.origin
+        self.fetcher = git.Git()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def git(self, *args, **kwargs):
+        " Run git, return its output "
+        env = dict(os.environ)
+        env.update({
+            'GIT_AUTHOR_NAME': 'test', 'GIT_AUTHOR_EMAIL': 'test@example.com',
+            'GIT_COMMITTER_NAME': 'test', 'GIT_COMMITTER_EMAIL': 'test@example.com',
+        })
+        return subproc.check_output(
+            ['git'] + list(args), cwd=kwargs.get('cwd', self.pkg_dir), env=env).strip()
+
+    @property
+    def pkg_dir(self):
+        return os.path.join(self.src_dir, 'pkg')
+
+    def commit(self, message, dirname='docs'):
+        " Add a commit to origin, return its hash "
+        os.path.isdir(os.path.join(self.origin, dirname)) \
+            or os.mkdir(os.path.join(self.origin, dirname))
+        with open(os.path.join(self.origin, dirname, 'file'), 'a') as out_file:
+            out_file.write(message + '\n')
+        self.git('add', '.', cwd=self.origin)
+        self.git('commit', '-q', '-m', message, cwd=self.origin)
+        return self.git('rev-parse', 'HEAD', cwd=self.origin)
+
+    def fetch(self, **args):
+        args.setdefault('gitbranch', 'master')
+        self.assertTrue(self.fetcher.fetch_url(self.url, self.src_dir, 'pkg', args))
+
+    def test_full_clone(self):
+        self.fetch()
+        self.assertFalse(git.is_shallow(self.pkg_dir))
+        self.assertEqual(self.git('rev-list', '--count', 'HEAD'), '5')
+
+    def test_shallow_clone(self):
+        self.fetch(gitdepth=1)
+        self.assertTrue(git.is_shallow(self.pkg_dir))
+        self.assertEqual(self.git('rev-list', '--count', 'HEAD'), '1')
+        new_commit = self.commit('new commit')
+        self.assertTrue(self.fetcher.update_src(self.url, self.src_dir, 'pkg', {
+            'gitbranch': 'master', 'gitdepth': 1}))
+        self.assertEqual(self.git('rev-parse', 'HEAD'), new_commit)
+        self.assertTrue(git.is_shallow(self.pkg_dir))
+
+    def test_shallow_rev(self):
+        for rev in (self.commits[2], 'v1.0', self.commits[0][:10]):
+            self.fetch(gitdepth=1, gitrev=rev)
+            self.assertEqual(
+                self.git('rev-parse', 'HEAD'),
+                self.git('rev-parse', rev + '^{commit}', cwd=self.origin))
+            shutil.rmtree(self.pkg_dir)
+
+    def test_update_shallow_rev(self):
+        self.fetch(gitdepth=1)
+        args = {'gitbranch': 'master', 'gitdepth': 1, 'gitrev': self.commits[1]}
+        self.assertTrue(self.fetcher.update_src(self.url, self.src_dir, 'pkg', args))
+        self.assertEqual(self.git('rev-parse', 'HEAD'), self.commits[1])
+        # Unlike a full clone, the shallow one only has what it needed:
+        self.assertEqual(self.git('rev-list', '--count', '--all'), '2')
+
+    def test_partial_clone(self):
+        self.fetch(gitfilter='blob:none')
+        self.assertEqual(self.git('config', 'remote.origin.partialclonefilter'), 'blob:none')
+        self.assertEqual(self.git('rev-list', '--count', 'HEAD'), '5')
+
+    def is_up_to_date(self, **args):
+        args.setdefault('gitbranch', 'master')
+        git._REMOTE_REFS.clear()
+        return self.fetcher.is_up_to_date(self.url, self.src_dir, 'pkg', args)
+
+    def test_up_to_date(self):
+        self.fetch()
+        self.assertTrue(self.is_up_to_date())
+        self.assertFalse(self.is_up_to_date(gitrev='v1.0'))
+        self.assertFalse(self.is_up_to_date(gitbranch='other'))
+        self.commit('new commit')
+        self.assertFalse(self.is_up_to_date())
+        self.assertTrue(self.fetcher.update_src(self.url, self.src_dir, 'pkg', {'gitbranch': 'master'}))
+        self.assertTrue(self.is_up_to_date())
+
+    def test_up_to_date_upstream(self):
+        self.fetch()
+        self.assertTrue(self.is_up_to_date(gitbranch=None))
+        self.commit('new commit')
+        self.assertFalse(self.is_up_to_date(gitbranch=None))
+        self.assertTrue(self.fetcher.update_src(self.url, self.src_dir, 'pkg', {}))
+        self.assertTrue(self.is_up_to_date(gitbranch=None))
+
+    def test_up_to_date_unreachable(self):
+        self.fetch()
+        shutil.rmtree(self.origin)
+        self.assertFalse(self.is_up_to_date())
+
+    def test_up_to_date_rev(self):
+        self.git('tag', '-a', '-m', 'annotated', 'v2.0', self.commits[2], cwd=self.origin)
+        for rev in (self.commits[3], 'v1.0', 'v2.0', self.commits[1][:10]):
+            self.fetch(gitrev=rev)
+            self.assertTrue(self.is_up_to_date(gitrev=rev))
+            self.assertFalse(self.is_up_to_date(gitrev=self.commits[4]))
+            shutil.rmtree(self.pkg_dir)
+
+    def test_git_cache(self):
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.fetcher.cfg.set('git-cache', cache_dir)
+        try:
+            self.fetch(gitdepth=1)
+        finally:
+            self.fetcher.cfg.set('git-cache', None)
+        self.assertTrue(os.path.isfile(os.path.join(self.pkg_dir, '.git', 'objects', 'info', 'alternates')))
+        self.assertEqual(self.git('rev-parse', 'HEAD'), self.commits[-1])
+
+    def test_reuse_clones(self):
+        pool = os.path.join(self.tmp_dir, 'pool')
+        os.mkdir(pool)
+        self.git('clone', '-q', self.url + '/', 'other', cwd=pool)
+        self.git('clone', '-q', '--depth', '1', self.url, 'shallow', cwd=pool)
+        self.assertEqual(git.find_local_clone(self.url, 'pkg', [pool]), os.path.join(pool, 'other'))
+        self.assertEqual(git.find_local_clone(self.url, 'pkg', [pool], os.path.join(pool, 'other')), None)
+        self.fetcher.cfg.set('git-source-pools', pool)
+        try:
+            # The default copies the objects, so the clones stay independent
+            self.fetch()
+            self.assertFalse(os.path.exists(os.path.join(self.pkg_dir, '.git', 'objects', 'info', 'alternates')))
+            self.assertEqual(self.git('rev-parse', 'HEAD'), self.commits[-1])
+            shutil.rmtree(self.pkg_dir)
+            self.fetcher.cfg.set('git-reuse-clones', 'reference')
+            self.fetch()
+        finally:
+            self.fetcher.cfg.set('git-source-pools', '')
+            self.fetcher.cfg.set('git-reuse-clones', 'dissociate')
+        with open(os.path.join(self.pkg_dir, '.git', 'objects', 'info', 'alternates')) as alternates:
+            self.assertEqual(
+                os.path.realpath(alternates.read().strip()),
+                os.path.realpath(os.path.join(pool, 'other', '.git', 'objects')))
+        self.assertEqual(self.git('rev-parse', 'HEAD'), self.commits[-1])
+
+    def test_sparse_checkout(self):
+        self.commit('source', dirname='src')
+        self.fetch(gitsparse=['src'])
+        self.assertTrue(os.path.isfile(os.path.join(self.pkg_dir, 'src', 'file')))
+        self.assertFalse(os.path.exists(os.path.join(self.pkg_dir, 'docs')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+import os
+import shutil
+import tempfile
+import unittest
+from pybombs import fetcher
+from pybombs.fetchers import git
+from pybombs.inventory import Inventory
+from pybombs.recipe import Recipe
+from pybombs.utils import subproc
+from pybombs.utils import sysutils
+
+
+@unittest.skipIf(sysutils.which('git') is None, "git is not available")
+class TestUpdateAll(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fetcher = fetcher.Fetcher()
+        self.fetcher.src_dir = os.path.join(self.tmp_dir, 'src')
+        self.fetcher.inventory = Inventory(os.path.join(self.tmp_dir, 'inventory.yml'))
+        self.origins = {}
+        self.recipes = []
+        for idx in range(3):
+            name = 'pkg{0}'.format(idx)
+            origin = os.path.join(self.tmp_dir, 'origin', name)
+            os.makedirs(origin)
+            self.git(origin, 'init', '-q', '-b', 'master')
+            self.git(origin, 'commit', '-q', '--allow-empty', '-m', 'first')
+            self.origins[name] = origin
+            recipe_filename = os.path.join(self.tmp_dir, name + '.lwr')
+            with open(recipe_filename, 'w') as recipe_file:
+                recipe_file.write("category: common\nsource: git+file://{0}\ngitbranch: master\n".format(origin))
+            self.recipes.append(Recipe(recipe_filename))
+            self.fetcher.fetch(self.recipes[-1])
+
+    def tearDown(self):
+        fetcher._UPDATED_SOURCES.clear()
+        git._REMOTE_REFS.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    @staticmethod
+    def git(path, *args):
+        env = dict(os.environ)
+        env.update({
+            'GIT_AUTHOR_NAME': 'test', 'GIT_AUTHOR_EMAIL': 'test@example.com',
+            'GIT_COMMITTER_NAME': 'test', 'GIT_COMMITTER_EMAIL': 'test@example.com',
+        })
+        return subproc.check_output(['git'] + list(args), cwd=path, env=env).strip()
+
+    def test_update_all(self):
+        new_commit = None
+        for name in ('pkg0', 'pkg2'):
+            self.git(self.origins[name], 'commit', '-q', '--allow-empty', '-m', 'second')
+            new_commit = self.git(self.origins[name], 'rev-parse', 'HEAD')
+        inventory = self.fetcher.inventory
+        for recipe in self.recipes:
+            inventory.set_state(recipe.id, inventory.STATE_INSTALLED)
+        results = self.fetcher.update_all(self.recipes, 2)
+        self.assertEqual(results, {'pkg0': 'updated', 'pkg1': 'current', 'pkg2': 'updated'})
+        # Until they're rebuilt, the packages are still installed
+        for recipe in self.recipes:
+            self.assertEqual(inventory.get_state(recipe.id), inventory.STATE_INSTALLED)
+        self.assertEqual(self.git(os.path.join(self.fetcher.src_dir, 'pkg2'), 'rev-parse', 'HEAD'), new_commit)
+        self.assertFalse(self.fetcher.is_up_to_date(self.recipes[0]))
+        self.assertTrue(self.fetcher.is_up_to_date(self.recipes[1]))
+        # Builds don't go back to the network:
+        shutil.rmtree(os.path.join(self.tmp_dir, 'origin'))
+        for recipe in self.recipes:
+            self.assertTrue(self.fetcher.update(recipe))
+            self.assertEqual(inventory.get_state(recipe.id), inventory.STATE_CONFIGURED)
+
+    def test_aborted_build(self):
+        self.git(self.origins['pkg0'], 'commit', '-q', '--allow-empty', '-m', 'second')
+        inventory = self.fetcher.inventory
+        for recipe in self.recipes:
+            inventory.set_state(recipe.id, inventory.STATE_INSTALLED)
+        self.fetcher.update_all(self.recipes, 2)
+        # The build never happens, and the next run starts from scratch:
+        fetcher._UPDATED_SOURCES.clear()
+        git._REMOTE_REFS.clear()
+        self.fetcher.inventory = Inventory(os.path.join(self.tmp_dir, 'inventory.yml'))
+        self.assertFalse(self.fetcher.is_up_to_date(self.recipes[0]))
+        self.assertTrue(self.fetcher.is_up_to_date(self.recipes[1]))
+        self.assertTrue(self.fetcher.update(self.recipes[0]))
+        self.assertTrue(self.fetcher.is_up_to_date(self.recipes[0]))
+
+    def test_failed_update(self):
+        shutil.rmtree(self.origins['pkg1'])
+        results = self.fetcher.update_all(self.recipes, 3)
+        self.assertEqual(results['pkg1'], 'failed')
+        self.assertNotIn((self.fetcher.src_dir, 'pkg1'), fetcher._UPDATED_SOURCES)
+
+
+if __name__ == '__main__':
+    unittest.main()
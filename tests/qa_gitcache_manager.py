@@ -0,0 +1,115 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+import os
+import fcntl
+import shutil
+import tempfile
+import threading
+import unittest
+from pybombs.config_manager import config_manager
+from pybombs.gitcache_manager import GitCacheManager
+from pybombs.utils import subproc
+from pybombs.utils import sysutils
+
+
+@unittest.skipIf(sysutils.which('git') is None, "git is not available")
+class TestGitCacheManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.origins = {}
+        for idx in range(4):
+            origin = os.path.join(self.tmp_dir, 'origin{0}'.format(idx))
+            os.mkdir(origin)
+            self.git(origin, 'init', '-q')
+            self.git(origin, 'commit', '-q', '--allow-empty', '-m', 'commit {0}'.format(idx))
+            self.origins['pkg{0}'.format(idx)] = origin
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @staticmethod
+    def git(path, *args):
+        env = dict(os.environ)
+        env.update({
+            'GIT_AUTHOR_NAME': 'test', 'GIT_AUTHOR_EMAIL': 'test@example.com',
+            'GIT_COMMITTER_NAME': 'test', 'GIT_COMMITTER_EMAIL': 'test@example.com',
+        })
+        return subproc.check_output(['git'] + list(args), cwd=path, env=env).strip()
+
+    def test_add_remotes(self):
+        gcm = GitCacheManager(self.cache_dir, max_age=3600)
+        results = gcm.add_remotes(self.origins, True, jobs=2)
+        self.assertEqual(sorted(results.keys()), sorted(self.origins.keys()))
+        self.assertTrue(all(success for success, _ in results.values()))
+        self.assertEqual(GitCacheManager(self.cache_dir, max_age=3600).remotes, self.origins)
+        for name, origin in self.origins.items():
+            self.assertEqual(
+                self.git(self.cache_dir, 'rev-parse', 'refs/remotes/{0}/{1}'.format(
+                    name, self.git(origin, 'symbolic-ref', '--short', 'HEAD'))),
+                self.git(origin, 'rev-parse', 'HEAD'))
+        # Everything is up to date now:
+        self.assertEqual(gcm.add_remotes(self.origins, True), {})
+        self.assertEqual(len(gcm.add_remotes(self.origins, True, force=True)), 4)
+        self.assertEqual(len(GitCacheManager(self.cache_dir, max_age=0).fetch(['pkg0'])), 1)
+
+    def test_concurrent_add_remote(self):
+        GitCacheManager(self.cache_dir)
+        def _add_remote(name, url):
+            GitCacheManager(self.cache_dir, max_age=3600).add_remote(name, url, True)
+        threads = [
+            threading.Thread(target=_add_remote, args=item)
+            for item in self.origins.items()
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        gcm = GitCacheManager(self.cache_dir)
+        self.assertEqual(gcm.remotes, self.origins)
+        self.assertEqual(sorted(gcm.get_fetch_times().keys()), sorted(self.origins.keys()))
+
+    def test_file_lock(self):
+        gcm = GitCacheManager(self.cache_dir)
+        with open(os.path.join(self.cache_dir, gcm.lock_filename), 'a') as lock_file:
+            with gcm.lock():
+                with gcm.lock():
+                    self.assertRaises(
+                        (IOError, OSError),
+                        fcntl.flock, lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def test_invalid_max_age(self):
+        old_max_age = config_manager.get('git-cache-max-age')
+        config_manager.set('git-cache-max-age', 'an hour')
+        try:
+            gcm = GitCacheManager(self.cache_dir)
+        finally:
+            config_manager.set('git-cache-max-age', old_max_age)
+        self.assertEqual(gcm.max_age, 3600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+import os
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+try:
+    import requests
+except ImportError:
+    requests = None
+from pybombs import mirror_manager
+from pybombs.config_manager import config_manager
+from pybombs.fetcher import Fetcher
+from pybombs.mirror_manager import MirrorManager
+from pybombs.utils import subproc
+from pybombs.utils import sysutils
+
+
+class DelayHandler(BaseHTTPRequestHandler):
+    " Answers HEAD requests after server.delay seconds "
+    def do_HEAD(self):
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestGetHost(unittest.TestCase):
+
+    def test_get_host(self):
+        self.assertEqual(mirror_manager.get_host('wget+https://Example.com/foo.tar.gz'), 'example.com')
+        self.assertEqual(mirror_manager.get_host('git+https://user@example.com:8080/foo.git'), 'example.com:8080')
+        self.assertEqual(mirror_manager.get_host('git+git@github.com:foo/bar.git'), 'github.com')
+        self.assertIsNone(mirror_manager.get_host('git+file:///srv/foo.git'))
+        self.assertIsNone(mirror_manager.get_host('/srv/foo.tar.gz'))
+
+
+class TestMirrorManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.mirrors = MirrorManager(stats_dir=self.tmp_dir, timeout=0.5)
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def start_server(self, delay):
+        " Start an HTTP server, return its URL "
+        server = HTTPServer(('127.0.0.1', 0), DelayHandler)
+        server.delay = delay
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.servers.append(server)
+        return 'wget+http://127.0.0.1:{0}/foo.tar.gz'.format(server.server_address[1])
+
+    def get_dead_url(self):
+        " Return the URL of a port nobody listens on "
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return 'wget+http://127.0.0.1:{0}/foo.tar.gz'.format(port)
+
+    @unittest.skipIf(requests is None, "requests is not available")
+    def test_rank(self):
+        # Accepts connections, but never answers
+        hanging = socket.socket()
+        hanging.bind(('127.0.0.1', 0))
+        hanging.listen(5)
+        try:
+            sources = [
+                'wget+http://127.0.0.1:{0}/foo.tar.gz'.format(hanging.getsockname()[1]),
+                self.get_dead_url(),
+                self.start_server(0.2),
+                self.start_server(0),
+            ]
+            start = time.time()
+            ranked = self.mirrors.rank(sources, Fetcher().probe)
+            self.assertLess(time.time() - start, 0.5 + mirror_manager.PROBE_GRACE_TIME)
+        finally:
+            hanging.close()
+        self.assertEqual(ranked, [sources[3], sources[2], sources[0], sources[1]])
+        stats = self.mirrors.get_stats()
+        self.assertEqual(len(stats), 4)
+        fast = stats[mirror_manager.get_host(sources[3])]
+        slow = stats[mirror_manager.get_host(sources[2])]
+        dead = stats[mirror_manager.get_host(sources[1])]
+        self.assertLess(fast.latency, slow.latency)
+        self.assertEqual((fast.successes, fast.failures), (1, 0))
+        self.assertEqual((dead.latency, dead.successes, dead.failures), (None, 0, 1))
+
+    def test_rank_by_stats(self):
+        sources = ['svn+http://a.example.com/foo', 'svn+http://b.example.com/foo', 'svn+http://c.example.com/foo']
+        self.mirrors.record([(sources[0], None), (sources[1], 0.5), (sources[2], 0.1)])
+        self.assertEqual(
+            self.mirrors.rank(sources, lambda src, timeout: None),
+            [sources[2], sources[1], sources[0]]
+        )
+        # Failures since the last success count before latency
+        self.mirrors.record([(sources[2], None)])
+        self.assertEqual(
+            self.mirrors.rank(sources, lambda src, timeout: None),
+            [sources[1], sources[2], sources[0]]
+        )
+
+    def test_probe_exceptions(self):
+        def _probe(src, timeout):
+            if src == 'b':
+                raise ValueError(src)
+            return True
+        self.assertEqual(
+            self.mirrors.probe_all(['a', 'b'], _probe)['b'][0],
+            False
+        )
+
+    def test_invalid_timeout(self):
+        old_timeout = config_manager.get('mirror-probe-timeout')
+        config_manager.set('mirror-probe-timeout', 'short')
+        try:
+            mirrors = MirrorManager(stats_dir=self.tmp_dir)
+        finally:
+            config_manager.set('mirror-probe-timeout', old_timeout)
+        self.assertEqual(mirrors.timeout, 3)
+
+
+@unittest.skipIf(sysutils.which('git') is None, "git is not available")
+class TestGitProbe(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        subproc.check_output(['git', 'init', '-q', '--bare', self.tmp_dir])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_probe(self):
+        fetcher = Fetcher()
+        self.assertTrue(fetcher.probe('git+file://' + self.tmp_dir, 5))
+        self.assertFalse(fetcher.probe('git+file://' + os.path.join(self.tmp_dir, 'missing'), 5))
+        self.assertFalse(fetcher.probe('nosuchfetcher+' + self.tmp_dir, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
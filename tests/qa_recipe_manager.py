@@ -0,0 +1,142 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+
+import os
+import copy
+import shutil
+import tempfile
+import unittest
+from pybombs import recipe
+from pybombs import recipe_manager
+from pybombs.config_manager import config_manager
+from pybombs.pb_exception import PBException
+from pybombs.recipe_manager import RecipeListManager
+
+TEMPLATES = {
+    'base': "inherit: empty\ndepends:\n- base_dep\nvars:\n  config_opt: -DBASE=ON\n",
+    'child': "inherit: base\ndepends:\n- child_dep\nvars:\n  child_opt: child\n",
+    'loop_a': "inherit: loop_b\n",
+    'loop_b': "inherit: loop_a\n",
+}
+
+
+class TestRecipeListManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.recipe_dir = os.path.join(self.tmp_dir, 'recipes')
+        self.template_dir = os.path.join(self.tmp_dir, 'templates')
+        os.mkdir(self.recipe_dir)
+        shutil.copytree(config_manager.get_template_dir(), self.template_dir)
+        for name, contents in TEMPLATES.items():
+            self.write(os.path.join(self.template_dir, name + '.lwt'), contents)
+        self.filename = os.path.join(self.recipe_dir, 'pkg.lwr')
+        self.write(self.filename, "category: common\ninherit: child\ndepends:\n- pkg_dep\n")
+        self.old_cfg = (
+            config_manager.local_cfg_dir,
+            config_manager._template_dir,
+            config_manager._recipe_locations,
+        )
+        config_manager.local_cfg_dir = self.tmp_dir
+        config_manager._template_dir = self.template_dir
+        config_manager._recipe_locations = [self.recipe_dir]
+        self.old_manager = recipe_manager.recipe_manager
+        self.rlm = self.new_manager()
+
+    def tearDown(self):
+        recipe_manager.recipe_manager = self.old_manager
+        (
+            config_manager.local_cfg_dir,
+            config_manager._template_dir,
+            config_manager._recipe_locations,
+        ) = self.old_cfg
+        shutil.rmtree(self.tmp_dir)
+
+    @staticmethod
+    def write(filename, contents):
+        with open(filename, 'w') as out_file:
+            out_file.write(contents)
+
+    def new_manager(self):
+        " Return a new manager, as a new process would start with "
+        recipe_manager.recipe_manager = RecipeListManager()
+        return recipe_manager.recipe_manager
+
+    def test_inheritance(self):
+        data = self.rlm.get_recipe_data(self.filename)
+        self.assertEqual(data['depends'], ['pkg_dep', 'child_dep', 'base_dep'])
+        self.assertEqual(data['vars']['config_opt'], '-DBASE=ON')
+        self.assertEqual(data['vars']['child_opt'], 'child')
+
+    def test_index_hit(self):
+        data = self.rlm.get_recipe_data(self.filename)
+        self.rlm.save_indexes()
+        rlm = self.new_manager()
+        def _load(filename):
+            raise AssertionError("Indexed recipe was parsed again: {0}".format(filename))
+        load_inherited_recipe_data = recipe.load_inherited_recipe_data
+        recipe.load_inherited_recipe_data = _load
+        try:
+            self.assertEqual(rlm.get_recipe_data(self.filename), data)
+        finally:
+            recipe.load_inherited_recipe_data = load_inherited_recipe_data
+
+    def test_invalidation(self):
+        self.rlm.get_recipe_data(self.filename)
+        self.rlm.save_indexes()
+        # The recipe changes:
+        self.write(self.filename, "category: common\ninherit: child\ndepends:\n- other_dep\n")
+        rlm = self.new_manager()
+        self.assertEqual(
+            rlm.get_recipe_data(self.filename)['depends'],
+            ['other_dep', 'child_dep', 'base_dep'])
+        rlm.save_indexes()
+        # A template further up the chain changes:
+        self.write(
+            os.path.join(self.template_dir, 'base.lwt'),
+            "inherit: empty\ndepends:\n- new_base_dep\nvars:\n  config_opt: -DBASE=OFF\n")
+        data = self.new_manager().get_recipe_data(self.filename)
+        self.assertEqual(data['depends'], ['other_dep', 'child_dep', 'new_base_dep'])
+        self.assertEqual(data['vars']['config_opt'], '-DBASE=OFF')
+
+    def test_circular_inheritance(self):
+        self.assertRaises(PBException, self.rlm.get_template_data, 'loop_a')
+
+    def test_shared_template_data(self):
+        template_data = copy.deepcopy(self.rlm.get_template_data('child')[0])
+        # Once parsed, once from the index:
+        for _ in range(2):
+            data = self.rlm.get_recipe_data(self.filename)
+            data['vars']['child_opt'] = 'changed'
+            data['depends'].append('extra_dep')
+            r = recipe.Recipe(self.filename)
+            r.depends.append('extra_dep')
+            r.vars['config_opt'] += ' -DEXTRA=ON'
+            r.set_static(True)
+        self.assertEqual(self.rlm.get_template_data('child')[0], template_data)
+        self.assertEqual(recipe.Recipe(self.filename).depends, ['pkg_dep', 'child_dep', 'base_dep'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+
+import unittest
+from pybombs.recipe import compile_package_reqs
+from pybombs.pb_exception import PBException
+
+
+class TestSatisfierCompiler(unittest.TestCase):
+
+    def ev(self, req_string, available):
+        " Evaluate req_string, return the result and the list of checked packages "
+        checked = []
+        def satisfy_evaluator(pkg_name, comparator, required_version):
+            " Fake packager "
+            checked.append((pkg_name, comparator, required_version))
+            return pkg_name in available
+        return compile_package_reqs(req_string).ev(satisfy_evaluator), checked
+
+    def test_single(self):
+        self.assertEqual(
+            self.ev("libboost-all-dev >= 1.60", ['libboost-all-dev']),
+            (True, [('libboost-all-dev', '>=', '1.60')])
+        )
+        self.assertIsNone(compile_package_reqs(""))
+
+    def test_short_circuit_or(self):
+        result, checked = self.ev("liba || libb || libc", ['libb'])
+        self.assertTrue(result)
+        self.assertEqual([pkg for pkg, _, _ in checked], ['liba', 'libb'])
+
+    def test_short_circuit_and(self):
+        result, checked = self.ev("liba && libb && libc", ['libb', 'libc'])
+        self.assertFalse(result)
+        self.assertEqual(len(checked), 1)
+
+    def test_parens(self):
+        self.assertTrue(self.ev("(liba || libb) && libc >= 2.0", ['libb', 'libc'])[0])
+        self.assertFalse(self.ev("liba || (libb && libc)", ['libb'])[0])
+
+    def test_cache(self):
+        compiled = compile_package_reqs("qt5-default != 5.0 || qtbase5-dev")
+        self.assertIs(compile_package_reqs("qt5-default != 5.0 || qtbase5-dev"), compiled)
+        self.assertEqual(compiled.operands[0].compare, '!=')
+        self.assertRaises(AttributeError, setattr, compiled, 'combiner', '&&')
+
+    def test_invalid_token(self):
+        self.assertRaises(PBException, compile_package_reqs, "libfoo, libbar")
+
+
+if __name__ == '__main__':
+    unittest.main()
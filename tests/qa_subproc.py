@@ -0,0 +1,125 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+
+import os
+import sys
+import time
+import subprocess
+import unittest
+from pybombs.utils import subproc
+from pybombs.utils.output_proc import OutputProcessor
+
+
+class OutputCollector(OutputProcessor):
+    " Counts all output, and remembers the largest chunk "
+    def __init__(self):
+        OutputProcessor.__init__(self)
+        self.n_bytes = {'stdout': 0, 'stderr': 0}
+        self.max_chunk = 0
+
+    def process_output(self, stdoutdata, stderrdata):
+        self.n_bytes['stdout'] += len(stdoutdata)
+        self.n_bytes['stderr'] += len(stderrdata)
+        self.max_chunk = max(self.max_chunk, len(stdoutdata), len(stderrdata))
+
+    def process_final(self):
+        pass
+
+
+class TestMonitorProcess(unittest.TestCase):
+
+    def run_python(self, code, o_proc):
+        " Run a Python snippet through monitor_process() "
+        return subproc.monitor_process(
+            [sys.executable, '-c', code], env=dict(os.environ), o_proc=o_proc)
+
+    def test_stderr_flood(self):
+        """
+        Lots of stderr output before any stdout must not stall the
+        process, and must arrive in bounded chunks.
+        """
+        o_proc = OutputCollector()
+        ret = self.run_python(
+            "import sys\n"
+            "sys.stderr.write('w' * (4 * 1024 * 1024))\n"
+            "sys.stderr.flush()\n"
+            "sys.stdout.write('done\\n')\n",
+            o_proc
+        )
+        self.assertEqual(ret, 0)
+        self.assertEqual(o_proc.n_bytes, {'stdout': 5, 'stderr': 4 * 1024 * 1024})
+        self.assertLessEqual(o_proc.max_chunk, subproc.READ_CHUNK_SIZE)
+
+    def test_return_code(self):
+        o_proc = OutputCollector()
+        self.assertEqual(self.run_python("import sys; sys.exit(3)", o_proc), 3)
+
+
+class TestKillProcessTree(unittest.TestCase):
+
+    def start_tree(self, script):
+        " Start a shell script in its own group, return it and its children "
+        proc = subprocess.Popen(['sh', '-c', script], **subproc.NEW_GROUP_POPEN_ARGS)
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            children = subproc.get_child_pids(proc.pid)
+            if len(children) >= 2:
+                return proc, children
+            time.sleep(0.01)
+        self.fail("Child processes did not start")
+
+    def assert_all_gone(self, pids):
+        table = subproc._get_process_table()
+        self.assertEqual([pid for pid in pids if pid in table], [])
+
+    def test_grandchildren(self):
+        proc, children = self.start_tree("sleep 60 & (sleep 60; true) & wait")
+        start = time.time()
+        subproc.kill_process_tree(proc)
+        self.assertLess(time.time() - start, subproc.KILL_TIMEOUT)
+        self.assertIsNotNone(proc.poll())
+        self.assert_all_gone(children)
+
+    def test_escalate_to_sigkill(self):
+        proc, children = self.start_tree("trap '' TERM; sleep 60 & sleep 60 & wait")
+        subproc.kill_process_tree(proc, timeout=0.2)
+        proc.wait()
+        self.assertEqual(proc.returncode, -9)
+        time.sleep(0.1)
+        self.assert_all_gone(children)
+
+
+class TestCallWithTimeout(unittest.TestCase):
+
+    def test_return_code(self):
+        self.assertEqual(subproc.call_with_timeout(['sh', '-c', 'exit 3'], 5), 3)
+
+    def test_timeout(self):
+        start = time.time()
+        self.assertIsNone(subproc.call_with_timeout(['sh', '-c', 'sleep 60 & wait'], 0.2))
+        self.assertLess(time.time() - start, subproc.KILL_TIMEOUT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+import io
+import os
+import re
+import shutil
+import hashlib
+import tarfile
+import tempfile
+import threading
+import unittest
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+try:
+    import requests
+except ImportError:
+    requests = None
+from pybombs.fetchers import wget
+from pybombs.distcache_manager import DistCacheManager
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.data for every path but /missing. The first server.drops
+    responses are cut short.
+    """
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get('Range'))
+        if self.path == '/missing':
+            self.send_error(404)
+            return
+        start = 0
+        range_match = re.match(r'bytes=(\d+)-', self.headers.get('Range') or '')
+        if range_match and server.support_ranges:
+            start = int(range_match.group(1))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                start, len(server.data) - 1, len(server.data)))
+        else:
+            self.send_response(200)
+        body = server.data[start:]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if server.drops:
+            server.drops -= 1
+            body = body[:len(body) // 3]
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(requests is None, "requests is not available")
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), FlakyHandler)
+        self.server.data = os.urandom(3 * 1024 * 1024 + 17)
+        self.server.drops = 0
+        self.server.support_ranges = True
+        self.server.requests = []
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.dest = tempfile.mkdtemp()
+        self.retry_backoff = wget.RETRY_BACKOFF
+        wget.RETRY_BACKOFF = 0.01
+
+    def tearDown(self):
+        wget.RETRY_BACKOFF = self.retry_backoff
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dest)
+
+    def download(self, path='/foo-1.0.tar.gz'):
+        url = 'http://127.0.0.1:{0}{1}'.format(self.server.server_address[1], path)
+        return wget._download_with_requests(url, self.dest, show_progress=False)
+
+    def check_download(self, filename, hashes):
+        self.assertEqual(filename, os.path.join(self.dest, 'foo-1.0.tar.gz'))
+        with open(filename, 'rb') as download:
+            self.assertEqual(download.read(), self.server.data)
+        self.assertEqual(hashes, {
+            'md5': hashlib.md5(self.server.data).hexdigest(),
+            'sha256': hashlib.sha256(self.server.data).hexdigest(),
+        })
+
+    def test_download(self):
+        self.check_download(*self.download())
+        self.assertEqual(self.server.requests, [None])
+
+    def test_resume(self):
+        self.server.drops = 2
+        self.check_download(*self.download())
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertIsNone(self.server.requests[0])
+        self.assertTrue(all(self.server.requests[1:]))
+
+    def test_restart_without_ranges(self):
+        self.server.drops = 1
+        self.server.support_ranges = False
+        self.check_download(*self.download())
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_missing(self):
+        self.assertRaises(IOError, self.download, '/missing')
+        self.assertEqual(self.server.requests, [None])
+
+    def serve_tarball(self):
+        " Make the server serve a tarball with a README and src/foo.bin "
+        tarball = os.path.join(self.dest, 'foo-1.0.tar.gz')
+        with tarfile.open(tarball, 'w:gz') as archive:
+            for name, size in (('README', 100), ('src/foo.bin', 2 * 1024 * 1024)):
+                info = tarfile.TarInfo('foo-1.0/' + name)
+                info.size = size
+                archive.addfile(info, io.BytesIO(os.urandom(size)))
+        with open(tarball, 'rb') as tar_file:
+            self.server.data = tar_file.read()
+        os.remove(tarball)
+
+    def test_fetch_streaming(self):
+        self.serve_tarball()
+        self.server.drops = 1
+        url = 'http://127.0.0.1:{0}/foo-1.0.tar.gz'.format(self.server.server_address[1])
+        path = os.path.join(self.dest, 'src', 'foo')
+        dist_cache = DistCacheManager(os.path.join(self.dest, 'cache'), 1024 * 1024 * 1024)
+        os.mkdir(dist_cache.cache_dir)
+        hashes, tee_filename = wget.Wget()._fetch_streaming(url, path, dist_cache)
+        self.assertEqual(hashes['md5'], hashlib.md5(self.server.data).hexdigest())
+        self.assertEqual(sorted(os.listdir(path)), ['README', 'src'])
+        self.assertEqual(os.path.getsize(os.path.join(path, 'src', 'foo.bin')), 2 * 1024 * 1024)
+        self.assertEqual(os.listdir(os.path.join(self.dest, 'src')), ['foo'])
+        with open(tee_filename, 'rb') as tee_file:
+            self.assertEqual(tee_file.read(), self.server.data)
+
+    def test_update_hash_mismatch(self):
+        self.serve_tarball()
+        url = 'http://127.0.0.1:{0}/foo-1.0.tar.gz'.format(self.server.server_address[1])
+        src_dir = os.path.join(self.dest, 'src')
+        os.makedirs(os.path.join(src_dir, 'foo'))
+        with open(os.path.join(src_dir, 'foo', 'README'), 'w') as readme:
+            readme.write('old')
+        self.assertFalse(wget.Wget().fetch_url(url, src_dir, 'foo', {'md5': '0' * 32}, use_cache=False))
+        # Nothing unverified may end up in the existing tree:
+        self.assertEqual(os.listdir(src_dir), ['foo'])
+        self.assertEqual(os.listdir(os.path.join(src_dir, 'foo')), ['README'])
+        with open(os.path.join(src_dir, 'foo', 'README')) as readme:
+            self.assertEqual(readme.read(), 'old')
+
+
+if __name__ == '__main__':
+    unittest.main()
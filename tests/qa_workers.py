@@ -0,0 +1,69 @@
+#
+# Copyright 2026 Free Software Foundation, Inc.
+#
+# This file is part of PyBOMBS
+#
+# PyBOMBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# PyBOMBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyBOMBS; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# run as 'python -m unittest discover --start-directory=tests --pattern=qa_*.py'
+
+import time
+import threading
+import unittest
+from pybombs.utils import workers
+
+
+class TestRunParallel(unittest.TestCase):
+
+    def test_results(self):
+        self.assertEqual(workers.run_parallel(lambda x: x * 2, range(10), 3), {x: x * 2 for x in range(10)})
+        self.assertEqual(workers.run_parallel(lambda x: x, [], 3), {})
+
+    def test_jobs(self):
+        lock = threading.Lock()
+        running = [0, 0] # now, max
+        def _task(_):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+        workers.run_parallel(_task, range(8), 4)
+        self.assertEqual(running[1], 4)
+
+    def test_errors(self):
+        def _task(x):
+            if x == 2:
+                raise ValueError(x)
+            return x
+        self.assertEqual(workers.run_parallel(_task, range(4), 2), {0: 0, 1: 1, 3: 3})
+        self.assertEqual(
+            workers.run_parallel(_task, range(4), 2, on_error=lambda x, ex: str(ex)),
+            {0: 0, 1: 1, 2: '2', 3: 3}
+        )
+
+    def test_timeout(self):
+        start = time.time()
+        results = workers.run_parallel(lambda x: time.sleep(x) or x, [0, 5], 2, timeout=0.5)
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(results, {0: 0})
+
+
+if __name__ == '__main__':
+    unittest.main()